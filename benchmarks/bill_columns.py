@@ -0,0 +1,144 @@
+# benchmarks/bill_columns.py
+"""列式账单存储的正确性校验与基准
+
+1. 生成一百万张随机账单写入内存账单仓库，列式存储作为监听者同步追加。
+2. 按每种分组维度比较 group_totals 与逐张构造 Bill 对象的 Python 聚合：
+   次数和费用（分）应完全一致，电量在四舍五入到 0.01 度后一致。
+3. 比较两者的耗时（Python 聚合包含 get_all() 构造 Bill 对象的时间）。
+4. 另用跨 20 年的账单按 day,hour,pile 三个维度分组：各维度取值范围的乘积远大于组数，
+   校验结果与逐张聚合一致，且分组汇总（不含格式化结果行）的峰值内存小于按乘积分配
+   一个 bincount 数组所需的内存。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bill_columns
+"""
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from models.bill import Bill
+from repositories.bill_columns import GROUP_BY, BillColumnStore, np
+from repositories.repositories import BillRepository
+from utils.enums import ChargeMode
+from utils.ids import new_ulid
+
+BILLS = 1_000_000
+PILES = [f"F{i:02d}" for i in range(1, 21)] + [f"T{i:02d}" for i in range(1, 41)]
+WIDE_BILLS = 100_000
+WIDE_DAYS = 20 * 366
+WIDE_BY = ('day', 'hour', 'pile')
+
+
+def random_bills(count: int, seed: int, days: int = 366):
+    rng = random.Random(seed)
+    origin = datetime(2024, 1, 1)
+    bills = []
+    for _ in range(count):
+        end = origin + timedelta(seconds=rng.randrange(days * 86400), microseconds=rng.randrange(1_000_000))
+        start = end - timedelta(seconds=rng.randrange(300, 6 * 3600))
+        pile_id = rng.choice(PILES)
+        bills.append(Bill(
+            bill_id=new_ulid(end),
+            car_id=f"car{rng.randrange(5000)}",
+            pile_id=pile_id,
+            start_time=start,
+            end_time=end,
+            charged_kwh=round(rng.uniform(1, 60), 2),
+            charge_mode=ChargeMode.FAST if pile_id[0] == 'F' else ChargeMode.TRICKLE,
+            charge_fee_cents=rng.randrange(50, 6000),
+            service_fee_cents=rng.randrange(50, 5000)
+        ))
+    return bills
+
+
+GROUP_KEYS = {
+    'pile': lambda bill: bill.pile_id,
+    'mode': lambda bill: bill.charge_mode.value,
+    'hour': lambda bill: bill.end_time.hour,
+    'weekday': lambda bill: bill.end_time.weekday(),
+    'day': lambda bill: bill.end_time.date().isoformat(),
+    'month': lambda bill: bill.end_time.strftime('%Y-%m'),
+}
+
+
+def python_group_totals(bill_repo: BillRepository, by: str) -> dict:
+    """原来的做法：为每张账单构造 Bill 和 datetime 对象后逐张累加"""
+    group_key = GROUP_KEYS[by]
+    totals = defaultdict(lambda: [0, 0.0, 0, 0])
+    for bill in bill_repo.get_all():
+        entry = totals[group_key(bill)]
+        entry[0] += 1
+        entry[1] += bill.charged_kwh
+        entry[2] += bill.charge_fee_cents
+        entry[3] += bill.service_fee_cents
+    return {key: (count, round(kwh, 2), charge, service) for key, (count, kwh, charge, service) in totals.items()}
+
+
+def check_wide_grouping() -> bool:
+    """多维分组的组合下标范围远大于组数时，结果正确且不按乘积分配 bincount 数组"""
+    bill_repo = BillRepository(persist=False)
+    store = BillColumnStore(bill_repo, persist=False)
+    bill_repo.save_many(sorted(random_bills(WIDE_BILLS, seed=7, days=WIDE_DAYS), key=lambda bill: bill.end_time))
+
+    start_clock = time.perf_counter()
+    rows = store.group_totals(WIDE_BY)
+    elapsed = time.perf_counter() - start_clock
+    tracemalloc.start()
+    store.aggregate(WIDE_BY)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    expected = defaultdict(lambda: [0, 0])
+    for bill in bill_repo.get_all():
+        entry = expected[(bill.end_time.date().isoformat(), bill.end_time.hour, bill.pile_id)]
+        entry[0] += 1
+        entry[1] += bill.total_fee_cents
+    actual = {tuple(row['group']): [row['charge_count'], row['total_fee_cents']] for row in rows}
+    dense_bytes = WIDE_DAYS * 24 * len(PILES) * 8
+    ok = actual == dict(expected) and peak < dense_bytes
+    print(f"按 {','.join(WIDE_BY)} 分组 {len(bill_repo.data):,} 张跨 20 年的账单: {len(rows):,} 组, "
+          f"{elapsed * 1000:.0f} ms, 峰值内存 {peak / 2 ** 20:.1f} MB"
+          f"（按取值范围乘积分配时每个 bincount 数组 {dense_bytes / 2 ** 20:.0f} MB） {'一致' if ok else '不一致'}")
+    return ok
+
+
+def main():
+    if np is None:
+        print("未安装 numpy，列式存储退化为逐行聚合，跳过基准")
+        return 0
+    wide_ok = check_wide_grouping()
+    bill_repo = BillRepository(persist=False)
+    store = BillColumnStore(bill_repo, persist=False)
+    # 按结束时间顺序入库，与实际结算顺序一致
+    bills = sorted(random_bills(BILLS, seed=2024), key=lambda bill: bill.end_time)
+    start_clock = time.perf_counter()
+    bill_repo.save_many(bills)
+    print(f"写入 {len(store):,} 张账单: {time.perf_counter() - start_clock:.1f} 秒")
+
+    mismatches = 0
+    for by in GROUP_BY:
+        start_clock = time.perf_counter()
+        rows = store.group_totals(by)
+        columnar_s = time.perf_counter() - start_clock
+        start_clock = time.perf_counter()
+        expected = python_group_totals(bill_repo, by)
+        python_s = time.perf_counter() - start_clock
+
+        actual = {row['group']: (row['charge_count'], row['charged_kwh'], row['charge_fee_cents'],
+                                 row['service_fee_cents']) for row in rows}
+        ok = actual == expected
+        mismatches += not ok
+        print(f"  {by:<8} {len(rows):>4} 组  列式 {columnar_s * 1000:7.1f} ms   "
+              f"逐张构造 {python_s:6.2f} 秒   {'一致' if ok else '不一致'}")
+
+    start_clock = time.perf_counter()
+    store.group_totals('hour', datetime(2024, 5, 1), datetime(2024, 6, 1), pile_id='F01')
+    print(f"  单桩单月按小时分组: {(time.perf_counter() - start_clock) * 1000:.1f} ms")
+    return 0 if mismatches == 0 and wide_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# benchmarks/bulk_billing.py
+"""批量计费的正确性校验与基准
+
+1. 在一百万个随机区间上比较 bulk_charging_cost 与逐条调用 calculate_charging_cost：
+   浮点结果应逐位相同，四舍五入到分后的三项费用应完全一致。
+   分别在默认电价和带周末/节假日/季节方案的电价日历上校验。
+2. 比较逐条计费循环与一次批量计费的耗时。
+3. 用 calculate_and_create_bill 生成账单（充电量带多位小数），按同一电价 rerate_bills
+   重新计价，应没有任何账单的费用发生变化。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bulk_billing
+"""
+import contextlib
+import io
+import random
+import sys
+import time
+
+from benchmarks.tariff_pricing import random_intervals
+from models.bill import ChargingSession
+from models.charging_pile import FastChargingPile
+from services.billing_service import BillingService
+from services.tariff import DEFAULT_TARIFF_CONFIG, TariffCalendar, np, wall_microseconds
+
+INTERVALS = 1_000_000
+RERATE_BILLS = 20_000
+
+# 周末峰时改为平时，节假日峰时降价并减免服务费，7、8 月峰时加价并延长晚高峰
+CALENDAR_CONFIG = dict(
+    DEFAULT_TARIFF_CONFIG,
+    weekend={'windows': [['07:00', '18:00', 'normal'], ['18:00', '21:00', 'peak'], ['21:00', '23:00', 'normal']]},
+    holiday={'rates': {'peak': 0.9}, 'service_rate': 0.5},
+    holidays=['2024-01-01', '2024-05-01', '2024-05-02', '2024-10-01', '2024-10-02', '2024-10-03'],
+    seasons=[{'name': 'summer', 'months': [7, 8], 'rates': {'peak': 1.2},
+              'windows': [['07:00', '10:00', 'normal'], ['10:00', '15:00', 'peak'],
+                          ['15:00', '18:00', 'normal'], ['18:00', '22:00', 'peak']]}]
+)
+
+
+def compare(billing: BillingService, intervals) -> int:
+    kwh = [interval[0] for interval in intervals]
+    starts = [interval[1] for interval in intervals]
+    ends = [interval[2] for interval in intervals]
+
+    start_clock = time.perf_counter()
+    scalar = [billing.calculate_charging_cost(k, s, e) for k, s, e in intervals]
+    scalar_s = time.perf_counter() - start_clock
+
+    start_clock = time.perf_counter()
+    starts_us = wall_microseconds(starts).astype('datetime64[us]')
+    ends_us = wall_microseconds(ends).astype('datetime64[us]')
+    convert_s = time.perf_counter() - start_clock
+    start_clock = time.perf_counter()
+    bulk = billing.bulk_charging_cost(kwh, starts_us, ends_us)
+    bulk_s = time.perf_counter() - start_clock
+
+    # 正确性
+    exact = cent_mismatch = 0
+    for i, fees in enumerate(scalar):
+        bulk_fees = (float(bulk[0][i]), float(bulk[1][i]), float(bulk[2][i]))
+        if bulk_fees == fees:
+            exact += 1
+        if tuple(round(f, 2) for f in bulk_fees) != tuple(round(f, 2) for f in fees):
+            cent_mismatch += 1
+    print(f"  校验 {len(intervals):,} 个区间: 逐位相同 {exact:,}，分位不一致 {cent_mismatch:,}")
+    print(f"  逐条计费: {scalar_s:.2f} 秒（{scalar_s / len(intervals) * 1e6:.2f} us/条）")
+    print(f"  批量计费: {bulk_s:.3f} 秒（{bulk_s / len(intervals) * 1e9:.0f} ns/条），"
+          f"另有 datetime 转换 {convert_s:.2f} 秒")
+    return cent_mismatch
+
+
+def check_rerate_noop(billing: BillingService, intervals) -> int:
+    """新生成的账单按同一电价重新计价，费用应完全不变"""
+    rng = random.Random(7)
+    pile = FastChargingPile(pile_id='F01')
+    bills = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, (kwh, start, end) in enumerate(intervals):
+            session = ChargingSession(session_id=str(i), car_id=f"car{i}", pile_id=pile.pile_id,
+                                      start_time=start, request_amount_kwh=kwh)
+            # 进度引擎结算出的充电量不是两位小数
+            bills.append(billing.calculate_and_create_bill(session, pile, end, kwh + rng.uniform(-0.005, 0.005)))
+    result = billing.rerate_bills(bills)
+    print(f"  同一电价重新计价 {len(bills):,} 张新账单: 费用变化 {result.changed:,} 张")
+    return result.changed
+
+
+def main():
+    billing = BillingService()
+    intervals = random_intervals(INTERVALS, seed=2024)
+    print("重新计价")
+    mismatches = check_rerate_noop(billing, intervals[:RERATE_BILLS])
+    if np is None:
+        print("未安装 numpy，批量计费退化为逐条计算，跳过基准")
+        return 0 if mismatches == 0 else 1
+
+    print(f"默认电价（{len(billing.tariff.tables)} 张电价表）")
+    mismatches += compare(billing, intervals)
+    billing.tariff = TariffCalendar.from_config(CALENDAR_CONFIG)
+    print(f"周末/节假日/季节电价日历（{len(billing.tariff.tables)} 张电价表）")
+    mismatches += compare(billing, intervals)
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
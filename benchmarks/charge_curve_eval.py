@@ -0,0 +1,46 @@
+# benchmarks/charge_curve_eval.py
+"""充电曲线积分器的吞吐量基准
+
+随机生成不同电池容量、电池类型、到站SOC的请求，测量在快充/慢充功率下
+估算充电时长（ChargingRequest.charge_hours）每秒可以计算多少次。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.charge_curve_eval
+"""
+import random
+import sys
+import time
+
+from models.car import ChargingRequest
+from models.charge_curve import CHARGE_CURVES
+from utils.enums import ChargeMode
+
+REQUESTS = 2000
+ROUNDS = 20
+POWERS_KW = (30.0, 7.0)
+
+
+def main():
+    rng = random.Random(7)
+    requests = [
+        ChargingRequest(
+            f"B{i:05d}", ChargeMode.FAST, round(rng.uniform(5.0, 60.0), 1),
+            battery_capacity_kwh=rng.choice((40.0, 60.0, 75.0, 100.0)),
+            battery_class=rng.choice(list(CHARGE_CURVES)),
+            start_soc=rng.uniform(0.0, 0.6)
+        )
+        for i in range(REQUESTS)
+    ]
+
+    print(f"{'功率(kW)':>8} {'单次(us)':>10} {'每秒次数':>12}")
+    for power_kw in POWERS_KW:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for request in requests:
+                request.charge_hours(power_kw)
+        per_call = (time.perf_counter() - start) / (ROUNDS * REQUESTS)
+        print(f"{power_kw:>10.1f} {per_call * 1e6:>12.2f} {1 / per_call:>14,.0f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
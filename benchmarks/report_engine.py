@@ -0,0 +1,90 @@
+# benchmarks/report_engine.py
+"""即席报表分区并行与串行的对比基准
+
+1. 在临时目录中创建持久化的列式账单存储，逐步写入随机账单，行数依次为 SIZES 中的各值。
+2. 每个行数下分别用串行（本进程内 aggregate）和分区并行（ProcessPoolExecutor）按天分组汇总全部账单，
+   各取 3 次中最快的一次，并核对两者的次数和费用（分）完全一致。
+3. 进程池在计时前已启动并预热（与服务器启动时调用 ReportEngine.start() 相同），计时只包含
+   分区、各进程读取列文件和汇总、传回结果并合并的开销。
+
+最后给出并行在该行数及更大行数下都更快的最小行数，作为 ReportEngine.MIN_PARALLEL_ROWS 的依据；
+并行在所有行数下都更慢（例如只有 1 个 CPU）时如实报告。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.report_engine [工作进程数，默认 CPU 核数且至少 2]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.bill_columns import random_bills
+from repositories.bill_columns import BillColumnStore, np
+from repositories.repositories import BillRepository
+from services.report_engine import ReportEngine
+
+SIZES = (25_000, 50_000, 100_000, 200_000, 500_000, 1_000_000)
+REPEAT = 3
+
+
+def best_of(engine: ReportEngine, parallel: bool):
+    best, rows = None, None
+    for _ in range(REPEAT):
+        start_clock = time.perf_counter()
+        rows = engine.group_totals('day', parallel=parallel)
+        elapsed = time.perf_counter() - start_clock
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def exact(rows) -> dict:
+    return {row['group']: (row['charge_count'], row['charge_fee_cents'], row['service_fee_cents']) for row in rows}
+
+
+def main():
+    if np is None:
+        print("未安装 numpy，跳过基准")
+        return 0
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(os.cpu_count() or 1, 2)
+    print(f"CPU 核数: {os.cpu_count()}, 工作进程数: {workers}")
+    directory = tempfile.mkdtemp(prefix='bill_columns_')
+    bill_repo = BillRepository(persist=False)
+    store = BillColumnStore(bill_repo, directory=directory)
+    engine = ReportEngine(store, workers=workers)
+    try:
+        engine.start()
+        bills = sorted(random_bills(SIZES[-1], seed=2024), key=lambda bill: bill.end_time)
+        written = 0
+        results = []
+        mismatches = 0
+        for size in SIZES:
+            bill_repo.save_many(bills[written:size])
+            written = size
+            engine.group_totals('day', parallel=True)  # 等待预热任务完成
+            serial_s, serial_rows = best_of(engine, False)
+            parallel_s, parallel_rows = best_of(engine, True)
+            ok = exact(serial_rows) == exact(parallel_rows)
+            mismatches += not ok
+            results.append((size, serial_s, parallel_s))
+            print(f"  {size:>9,} 行  串行 {serial_s * 1000:7.1f} ms   并行 {parallel_s * 1000:7.1f} ms   "
+                  f"加速比 {serial_s / parallel_s:4.2f}x   {'一致' if ok else '不一致'}")
+    finally:
+        engine.close()
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    threshold = None
+    for size, serial_s, parallel_s in reversed(results):
+        if parallel_s >= serial_s:
+            break
+        threshold = size
+    if threshold is None:
+        print("并行在所有行数下都不比串行快，保持串行计算（MIN_PARALLEL_ROWS 不应低于测得的最大行数）")
+    else:
+        print(f"并行从 {threshold:,} 行起更快，建议 MIN_PARALLEL_ROWS = {threshold:,}")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# benchmarks/reservations.py
+"""充电桩预约的正确性校验与基准
+
+1. 校验预约规则：指定的充电桩故障或与指定模式不符时拒绝预约；按模式自动选择时跳过故障充电桩，
+   最早可预约时段也不落在故障充电桩上；改期与其他预约冲突时原预约保持不变。
+2. 在 10 个快充桩上随机登记 REQUESTS 个预约（按模式自动选择），测量单次预约
+   和单次冲突检查的平均耗时。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.reservations
+"""
+import contextlib
+import os
+import random
+import sys
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from models.charging_pile import FastChargingPile, TrickleChargingPile
+from repositories.repositories import PileRepository, ReservationRepository
+from services.reservation_service import ReservationService
+from utils.clock import VirtualClock
+from utils.enums import ChargeMode, WorkState
+
+PILES_PER_MODE = 10
+REQUESTS = 5000
+CONFLICT_CHECKS = 20000
+
+
+def build_station():
+    clock = VirtualClock(datetime(2024, 1, 1, 8, 0, 0))
+    pile_repo = PileRepository(persist=False)
+    for i in range(1, PILES_PER_MODE + 1):
+        pile_repo.save(f"F{i:02d}", FastChargingPile(f"F{i:02d}"))
+        pile_repo.save(f"T{i:02d}", TrickleChargingPile(f"T{i:02d}"))
+    reservation_repo = ReservationRepository(persist=False)
+    return clock, pile_repo, reservation_repo, ReservationService(reservation_repo, pile_repo, clock)
+
+
+def expect_error(action) -> bool:
+    try:
+        action()
+    except ValueError:
+        return True
+    return False
+
+
+def check_rules() -> int:
+    """返回不符合预期的规则数"""
+    clock, pile_repo, reservation_repo, service = build_station()
+    faulty = pile_repo.get('F01')
+    faulty.state = WorkState.FAULTY
+    pile_repo.save(faulty.pile_id, faulty)
+    start = clock.now() + timedelta(hours=1)
+    hour = timedelta(hours=1)
+
+    checks = {
+        '指定故障充电桩被拒绝': expect_error(lambda: service.reserve('car1', start, hour, pile_id='F01')),
+        '指定充电桩与模式不符被拒绝': expect_error(
+            lambda: service.reserve('car2', start, hour, pile_id='T01', mode=ChargeMode.FAST)),
+        '按模式自动选择跳过故障充电桩':
+            service.reserve('car3', start + 3 * hour, hour, mode=ChargeMode.FAST).pile_id != 'F01',
+        '最早可预约时段不在故障充电桩上': service.next_free_slot(ChargeMode.FAST, start, hour)[0] != 'F01',
+    }
+    first = service.reserve('car4', start, hour, pile_id='F10')
+    second = service.reserve('car5', start + 2 * hour, hour, pile_id='F10')
+    moved = replace(first, start_time=second.start_time, end_time=second.end_time)
+    checks['改期冲突时原预约保持不变'] = expect_error(lambda: reservation_repo.save(first.reservation_id, moved)) \
+        and reservation_repo.get(first.reservation_id).start_time == first.start_time
+
+    for name, ok in checks.items():
+        print(f"  {name}: {'通过' if ok else '失败'}")
+    return sum(not ok for ok in checks.values())
+
+
+def main():
+    print("预约规则校验:")
+    failures = check_rules()
+
+    clock, pile_repo, reservation_repo, service = build_station()
+    rng = random.Random(7)
+    made = 0
+    start_clock = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(REQUESTS):
+            start = clock.now() + timedelta(minutes=rng.randrange(1, 7 * 24 * 60 - 60))
+            try:
+                service.reserve(f"car{i}", start, timedelta(minutes=rng.randrange(15, 60)), mode=ChargeMode.FAST)
+                made += 1
+            except ValueError:
+                pass
+    reserve_s = time.perf_counter() - start_clock
+
+    start_clock = time.perf_counter()
+    for _ in range(CONFLICT_CHECKS):
+        start = clock.now() + timedelta(minutes=rng.randrange(7 * 24 * 60))
+        reservation_repo.find_conflict(f"F{rng.randrange(1, PILES_PER_MODE + 1):02d}", start,
+                                       start + timedelta(minutes=30))
+    conflict_s = time.perf_counter() - start_clock
+
+    print(f"登记 {made}/{REQUESTS} 个预约: 平均 {reserve_s / REQUESTS * 1e6:.1f} us/次")
+    print(f"冲突检查: 平均 {conflict_s / CONFLICT_CHECKS * 1e6:.2f} us/次")
+    return 0 if failures == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
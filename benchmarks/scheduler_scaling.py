@@ -0,0 +1,104 @@
+# benchmarks/scheduler_scaling.py
+"""调度器随充电桩数量的扩展性基准
+
+分别在 5 / 50 / 500 个充电桩（快慢各半）、所有充电桩都在充电且等候区有车排队的稳态下，
+测量一次调度节拍（定时器 + 充电进度 + 调度周期）和一次 find_best_pile 的平均耗时。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.scheduler_scaling
+"""
+import contextlib
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from models.car import ChargingRequest
+from models.charging_pile import FastChargingPile, TrickleChargingPile
+from repositories.repositories import (
+    PileRepository, SessionRepository, BillRepository, RequestRepository, QueueRepository
+)
+from services.billing_service import BillingService
+from services.charging_service import ChargingService
+from services.dispatch_service import DispatchService
+from services.eta_service import EtaService
+from services.queue_service import QueueService
+from services.scheduling_service import SchedulingService
+from utils.clock import VirtualClock
+from utils.enums import ChargeMode
+
+PILE_COUNTS = (5, 50, 500)
+WAITING_PER_MODE = 100
+TICKS = 200
+FIND_CALLS = 2000
+
+
+def build_station(pile_count: int):
+    """构建一个所有充电桩都在充电、每种模式另有 WAITING_PER_MODE 辆车排队的内存充电站"""
+    clock = VirtualClock(datetime(2024, 1, 1, 8, 0, 0))
+    pile_repo = PileRepository(persist=False)
+    queue_repo = QueueRepository()
+    request_repo = RequestRepository(persist=False)
+    queue_service = QueueService(queue_repo, clock)
+    charging_service = ChargingService(
+        pile_repo, SessionRepository(persist=False), BillRepository(persist=False),
+        request_repo, queue_repo, BillingService(), clock=clock, queue_service=queue_service
+    )
+    scheduling_service = SchedulingService(pile_repo, queue_repo, charging_service, request_repo)
+    eta_service = EtaService(pile_repo, queue_repo, charging_service, clock)
+    dispatch_service = DispatchService(pile_repo, queue_repo, waiting_area_capacity=10 ** 6,
+                                       queue_service=queue_service)
+    dispatch_service.attach_eta_service(eta_service)
+
+    half = pile_count // 2
+    for i in range(half):
+        pile_repo.save(f"F{i + 1:03d}", FastChargingPile(pile_id=f"F{i + 1:03d}"))
+    for i in range(pile_count - half):
+        pile_repo.save(f"T{i + 1:03d}", TrickleChargingPile(pile_id=f"T{i + 1:03d}"))
+
+    car = 0
+    for mode, count in ((ChargeMode.FAST, half), (ChargeMode.TRICKLE, pile_count - half)):
+        for _ in range(count + WAITING_PER_MODE):
+            car += 1
+            # 请求电量足够大，保证测量期间没有会话结束
+            charging_service.create_charging_request(f"B{car:05d}", mode.name, 200.0)
+    scheduling_service.run_schedule_cycle()
+    return clock, charging_service, scheduling_service, dispatch_service
+
+
+def measure(pile_count: int, use_eta: bool = True) -> tuple:
+    clock, charging_service, scheduling_service, dispatch_service = build_station(pile_count)
+    if not use_eta:
+        dispatch_service.attach_eta_service(None)
+
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        clock.advance(timedelta(seconds=1))
+        charging_service.advance_timers()
+        charging_service.tick_progress()
+        scheduling_service.run_schedule_cycle()
+    tick_us = (time.perf_counter() - start) / TICKS * 1e6
+
+    request = ChargingRequest("PROBE", ChargeMode.FAST, 25.0)
+    start = time.perf_counter()
+    for _ in range(FIND_CALLS):
+        dispatch_service.find_best_pile(request)
+    find_us = (time.perf_counter() - start) / FIND_CALLS * 1e6
+    return tick_us, find_us
+
+
+def main():
+    rows = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for pile_count in PILE_COUNTS:
+            tick_us, find_us = measure(pile_count)
+            _, legacy_find_us = measure(pile_count, use_eta=False)
+            rows.append((pile_count, tick_us, find_us, legacy_find_us))
+
+    print(f"{'充电桩数':>8} {'调度节拍(us)':>14} {'find_best_pile(us)':>20} {'逐桩计算(us)':>14}")
+    for pile_count, tick_us, find_us, legacy_find_us in rows:
+        print(f"{pile_count:>10} {tick_us:>16.1f} {find_us:>20.2f} {legacy_find_us:>16.1f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
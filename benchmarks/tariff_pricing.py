@@ -0,0 +1,120 @@
+# benchmarks/tariff_pricing.py
+"""分时电价查表计费的正确性校验与基准
+
+1. 与原来按时段边界逐段循环的 calculate_charging_cost 对比：
+   - 不跨过 23:59:59 的整秒区间直接与原实现逐条对比；
+   - 原实现在 23:00 之后把下一个边界设为当天 23:59:59，跨过午夜的区间在 23:59:59 处
+     时间不再前进（死循环），同时每天最后一秒不计费；另外 replace() 保留了开始时间的
+     微秒，时段边界随之偏移。其余区间改为与修正了这两处（下一个边界取次日零点、
+     边界微秒清零）的同一算法对比。
+2. 在一百万个随机区间上测量查表计费的耗时，并与逐段循环的耗时对比。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.tariff_pricing
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from services.billing_service import BillingService
+
+INTERVALS = 1_000_000
+VALIDATE = 100_000
+LEGACY_TIMED = 50_000
+
+
+def legacy_time_rate(hour: int) -> float:
+    """原 BillingService._get_time_rate 的按小时电价"""
+    if (10 <= hour < 15) or (18 <= hour < 21):
+        return 1.0
+    if (7 <= hour < 10) or (15 <= hour < 18) or (21 <= hour < 23):
+        return 0.7
+    return 0.4
+
+
+def legacy_charge_fee(charged_kwh: float, start_time: datetime, end_time: datetime,
+                      fixed: bool = False) -> float:
+    """原 calculate_charging_cost 中的电费循环（fixed=True 时修正 23 点之后的边界和边界微秒）"""
+    charge_fee = 0.0
+    current_time = start_time
+    while current_time < end_time:
+        if current_time.hour < 7:
+            next_time = current_time.replace(hour=7, minute=0, second=0)
+        elif current_time.hour < 10:
+            next_time = current_time.replace(hour=10, minute=0, second=0)
+        elif current_time.hour < 15:
+            next_time = current_time.replace(hour=15, minute=0, second=0)
+        elif current_time.hour < 18:
+            next_time = current_time.replace(hour=18, minute=0, second=0)
+        elif current_time.hour < 21:
+            next_time = current_time.replace(hour=21, minute=0, second=0)
+        elif current_time.hour < 23:
+            next_time = current_time.replace(hour=23, minute=0, second=0)
+        elif fixed:
+            next_time = current_time.replace(hour=0, minute=0, second=0) + timedelta(days=1)
+        else:
+            next_time = current_time.replace(hour=23, minute=59, second=59)
+        if fixed:
+            next_time = next_time.replace(microsecond=0)
+        if next_time > end_time:
+            next_time = end_time
+        duration = (next_time - current_time).total_seconds() / 3600
+        total_duration = (end_time - start_time).total_seconds() / 3600
+        current_kwh = charged_kwh * (duration / total_duration)
+        charge_fee += current_kwh * legacy_time_rate(current_time.hour)
+        current_time = next_time
+    return charge_fee
+
+
+def random_intervals(n: int, seed: int):
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    intervals = []
+    for _ in range(n):
+        start = base + timedelta(seconds=rng.randrange(365 * 86400))
+        if rng.random() < 0.5:
+            start += timedelta(microseconds=rng.randrange(1, 10 ** 6))
+        end = start + timedelta(seconds=rng.uniform(60, 30 * 3600))
+        intervals.append((round(rng.uniform(1.0, 100.0), 2), start, end))
+    return intervals
+
+
+def main():
+    billing = BillingService()
+    intervals = random_intervals(INTERVALS, seed=2024)
+
+    # 正确性
+    same_day = cross_day = 0
+    max_error = 0.0
+    for kwh, start, end in intervals[:VALIDATE]:
+        fee = billing.tariff.charge_fee(kwh, start, end)
+        if not start.microsecond and end <= start.replace(hour=23, minute=59, second=59):
+            expected = legacy_charge_fee(kwh, start, end)
+            same_day += 1
+        else:
+            expected = legacy_charge_fee(kwh, start, end, fixed=True)
+            cross_day += 1
+        max_error = max(max_error, abs(fee - expected))
+    print(f"校验 {VALIDATE:,} 个区间（{same_day:,} 个与原实现对比，{cross_day:,} 个与修正边界后的实现对比）")
+    print(f"最大误差: {max_error:.2e} 元")
+
+    # 性能
+    start_clock = time.perf_counter()
+    for kwh, start, end in intervals:
+        billing.tariff.charge_fee(kwh, start, end)
+    table_us = (time.perf_counter() - start_clock) / INTERVALS * 1e6
+
+    start_clock = time.perf_counter()
+    for kwh, start, end in intervals[:LEGACY_TIMED]:
+        legacy_charge_fee(kwh, start, end, fixed=True)
+    loop_us = (time.perf_counter() - start_clock) / LEGACY_TIMED * 1e6
+
+    print(f"查表计费: {INTERVALS:,} 个区间共 {table_us * INTERVALS / 1e6:.2f} 秒，平均 {table_us:.2f} us/次")
+    print(f"逐段循环: 平均 {loop_us:.2f} us/次（{LEGACY_TIMED:,} 个区间），"
+          f"一百万个区间约 {loop_us:.0f} 秒")
+    return 0 if max_error < 1e-6 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
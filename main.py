@@ -1,5 +1,7 @@
 # main.py
+import sys
 import time
+from datetime import timedelta
 from models.charging_pile import FastChargingPile, TrickleChargingPile
 from repositories.repositories import *
 from services.user_service import UserService
@@ -24,7 +26,7 @@ def run_simulation():
     user_service = UserService(user_repo)
     billing_service = BillingService()
     charging_service = ChargingService(pile_repo, session_repo, bill_repo, request_repo, queue_repo, billing_service)
-    scheduler = SchedulingService(pile_repo, queue_repo, charging_service)
+    scheduler = SchedulingService(pile_repo, queue_repo, charging_service, request_repo)
     
     # 3. Setup Controllers (API/Presentation Layer)
     user_controller = UserController(user_service)
@@ -84,5 +86,30 @@ def run_simulation():
     driver_controller.check_queue_status()
 
 
+def run_event_simulation(num_cars: int = 3000, days: int = 7, fast_piles: int = 10,
+                         trickle_piles: int = 16, seed: int = 42,
+                         power_budget_kw: float = None, power_strategy: str = 'fair'):
+    """基于虚拟时钟的离散事件仿真，用于容量规划和调度路径的回归基准"""
+    from simulation.engine import SimulationEngine
+
+    print(f"--- Discrete-Event Simulation: {num_cars} cars, {days} days, "
+          f"{fast_piles} fast / {trickle_piles} trickle piles ---")
+    engine = SimulationEngine(fast_piles=fast_piles, trickle_piles=trickle_piles,
+                              power_budget_kw=power_budget_kw, power_strategy=power_strategy)
+    engine.generate_arrivals(num_cars, timedelta(days=days), seed=seed)
+    # 每天在第一个快充桩上注入一次 2 小时的故障
+    for day in range(days):
+        engine.add_fault(engine.start_time + timedelta(days=day, hours=12), "F01", timedelta(hours=2))
+    report = engine.run()
+    print(report.summary())
+    return report
+
+
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == 'sim':
+        # python main.py sim [站级功率预算kW] [分配策略]
+        budget = float(sys.argv[2]) if len(sys.argv) > 2 else None
+        strategy = sys.argv[3] if len(sys.argv) > 3 else 'fair'
+        run_event_simulation(power_budget_kw=budget, power_strategy=strategy)
+    else:
+        run_simulation()
\ No newline at end of file
@@ -2,6 +2,7 @@
 from dataclasses import dataclass
 from datetime import datetime
 from utils.enums import ChargeMode
+from utils.money import to_cents, to_yuan
 
 @dataclass
 class ChargingSession:
@@ -35,7 +36,11 @@ class ChargingSession:
 
 @dataclass
 class Bill:
-    """Represents the final bill for a completed charging session."""
+    """Represents the final bill for a completed charging session.
+
+    费用以整数分保存，总费用恒等于电费与服务费之和；charge_fee / service_fee / total_fee
+    为换算成元的只读属性。
+    """
     bill_id: str
     car_id: str
     pile_id: str
@@ -43,12 +48,27 @@ class Bill:
     end_time: datetime
     charged_kwh: float
     charge_mode: ChargeMode
-    charge_fee: float
-    service_fee: float
-    total_fee: float
+    charge_fee_cents: int
+    service_fee_cents: int
+
+    @property
+    def total_fee_cents(self) -> int:
+        return self.charge_fee_cents + self.service_fee_cents
+
+    @property
+    def charge_fee(self) -> float:
+        return to_yuan(self.charge_fee_cents)
+
+    @property
+    def service_fee(self) -> float:
+        return to_yuan(self.service_fee_cents)
+
+    @property
+    def total_fee(self) -> float:
+        return to_yuan(self.total_fee_cents)
 
     def to_dict(self) -> dict:
-        """将账单对象转换为字典"""
+        """将账单对象转换为字典（同时保留以元为单位的费用字段，兼容旧客户端）"""
         return {
             'bill_id': self.bill_id,
             'car_id': self.car_id,
@@ -59,12 +79,18 @@ class Bill:
             'charge_mode': self.charge_mode.value,
             'charge_fee': self.charge_fee,
             'service_fee': self.service_fee,
-            'total_fee': self.total_fee
+            'total_fee': self.total_fee,
+            'charge_fee_cents': self.charge_fee_cents,
+            'service_fee_cents': self.service_fee_cents
         }
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Bill':
-        """从字典创建账单对象"""
+        """从字典创建账单对象（旧数据只有以元为单位的费用，读取时换算为分）"""
+        if 'charge_fee_cents' in data:
+            charge_fee_cents, service_fee_cents = data['charge_fee_cents'], data['service_fee_cents']
+        else:
+            charge_fee_cents, service_fee_cents = to_cents(data['charge_fee']), to_cents(data['service_fee'])
         return cls(
             bill_id=data['bill_id'],
             car_id=data['car_id'],
@@ -73,7 +99,6 @@ class Bill:
             end_time=datetime.fromisoformat(data['end_time']),
             charged_kwh=data['charged_kwh'],
             charge_mode=ChargeMode(data['charge_mode']),
-            charge_fee=data['charge_fee'],
-            service_fee=data['service_fee'],
-            total_fee=data['total_fee']
+            charge_fee_cents=charge_fee_cents,
+            service_fee_cents=service_fee_cents
         )
\ No newline at end of file
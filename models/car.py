@@ -1,6 +1,7 @@
 # models/car.py
 from dataclasses import dataclass, field
 from datetime import datetime
+from models.charge_curve import DEFAULT_BATTERY_CLASS, get_charge_curve, resolve_start_soc
 from utils.enums import ChargeMode, CarState
 from typing import Optional, Dict, Any
 
@@ -14,6 +15,24 @@ class ChargingRequest:
     state: CarState = CarState.WAITING_IN_MAIN_QUEUE
     pile_id: Optional[str] = None
     queue_number: Optional[str] = None
+    priority: int = 0                     # 功率分配优先级，数值越大越优先
+    deadline: Optional[datetime] = None   # 期望完成时间（按截止时间分配功率时使用）
+    battery_capacity_kwh: Optional[float] = None  # 电池容量，未知时按恒定功率估算充电时长
+    battery_class: Optional[str] = None           # 电池类型（充电曲线），见 models.charge_curve
+    start_soc: Optional[float] = None             # 开始充电时的荷电状态（0~1）
+
+    def charge_hours(self, power_kw: float) -> float:
+        """按车辆的充电曲线估算在给定功率下充满请求电量所需的小时数"""
+        if not self.battery_capacity_kwh:
+            return self.request_amount_kwh / power_kw
+        curve = get_charge_curve(self.battery_class)
+        return curve.charge_hours(self.request_amount_kwh, power_kw, self.battery_capacity_kwh, self.start_soc)
+
+    def initial_soc(self) -> Optional[float]:
+        """开始充电时的荷电状态（未上报时按默认到站SOC推算），电池容量未知时返回None"""
+        if not self.battery_capacity_kwh:
+            return None
+        return resolve_start_soc(self.request_amount_kwh, self.battery_capacity_kwh, self.start_soc)
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -24,7 +43,12 @@ class ChargingRequest:
             'request_time': self.request_time.isoformat(),
             'state': self.state.value,
             'pile_id': self.pile_id,
-            'queue_number': self.queue_number
+            'queue_number': self.queue_number,
+            'priority': self.priority,
+            'deadline': self.deadline.isoformat() if self.deadline else None,
+            'battery_capacity_kwh': self.battery_capacity_kwh,
+            'battery_class': self.battery_class,
+            'start_soc': self.start_soc
         }
 
     @classmethod
@@ -39,6 +63,11 @@ class ChargingRequest:
         request.state = CarState(data['state'])
         request.pile_id = data.get('pile_id')
         request.queue_number = data.get('queue_number')
+        request.priority = data.get('priority', 0)
+        request.deadline = datetime.fromisoformat(data['deadline']) if data.get('deadline') else None
+        request.battery_capacity_kwh = data.get('battery_capacity_kwh')
+        request.battery_class = data.get('battery_class')
+        request.start_soc = data.get('start_soc')
         return request
 
 @dataclass
@@ -48,6 +77,7 @@ class Car:
     user_id: str
     capacity_kwh: float
     state: CarState = CarState.IDLE
+    battery_class: str = DEFAULT_BATTERY_CLASS  # 充电曲线类型
 
     def to_dict(self) -> dict:
         """将车辆对象转换为字典"""
@@ -55,7 +85,8 @@ class Car:
             'car_id': self.car_id,
             'user_id': self.user_id,
             'capacity_kwh': self.capacity_kwh,
-            'state': self.state.value
+            'state': self.state.value,
+            'battery_class': self.battery_class
         }
 
     @classmethod
@@ -65,5 +96,6 @@ class Car:
             car_id=data['car_id'],
             user_id=data['user_id'],
             capacity_kwh=data['capacity_kwh'],
-            state=CarState(data.get('state', CarState.IDLE.value))
+            state=CarState(data.get('state', CarState.IDLE.value)),
+            battery_class=data.get('battery_class', DEFAULT_BATTERY_CLASS)
         )
\ No newline at end of file
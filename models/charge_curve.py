@@ -0,0 +1,149 @@
+# models/charge_curve.py
+import math
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BATTERY_CLASS = 'standard'
+DEFAULT_START_SOC = 0.2  # 未上报荷电状态时假设的到站SOC
+
+
+class ChargeCurve:
+    """电池充电曲线
+
+    points 为 (荷电状态SOC, 最大充电倍率C) 组成的折线，SOC 从 0 到 1，
+    电池在该 SOC 下可接受的最大功率 = C倍率 × 电池容量。实际充电功率取
+    min(充电桩功率, 电池可接受功率)，因此 SOC 较高时充电逐渐变慢。
+
+    从 s0 充到 s1 所需时长（小时）为 ∫ ds / min(r, c(s))，r = 充电桩功率 / 电池容量。
+    c(s) 在每段折线上是线性函数，积分有闭式解（对数形式），与 r 的交点也可直接解出。
+    对每个 r 预先算出各折点处的累计时长表，之后每次查询只需一次二分查找加一段闭式积分。
+    """
+
+    _MAX_CACHED_RATES = 4096
+
+    def __init__(self, name: str, points: Sequence[Tuple[float, float]]):
+        points = sorted((float(soc), float(c_rate)) for soc, c_rate in points)
+        if len(points) < 2 or points[0][0] != 0.0 or points[-1][0] != 1.0:
+            raise ValueError("充电曲线必须覆盖 SOC 0 到 1")
+        if any(c_rate <= 0 for _, c_rate in points):
+            raise ValueError("充电倍率必须大于0")
+        if any(b[0] <= a[0] for a, b in zip(points, points[1:])):
+            raise ValueError("充电曲线的 SOC 折点不能重复")
+        self.name = name
+        self._socs = [soc for soc, _ in points]
+        self._rates = [c_rate for _, c_rate in points]
+        self._tables: Dict[float, List[float]] = {}
+
+    def c_rate(self, soc: float) -> float:
+        """SOC 处电池可接受的最大充电倍率"""
+        soc = min(max(soc, 0.0), 1.0)
+        i = min(bisect_right(self._socs, soc) - 1, len(self._socs) - 2)
+        return self._line(i, soc)
+
+    def _line(self, i: int, soc: float) -> float:
+        s0, s1 = self._socs[i], self._socs[i + 1]
+        c0, c1 = self._rates[i], self._rates[i + 1]
+        return c0 + (c1 - c0) * (soc - s0) / (s1 - s0)
+
+    def _segment_hours(self, i: int, a: float, b: float, r: float) -> float:
+        """第 i 段折线上 [a, b] 区间的 ∫ ds / min(r, c(s))"""
+        if b <= a:
+            return 0.0
+        s0, s1 = self._socs[i], self._socs[i + 1]
+        c0, c1 = self._rates[i], self._rates[i + 1]
+        k = (c1 - c0) / (s1 - s0)
+        if k == 0.0:
+            return (b - a) / min(r, c0)
+        # c(s) 与 r 的交点把区间分成 “受充电桩限制” 和 “受电池限制” 两部分
+        cross = s0 + (r - c0) / k
+        bounds = [a, cross, b] if a < cross < b else [a, b]
+        hours = 0.0
+        for u, v in zip(bounds, bounds[1:]):
+            cu, cv = c0 + k * (u - s0), c0 + k * (v - s0)
+            if (cu + cv) / 2 >= r:
+                hours += (v - u) / r
+            else:
+                hours += math.log(cv / cu) / k
+        return hours
+
+    def _table(self, r: float) -> List[float]:
+        """各折点处从 SOC 0 起算的累计时长，按 r 缓存"""
+        table = self._tables.get(r)
+        if table is None:
+            if len(self._tables) >= self._MAX_CACHED_RATES:
+                self._tables.clear()
+            table = [0.0]
+            for i in range(len(self._socs) - 1):
+                table.append(table[-1] + self._segment_hours(i, self._socs[i], self._socs[i + 1], r))
+            self._tables[r] = table
+        return table
+
+    def _cumulative(self, soc: float, r: float, table: List[float]) -> float:
+        i = min(bisect_right(self._socs, soc) - 1, len(self._socs) - 2)
+        return table[i] + self._segment_hours(i, self._socs[i], soc, r)
+
+    def hours(self, soc_from: float, soc_to: float, r: float) -> float:
+        """以倍率上限 r（充电桩功率/电池容量）从 soc_from 充到 soc_to 所需的小时数"""
+        soc_from = min(max(soc_from, 0.0), 1.0)
+        soc_to = min(max(soc_to, 0.0), 1.0)
+        if soc_to <= soc_from:
+            return 0.0
+        table = self._table(r)
+        return self._cumulative(soc_to, r, table) - self._cumulative(soc_from, r, table)
+
+    def charge_hours(self, amount_kwh: float, pile_kw: float, capacity_kwh: Optional[float],
+                     start_soc: Optional[float] = None) -> float:
+        """在给定充电桩功率下充入 amount_kwh 所需的小时数
+
+        Args:
+            amount_kwh: 充电量（度）
+            pile_kw: 充电桩（或分配到的）功率（千瓦）
+            capacity_kwh: 电池容量（度），未知时按恒定功率计算
+            start_soc: 开始充电时的荷电状态，未知时按 resolve_start_soc 推算
+
+        Returns:
+            float: 充电时长（小时）
+        """
+        if amount_kwh <= 0:
+            return 0.0
+        if not capacity_kwh or capacity_kwh <= 0:
+            return amount_kwh / pile_kw
+        soc_from = resolve_start_soc(amount_kwh, capacity_kwh, start_soc)
+        soc_to = soc_from + amount_kwh / capacity_kwh
+        hours = self.hours(soc_from, soc_to, pile_kw / capacity_kwh)
+        if soc_to > 1.0:
+            # 请求电量超过电池剩余容量的部分按满电时的功率估算
+            hours += (soc_to - 1.0) * capacity_kwh / min(pile_kw, self._rates[-1] * capacity_kwh)
+        return hours
+
+
+def resolve_start_soc(amount_kwh: float, capacity_kwh: float, start_soc: Optional[float] = None) -> float:
+    """开始充电时的荷电状态：优先使用上报值，否则假设到站SOC为 DEFAULT_START_SOC，
+    且保证充完请求电量时不超过满电"""
+    if start_soc is not None:
+        return min(max(start_soc, 0.0), 1.0)
+    return max(min(DEFAULT_START_SOC, 1.0 - amount_kwh / capacity_kwh), 0.0)
+
+
+# 按电池类型登记的充电曲线
+CHARGE_CURVES: Dict[str, ChargeCurve] = {
+    # 恒定功率（不考虑电池限制），与旧的 请求电量/功率 估算一致
+    'constant': ChargeCurve('constant', [(0.0, 1e9), (1.0, 1e9)]),
+    # 常见三元锂电池：80% 以后明显降功率
+    'standard': ChargeCurve('standard', [(0.0, 1.5), (0.5, 1.5), (0.8, 0.8), (0.9, 0.4), (1.0, 0.1)]),
+    # 磷酸铁锂等保守曲线：更早开始降功率
+    'conservative': ChargeCurve('conservative', [(0.0, 1.0), (0.6, 1.0), (0.8, 0.5), (0.95, 0.2), (1.0, 0.05)]),
+}
+
+
+def get_charge_curve(battery_class: Optional[str] = None) -> ChargeCurve:
+    """按电池类型获取充电曲线，未指定时使用默认类型"""
+    curve = CHARGE_CURVES.get(battery_class or DEFAULT_BATTERY_CLASS)
+    if curve is None:
+        raise ValueError(f"未知的电池类型: {battery_class}")
+    return curve
+
+
+def register_charge_curve(curve: ChargeCurve):
+    """登记（或替换）一种电池类型的充电曲线"""
+    CHARGE_CURVES[curve.name] = curve
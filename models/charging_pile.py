@@ -6,6 +6,7 @@ from utils.enums import WorkState, ChargeMode, CarState
 from models.car import ChargingRequest
 from models.bill import ChargingSession
 from datetime import datetime
+from utils.money import to_cents, to_yuan
 
 @dataclass
 class ChargingPile:
@@ -25,7 +26,12 @@ class ChargingPile:
     charged_kwh: float = 0.0
     total_charged_kwh: float = 0.0
     total_charging_count: int = 0
-    total_income: float = 0.0
+    total_income_cents: int = 0  # 累计收入（分）
+
+    @property
+    def total_income(self) -> float:
+        """累计收入（元）"""
+        return to_yuan(self.total_income_cents)
 
     def add_to_local_queue(self, request: ChargingRequest):
         if len(self.local_queue) < self.local_queue.maxlen and not self.is_faulty:
@@ -60,7 +66,8 @@ class ChargingPile:
             'total_charged_kwh': self.total_charged_kwh,
             'total_charging_time': self.total_charging_time,
             'total_charging_count': self.total_charging_count,
-            'total_income': self.total_income
+            'total_income': self.total_income,
+            'total_income_cents': self.total_income_cents
         }
     
     @classmethod
@@ -78,24 +85,25 @@ class ChargingPile:
         pile.total_charged_kwh = data['total_charged_kwh']
         pile.total_charging_time = data['total_charging_time']
         pile.total_charging_count = data['total_charging_count']
-        pile.total_income = data['total_income']
+        pile.total_income_cents = (data['total_income_cents'] if 'total_income_cents' in data
+                                   else to_cents(data['total_income']))
         return pile
     
-    def start_charging(self, car_id: str):
+    def start_charging(self, car_id: str, now: Optional[datetime] = None):
         """开始充电"""
         self.current_car_id = car_id
-        self.start_time = datetime.now()
+        self.start_time = now or datetime.now()
         self.charged_kwh = 0.0
         self.state = WorkState.CHARGING
     
-    def end_charging(self, charged_kwh: float, income: float):
-        """结束充电"""
+    def end_charging(self, charged_kwh: float, income_cents: int, now: Optional[datetime] = None):
+        """结束充电，income_cents 为本次收入（分）"""
         if self.start_time:
-            duration = (datetime.now() - self.start_time).total_seconds() / 3600
+            duration = ((now or datetime.now()) - self.start_time).total_seconds() / 3600
             self.total_charging_time += duration
             self.total_charged_kwh += charged_kwh
             self.total_charging_count += 1
-            self.total_income += income
+            self.total_income_cents += income_cents
         
         self.current_car_id = None
         self.start_time = None
@@ -0,0 +1,45 @@
+# models/reservation.py
+from dataclasses import dataclass, field
+from datetime import datetime
+from utils.enums import ChargeMode
+
+
+@dataclass
+class Reservation:
+    """充电桩时段预约"""
+    reservation_id: str
+    car_id: str
+    pile_id: str
+    charge_mode: ChargeMode
+    start_time: datetime
+    end_time: datetime
+    created_at: datetime = field(default_factory=datetime.now)
+
+    def is_active(self, now: datetime) -> bool:
+        """预约时段是否已开始且未结束"""
+        return self.start_time <= now < self.end_time
+
+    def to_dict(self) -> dict:
+        """将预约对象转换为字典"""
+        return {
+            'reservation_id': self.reservation_id,
+            'car_id': self.car_id,
+            'pile_id': self.pile_id,
+            'charge_mode': self.charge_mode.value,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'created_at': self.created_at.isoformat()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Reservation':
+        """从字典创建预约对象"""
+        return cls(
+            reservation_id=data['reservation_id'],
+            car_id=data['car_id'],
+            pile_id=data['pile_id'],
+            charge_mode=ChargeMode(data['charge_mode']),
+            start_time=datetime.fromisoformat(data['start_time']),
+            end_time=datetime.fromisoformat(data['end_time']),
+            created_at=datetime.fromisoformat(data['created_at'])
+        )
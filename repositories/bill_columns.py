@@ -0,0 +1,551 @@
+# repositories/bill_columns.py
+import hashlib
+import json
+import os
+import threading
+from array import array
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时列保存在 array 中，聚合退化为逐行循环
+    np = None
+
+from models.bill import Bill
+from utils.enums import ChargeMode
+from utils.ids import is_ulid, ulid_to_bytes
+from utils.money import to_yuan
+
+# 列名 -> array 类型码（本机字节序，numpy 使用同名类型码）
+COLUMNS = (
+    ('start_us', 'q'),        # 开始时间，墙上时间的整数微秒
+    ('end_us', 'q'),          # 结束时间
+    ('pile', 'i'),            # 充电桩编码，对应 piles.json 中的下标
+    ('mode', 'b'),            # 充电模式在 ChargeMode 中的下标
+    ('kwh', 'd'),
+    ('charge_cents', 'q'),
+    ('service_cents', 'q'),
+    ('live', 'b'),            # 账单删除后置 0
+)
+GROUP_BY = ('pile', 'mode', 'hour', 'weekday', 'day', 'month')
+
+_KEY_SIZE = 16
+_MODES = list(ChargeMode)
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+_US_PER_HOUR = 3_600_000_000
+_US_PER_DAY = 24 * _US_PER_HOUR
+# 混合进制组合下标的取值范围超过行数的该倍数（且超过 _DENSE_MIN_SLOTS）时，先压缩为实际出现的组号再 bincount
+_DENSE_FACTOR = 4
+_DENSE_MIN_SLOTS = 1 << 16
+
+
+def _wall_us(moment: datetime) -> int:
+    return (((moment.toordinal() - _EPOCH_ORDINAL) * 86400 + moment.hour * 3600 + moment.minute * 60
+             + moment.second) * 1_000_000 + moment.microsecond)
+
+
+def _key_bytes(bill_id: str) -> bytes:
+    """账单ID的16字节定长键：ULID 直接取二进制，旧数据的UUID等其他ID取哈希"""
+    if is_ulid(bill_id):
+        return ulid_to_bytes(bill_id)
+    return hashlib.blake2b(bill_id.encode('utf-8'), digest_size=_KEY_SIZE).digest()
+
+
+class BillColumnStore:
+    """账单的列式影子存储
+
+    每个字段一列（见 COLUMNS），同一行号对应同一张账单，追加顺序即账单入库顺序。
+    作为 BillRepository 的监听者，账单插入时追加一行，改写时原地更新，删除时置 live=0，
+    因此聚合查询不需要为每张账单构造 Bill 和 datetime 对象，直接对整列做向量化运算。
+
+    持久化时每列一个定长二进制文件（data/bill_columns/<列名>.bin），另有账单键文件
+    keys.bin 和充电桩编码表 piles.json。新行追加到文件末尾；启动时已有的行用 numpy.memmap
+    映射（不读入内存），之后追加的行保存在 array 中。各列长度不一致（追加中途退出）时
+    截断到最短的一列；与账单仓库的账单集合或总费用不一致时从账单仓库重建。
+
+    有 numpy 时，查询用的整列数据第一次使用时拼接为一个留有余量的缓冲区，之后的追加和改写
+    直接写入缓冲区（容量不足时按倍数扩容），不会让下一次查询重新拼接全部行。
+    查询只在锁内取出各列当前行数的视图，在锁外计算，不阻塞调度线程写入账单；
+    计算期间被改写的行可能读到改写前或改写后的值。
+    """
+
+    def __init__(self, bill_repo, persist: bool = True, directory: str = 'data/bill_columns'):
+        self._persist = persist
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._piles: List[str] = []
+        self._pile_codes: Dict[str, int] = {}
+        self._rows: Dict[bytes, int] = {}
+        self._base: Dict[str, 'np.ndarray'] = {}          # 启动时映射的行
+        self._tail: Dict[str, array] = {name: array(code) for name, code in COLUMNS}
+        self._base_rows = 0
+        self._files = {}
+        self._cache: Dict[str, 'np.ndarray'] = {}         # 列名 -> 含全部行的缓冲区（容量可大于行数）
+
+        if self._persist:
+            os.makedirs(self._directory, exist_ok=True)
+            self._load()
+            if not self._matches(bill_repo):
+                self._rebuild(bill_repo.get_all())
+        else:
+            self._append_many(bill_repo.get_all())
+
+        bill_repo.add_listener(self._on_bills_changed)
+
+    def __len__(self) -> int:
+        return self._base_rows + len(self._tail['live'])
+
+    # ---------- 持久化 ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+    def _open(self, filename: str):
+        path = self._path(filename)
+        return open(path, 'r+b' if os.path.exists(path) else 'w+b')
+
+    def _load(self):
+        piles_path = self._path('piles.json')
+        if os.path.exists(piles_path):
+            with open(piles_path, 'r', encoding='utf-8') as f:
+                self._piles = json.load(f)
+            self._pile_codes = {pile_id: code for code, pile_id in enumerate(self._piles)}
+
+        files = [('keys.bin', _KEY_SIZE)] + [(f"{name}.bin", array(code).itemsize) for name, code in COLUMNS]
+        for filename, itemsize in files:
+            self._files[filename] = self._open(filename)
+        rows = min(os.path.getsize(self._path(filename)) // itemsize for filename, itemsize in files)
+        for filename, itemsize in files:
+            self._files[filename].truncate(rows * itemsize)
+
+        keys_file = self._files['keys.bin']
+        keys_file.seek(0)
+        keys = keys_file.read(rows * _KEY_SIZE)
+        self._rows = {keys[i * _KEY_SIZE:(i + 1) * _KEY_SIZE]: i for i in range(rows)}
+
+        for name, code in COLUMNS:
+            if np is not None:
+                self._base[name] = (np.memmap(self._path(f"{name}.bin"), dtype=np.dtype(code), mode='r+', shape=(rows,))
+                                    if rows else np.empty(0, dtype=np.dtype(code)))
+            else:
+                column = self._files[f"{name}.bin"]
+                column.seek(0)
+                self._tail[name].fromfile(column, rows)
+        self._base_rows = rows if np is not None else 0
+
+    def _matches(self, bill_repo) -> bool:
+        """列存储中的账单集合和总费用是否与账单仓库一致"""
+        live, charge, service = self._column('live'), self._column('charge_cents'), self._column('service_cents')
+        keys = {key for key, row in self._rows.items() if live[row]}
+        if keys != {_key_bytes(bill_id) for bill_id in bill_repo.data}:
+            return False
+        if np is None:
+            cents = sum(c + s for c, s, alive in zip(charge, service, live) if alive)
+        else:
+            cents = int((charge + service)[live != 0].sum())
+        return cents == sum(bill.total_fee_cents for bill in bill_repo.get_all())
+
+    def _rebuild(self, bills: List[Bill]):
+        print(f"[BillColumnStore] Rebuilding bill columns from {len(bills)} bills")
+        # 先释放对旧文件的映射再截断
+        self._cache.clear()
+        self._base.clear()
+        self._base_rows = 0
+        for column in self._files.values():
+            column.truncate(0)
+        self._tail = {name: array(code) for name, code in COLUMNS}
+        self._rows = {}
+        if np is not None:
+            self._base = {name: np.empty(0, dtype=np.dtype(code)) for name, code in COLUMNS}
+        self._append_many(bills)
+
+    def _save_piles(self):
+        if not self._persist:
+            return
+        temp_file = self._path('piles.json.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._piles, f)
+        os.replace(temp_file, self._path('piles.json'))
+
+    # ---------- 写入 ----------
+
+    def _pile_code(self, pile_id: str) -> int:
+        code = self._pile_codes.get(pile_id)
+        if code is None:
+            code = self._pile_codes[pile_id] = len(self._piles)
+            self._piles.append(pile_id)
+            self._save_piles()
+        return code
+
+    def _values(self, bill: Bill) -> Tuple:
+        return (_wall_us(bill.start_time), _wall_us(bill.end_time), self._pile_code(bill.pile_id),
+                _MODES.index(bill.charge_mode), bill.charged_kwh, bill.charge_fee_cents, bill.service_fee_cents, 1)
+
+    def _append_many(self, bills: List[Bill]):
+        new_rows = {name: array(code) for name, code in COLUMNS}
+        keys = []
+        for bill in bills:
+            key = _key_bytes(bill.bill_id)
+            self._rows[key] = len(self) + len(keys)
+            keys.append(key)
+            for (name, _), value in zip(COLUMNS, self._values(bill)):
+                new_rows[name].append(value)
+        rows = len(self)
+        for name, _ in COLUMNS:
+            self._tail[name].extend(new_rows[name])
+            if name in self._cache:
+                self._extend_cache(name, rows, new_rows[name])
+        if self._persist:
+            self._write_at('keys.bin', None, b''.join(keys))
+            for name, _ in COLUMNS:
+                self._write_at(f"{name}.bin", None, new_rows[name].tobytes())
+
+    def _write_at(self, filename: str, offset: Optional[int], data: bytes):
+        """写入列文件，offset 为 None 时追加到末尾"""
+        column = self._files[filename]
+        if offset is None:
+            column.seek(0, os.SEEK_END)
+        else:
+            column.seek(offset)
+        column.write(data)
+
+    def _extend_cache(self, name: str, rows: int, values: array):
+        """把新行写入缓存的缓冲区（rows 为追加前的行数）；正在计算的查询持有的是旧行的视图，不受影响"""
+        buffer = self._cache[name]
+        needed = rows + len(values)
+        if needed > len(buffer):
+            grown = np.empty(max(needed, 2 * len(buffer)), dtype=buffer.dtype)
+            grown[:rows] = buffer[:rows]
+            buffer = self._cache[name] = grown
+        if values:
+            buffer[rows:needed] = np.frombuffer(values, dtype=buffer.dtype)
+
+    def _set(self, row: int, values: Tuple):
+        for (name, code), value in zip(COLUMNS, values):
+            if name in self._cache:
+                self._cache[name][row] = value
+            if row < self._base_rows:
+                self._base[name][row] = value  # memmap 直接写回文件
+            else:
+                self._tail[name][row - self._base_rows] = value
+                if self._persist:
+                    self._write_at(f"{name}.bin", row * array(code).itemsize, array(code, [value]).tobytes())
+
+    def _on_bills_changed(self, changes: List[Tuple[Optional[Bill], Optional[Bill]]]):
+        with self._lock:
+            inserted = []
+            for previous, current in changes:
+                row = self._rows.get(_key_bytes((current or previous).bill_id))
+                if row is None:
+                    if current is not None:
+                        inserted.append(current)
+                elif current is None:
+                    self._set(row, self._values(previous)[:-1] + (0,))
+                else:
+                    self._set(row, self._values(current))
+            self._append_many(inserted)
+            self._flush()
+
+    def _flush(self):
+        if not self._persist:
+            return
+        for column in self._base.values():
+            if isinstance(column, np.memmap):
+                column.flush()
+        for column in self._files.values():
+            column.flush()
+
+    def close(self):
+        """关闭列文件"""
+        with self._lock:
+            self._flush()
+            for column in self._files.values():
+                column.close()
+            self._files.clear()
+
+    # ---------- 查询 ----------
+
+    def _column(self, name: str):
+        """整列数据（调用方持有锁）：有 numpy 时为 ndarray 视图，否则为 array
+
+        有 numpy 且没有追加过新行时直接返回映射的列；否则返回缓存缓冲区前 len(self) 行的视图，
+        缓冲区不存在时把映射部分与追加部分拼接到一个留有一半余量的新缓冲区中。
+        """
+        if np is None:
+            return self._tail[name]
+        rows = len(self)
+        buffer = self._cache.get(name)
+        if buffer is None:
+            tail = self._tail[name]
+            if not tail:
+                return self._base[name] if name in self._base else np.empty(0, dtype=np.dtype(tail.typecode))
+            buffer = np.empty(rows + rows // 2, dtype=np.dtype(tail.typecode))
+            if self._base_rows:
+                buffer[:self._base_rows] = self._base[name]
+            buffer[self._base_rows:rows] = np.frombuffer(tail, dtype=buffer.dtype)
+            self._cache[name] = buffer
+        return buffer[:rows]
+
+    def _snapshot_columns(self, names) -> Dict[str, object]:
+        """在锁内取出各列当前全部行（numpy 视图，或无 numpy 时 array 的副本），供锁外计算"""
+        with self._lock:
+            if np is None:
+                return {name: self._tail[name][:] for name in names}
+            return {name: self._column(name) for name in names}
+
+    def _label(self, by: str, key: int):
+        if by == 'pile':
+            return self._piles[key]
+        if by == 'mode':
+            return _MODES[key].value
+        if by == 'day':
+            return date.fromordinal(key + _EPOCH_ORDINAL).isoformat()
+        if by == 'month':
+            return f"{1970 + key // 12:04d}-{key % 12 + 1:02d}"
+        return key
+
+    @staticmethod
+    def _row(count: int, duration_us: float, kwh: float, charge_cents: int, service_cents: int) -> dict:
+        return {
+            'charge_count': count,
+            'charge_duration': round(duration_us / _US_PER_HOUR, 2),  # 小时
+            'charged_kwh': round(kwh, 2),
+            'charge_fee': to_yuan(charge_cents),
+            'service_fee': to_yuan(service_cents),
+            'total_fee': to_yuan(charge_cents + service_cents),
+            'charge_fee_cents': charge_cents,
+            'service_fee_cents': service_cents,
+            'total_fee_cents': charge_cents + service_cents
+        }
+
+    def filters(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                pile_id: Optional[str] = None) -> Optional[Tuple[Optional[int], Optional[int], Optional[int]]]:
+        """把查询条件转换为列上的过滤条件 (起始微秒, 结束微秒, 充电桩编码)，充电桩不存在时返回 None"""
+        if pile_id is not None and pile_id not in self._pile_codes:
+            return None
+        return (_wall_us(start) if start else None, _wall_us(end) if end else None,
+                self._pile_codes[pile_id] if pile_id is not None else None)
+
+    def format_totals(self, by: Tuple[str, ...], totals: Dict[Tuple[int, ...], list]) -> List[dict]:
+        """把 aggregate_columns 的结果转换为按组排序的行
+
+        每行包含各分组维度的取值和汇总值；group 为组的取值（单一维度时为该值，多个维度时为列表）。
+        """
+        rows = []
+        for key in sorted(totals):
+            labels = [self._label(dim, value) for dim, value in zip(by, key)]
+            row = {'group': labels[0] if len(labels) == 1 else labels}
+            row.update(zip(by, labels))
+            row.update(self._row(*totals[key]))
+            rows.append(row)
+        return rows
+
+    def partitions(self, count: int, start_us: Optional[int] = None,
+                   end_us: Optional[int] = None) -> Optional[Tuple[str, List[Tuple[int, int]]]]:
+        """把当前各行按行号切成 count 段，供其他进程直接读取列文件分段汇总
+
+        行按入库（结算）顺序追加，因此每一段对应一段连续的结算时间；有 numpy 时先把范围
+        收窄到落在 [start_us, end_us) 内的首末行。各段仍会按时间精确过滤，与行是否严格有序无关。
+
+        Returns:
+            (列文件目录, [(起始行, 结束行)...])；未持久化时返回 None
+        """
+        if not self._persist:
+            return None
+        with self._lock:
+            self._flush()
+            lo, hi = 0, len(self)
+            end_column = self._column('end_us') if np is not None else None
+        if end_column is not None and hi and (start_us is not None or end_us is not None):
+            mask = np.ones(hi, dtype=bool)
+            if start_us is not None:
+                mask &= end_column >= start_us
+            if end_us is not None:
+                mask &= end_column < end_us
+            rows = np.flatnonzero(mask)
+            lo, hi = (int(rows[0]), int(rows[-1]) + 1) if len(rows) else (0, 0)
+        step = max(-(-(hi - lo) // max(count, 1)), 1)
+        return self._directory, [(row, min(row + step, hi)) for row in range(lo, hi, step)]
+
+    def aggregate(self, by: Tuple[str, ...], start_us: Optional[int] = None, end_us: Optional[int] = None,
+                  pile_code: Optional[int] = None) -> Dict[Tuple[int, ...], list]:
+        """在本进程内对全部行分组汇总（参数和结果同 aggregate_columns），锁内只取列视图"""
+        columns = self._snapshot_columns(name for name, _ in COLUMNS)
+        return aggregate_columns(columns, by, start_us, end_us, pile_code)
+
+    def group_totals(self, by='pile', start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     pile_id: Optional[str] = None) -> List[dict]:
+        """按一个或多个维度分组汇总账单
+
+        Args:
+            by: 分组维度 pile / mode / hour（结束时间所在小时）/ weekday / day / month，
+                或多个维度组成的序列（如 ('pile', 'hour')）
+            start: 只统计结束时间不早于该时间的账单
+            end: 只统计结束时间早于该时间的账单
+            pile_id: 只统计该充电桩的账单
+
+        Returns:
+            List[dict]: 每组一行（充电次数、时长、电量、电费、服务费、总费用），按组排序
+        """
+        by = check_group_by(by)
+        filters = self.filters(start, end, pile_id)
+        if filters is None:
+            return []
+        return self.format_totals(by, self.aggregate(by, *filters))
+
+
+def check_group_by(by) -> Tuple[str, ...]:
+    """规范化分组维度为元组，维度无效时抛出 ValueError"""
+    by = (by,) if isinstance(by, str) else tuple(by)
+    if not by or any(dim not in GROUP_BY for dim in by):
+        raise ValueError(f"无效的分组维度: {by}")
+    return by
+
+
+def _dim_keys(dim: str, end_us, pile, mode):
+    """一个分组维度的整数组键（对 numpy 数组逐元素，或对单个值）"""
+    if dim == 'pile':
+        return pile
+    if dim == 'mode':
+        return mode
+    if dim == 'hour':
+        return end_us // _US_PER_HOUR % 24
+    if dim == 'weekday':  # 1970-01-01 是星期四，0 为星期一
+        return (end_us // _US_PER_DAY + 3) % 7
+    if dim == 'day':
+        return end_us // _US_PER_DAY
+    # month：自 1970-01 起的月数
+    if np is not None and isinstance(end_us, np.ndarray):
+        return end_us.astype('datetime64[us]').astype('datetime64[M]').astype(np.int64)
+    day = date.fromordinal(end_us // _US_PER_DAY + _EPOCH_ORDINAL)
+    return (day.year - 1970) * 12 + day.month - 1
+
+
+def aggregate_columns(columns, by: Tuple[str, ...], start_us: Optional[int] = None, end_us: Optional[int] = None,
+                      pile_code: Optional[int] = None) -> Dict[Tuple[int, ...], list]:
+    """对一组列（同一批行）分组汇总
+
+    Args:
+        columns: 列名 -> 列数据（numpy 数组或 array）
+        by: 分组维度
+        start_us / end_us: 只统计结束时间在 [start_us, end_us) 内的行
+        pile_code: 只统计该充电桩编码的行
+
+    Returns:
+        组键元组 -> [次数, 时长微秒, 电量, 电费分, 服务费分]；可以直接用 merge_totals 合并
+    """
+    if np is None or not isinstance(columns['end_us'], np.ndarray):
+        return _aggregate_python(columns, by, start_us, end_us, pile_code)
+
+    end_column = columns['end_us']
+    mask = columns['live'] != 0
+    if start_us is not None:
+        mask &= end_column >= start_us
+    if end_us is not None:
+        mask &= end_column < end_us
+    if pile_code is not None:
+        mask &= columns['pile'] == pile_code
+    # 没有过滤掉任何行时直接使用整列，省去按掩码复制
+    select = (lambda name: columns[name]) if mask.all() else (lambda name: columns[name][mask])
+    end_column = select('end_us')
+    if not len(end_column):
+        return {}
+    pile, mode = select('pile'), select('mode')
+    # 各维度的组键都是取值范围不大的整数：减去最小值后按混合进制合成一个下标，
+    # 直接用 bincount 分组，O(行数)，无需排序。多个维度的取值范围相乘可能远大于实际的组数
+    # （如多年范围按 day,hour,pile 分组），bincount 的输出长度等于该乘积，因此乘积超过行数的
+    # _DENSE_FACTOR 倍时先用 np.unique 把已合成的下标压缩为实际出现的组号（O(行数·log 行数)），
+    # 输出长度不超过行数的常数倍
+    limit = max(_DENSE_FACTOR * len(end_column), _DENSE_MIN_SLOTS)
+    dim_keys, offsets, sizes = [], [], []
+    index = np.zeros(len(end_column), dtype=np.int64)
+    slots = 1
+    compacted = False
+    for dim in by:
+        keys = _dim_keys(dim, end_column, pile, mode).astype(np.int64)
+        offset = int(keys.min())
+        size = int(keys.max()) - offset + 1
+        if slots * size > limit:
+            uniques, index = np.unique(index, return_inverse=True)
+            slots = len(uniques)
+            compacted = True
+        index = index * size + (keys - offset)
+        slots *= size
+        dim_keys.append(keys)
+        offsets.append(offset)
+        sizes.append(size)
+    first = None
+    if compacted or slots > limit:
+        # 组号与各维度键不再能按进制还原，记录每组第一行，从该行取各维度的键
+        _, first, index = np.unique(index, return_index=True, return_inverse=True)
+    counts = np.bincount(index)
+    duration = np.bincount(index, weights=end_column - select('start_us'))
+    kwh = np.bincount(index, weights=select('kwh'))
+    # 分的总和在 2**53 以内，float64 累加是精确的
+    charge = np.bincount(index, weights=select('charge_cents'))
+    service = np.bincount(index, weights=select('service_cents'))
+
+    totals = {}
+    for i in np.flatnonzero(counts):
+        if first is not None:
+            row = first[i]
+            key = tuple(int(keys[row]) for keys in dim_keys)
+        else:
+            values, rest = [], int(i)
+            for offset, size in zip(reversed(offsets), reversed(sizes)):
+                rest, value = divmod(rest, size)
+                values.append(value + offset)
+            key = tuple(reversed(values))
+        totals[key] = [int(counts[i]), float(duration[i]), float(kwh[i]), int(charge[i]), int(service[i])]
+    return totals
+
+
+def _aggregate_python(columns, by: Tuple[str, ...], start_us: Optional[int], end_us: Optional[int],
+                      pile_code: Optional[int]) -> Dict[Tuple[int, ...], list]:
+    totals: Dict[Tuple[int, ...], list] = {}
+    for start, end, pile, mode, kwh, charge_cents, service_cents, live in zip(
+            *(columns[name] for name, _ in COLUMNS)):
+        if not live or (start_us is not None and end < start_us) or (end_us is not None and end >= end_us) \
+                or (pile_code is not None and pile != pile_code):
+            continue
+        key = tuple(_dim_keys(dim, end, pile, mode) for dim in by)
+        entry = totals.get(key)
+        if entry is None:
+            entry = totals[key] = [0, 0, 0.0, 0, 0]
+        entry[0] += 1
+        entry[1] += end - start
+        entry[2] += kwh
+        entry[3] += charge_cents
+        entry[4] += service_cents
+    return totals
+
+
+def merge_totals(parts) -> Dict[Tuple[int, ...], list]:
+    """合并多个分段的汇总结果"""
+    merged: Dict[Tuple[int, ...], list] = {}
+    for part in parts:
+        for key, values in part.items():
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    entry[i] += value
+    return merged
+
+
+def partition_totals(directory: str, lo: int, hi: int, by: Tuple[str, ...], start_us: Optional[int] = None,
+                     end_us: Optional[int] = None, pile_code: Optional[int] = None) -> Dict[Tuple[int, ...], list]:
+    """读取列文件中 [lo, hi) 行并分组汇总（在工作进程中运行，只读取本段的数据）"""
+    columns = {}
+    for name, code in COLUMNS:
+        itemsize = array(code).itemsize
+        with open(os.path.join(directory, f"{name}.bin"), 'rb') as f:
+            f.seek(lo * itemsize)
+            if np is not None:
+                columns[name] = np.fromfile(f, dtype=np.dtype(code), count=hi - lo)
+            else:
+                columns[name] = array(code)
+                columns[name].fromfile(f, hi - lo)
+    return aggregate_columns(columns, by, start_us, end_us, pile_code)
@@ -1,28 +1,40 @@
-from collections import deque
-from typing import Dict, Optional, List, TypeVar, Generic
+from typing import Callable, Dict, Iterator, Mapping, Optional, List, Tuple, TypeVar, Generic
 from .base_repository import BaseRepository
 from models.car import ChargingRequest
-from utils.enums import ChargeMode
-from datetime import datetime
+from utils.enums import ChargeMode, WorkState
+from utils.indexed_queue import IndexedQueue
+from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right, insort
+import heapq
+import itertools
 import json
 import os
 import shutil
 import threading
 import time
+from types import MappingProxyType
 
 from models.user import User
 from models.car import Car, ChargingRequest
-from models.charging_pile import ChargingPile
+from models.charging_pile import ChargingPile, FastChargingPile, TrickleChargingPile
 from models.bill import ChargingSession, Bill
+from models.reservation import Reservation
+from utils.interval_index import IntervalIndex
+from utils.ids import is_ulid, ulid_lower_bound
 
 T = TypeVar('T')
 
 class Repository(Generic[T]):
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, persist: bool = True):
         self.file_path = file_path
         self.data: Dict[str, T] = {}
         self._lock = threading.Lock()  # 添加线程锁
         self._backup_dir = 'data/backups'
+        # persist=False 时仅在内存中保存数据（用于仿真和基准测试）
+        self._persist = persist
+        
+        if not self._persist:
+            return
         
         # 确保数据目录存在
         os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
@@ -60,6 +72,8 @@ class Repository(Generic[T]):
     
     def _save(self):
         """保存数据到文件"""
+        if not self._persist:
+            return
         try:
             # 创建备份
             if os.path.exists(self.file_path):
@@ -107,8 +121,8 @@ class Repository(Generic[T]):
             self._save()
 
 class UserRepository(Repository[User]):
-    def __init__(self):
-        super().__init__('data/users.json')
+    def __init__(self, persist: bool = True):
+        super().__init__('data/users.json', persist)
     
     def register_user(self, key: str, value: User) -> bool:
         """原子化检查并保存用户（解决竞态条件）"""
@@ -142,29 +156,218 @@ class UserRepository(Repository[User]):
         """根据用户ID查找用户（兼容旧接口）"""
         return self.get(user_id)
 
+    def find_car(self, car_id: str) -> Optional[Car]:
+        """按车辆ID查找车辆，只反序列化匹配的那一条"""
+        with self._lock:
+            for data in self.data.values():
+                car = data.get('car')
+                if car and car.get('car_id') == car_id:
+                    return Car.from_dict(car)
+        return None
+
 class PileRepository(Repository[ChargingPile]):
-    def __init__(self):
-        super().__init__('data/piles.json')
-    
+    """充电桩注册表
+
+    内存中保存每个充电桩唯一的权威对象，get() 返回的就是该对象本身，
+    因此任何服务对充电桩的修改都不会丢失。所有修改由调度线程执行（单写者）。
+
+    save() 只把新状态记入待发布的变更，snapshot() 发现有待发布的变更时才复制一次外层字典、
+    合并这些变更后发布新的只读快照（MappingProxyType），没有变更时无锁直接返回当前快照，
+    因此每个调度节拍保存全部充电桩时不会为每次保存复制一次快照；同时向变更日志 piles.log 追加一条完整状态记录，而不是重写整个
+    piles.json。checkpoint() 定期把全部状态写入 piles.json 并清空日志，
+    启动时先加载 piles.json 再按顺序重放日志。日志记录是完整状态，重复重放也是幂等的。
+
+    另外按模式维护充电桩索引和空闲/可用充电桩集合（有序字典），在 save() 时增量更新，
+    调度时无需扫描全部充电桩。
+    """
+
+    # 距上次检查点超过该秒数，或日志超过该条数时写检查点
+    CHECKPOINT_INTERVAL = 60.0
+    CHECKPOINT_MAX_RECORDS = 1000
+
+    def __init__(self, persist: bool = True):
+        self.piles: Dict[str, ChargingPile] = {}
+        self._snapshot = MappingProxyType({})
+        self._pending: Dict[str, Optional[dict]] = {}  # 尚未发布到快照的变更，None 表示已删除
+        self._log_path = 'data/piles.log'
+        self._log_file = None
+        self._log_records = 0
+        self._last_checkpoint = time.monotonic()
+        self._by_mode: Dict[ChargeMode, Dict[str, ChargingPile]] = {mode: {} for mode in ChargeMode}
+        self._idle: Dict[ChargeMode, Dict[str, ChargingPile]] = {mode: {} for mode in ChargeMode}
+        self._available: Dict[ChargeMode, Dict[str, ChargingPile]] = {mode: {} for mode in ChargeMode}
+        super().__init__('data/piles.json', persist)
+
+    @staticmethod
+    def _from_dict(data: dict) -> ChargingPile:
+        cls = FastChargingPile if ChargeMode(data['pile_type']) == ChargeMode.FAST else TrickleChargingPile
+        return cls.from_dict(data)
+
+    def _load(self):
+        """加载检查点并重放变更日志"""
+        super()._load()
+        if os.path.exists(self._log_path):
+            try:
+                with open(self._log_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            break  # 最后一行可能因崩溃而不完整
+                        self._apply(record)
+                        self._log_records += 1
+            except Exception as e:
+                print(f"重放充电桩变更日志失败: {str(e)}")
+        self.piles = {key: self._from_dict(value) for key, value in self.data.items()}
+        for key, pile in self.piles.items():
+            self._reindex(key, pile)
+        self._snapshot = MappingProxyType(
+            {key: MappingProxyType(value) for key, value in self.data.items()})
+        self._log_file = open(self._log_path, 'a', encoding='utf-8')
+
+    def _apply(self, record: dict):
+        if record['op'] == 'save':
+            self.data[record['key']] = record['value']
+        elif record['op'] == 'delete':
+            self.data.pop(record['key'], None)
+        elif record['op'] == 'clear':
+            self.data.clear()
+
+    def _append_log(self, record: dict):
+        if not self._persist:
+            return
+        try:
+            self._log_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._log_file.flush()
+            self._log_records += 1
+        except Exception as e:
+            print(f"写入充电桩变更日志失败: {str(e)}")
+
+    def _reindex(self, key: str, pile: Optional[ChargingPile]):
+        """按充电桩当前状态更新模式索引和空闲/可用集合"""
+        for index in (self._by_mode, self._idle, self._available):
+            for piles in index.values():
+                piles.pop(key, None)
+        if pile is None:
+            return
+        mode = pile.pile_type
+        self._by_mode[mode][key] = pile
+        if pile.state == WorkState.IDLE:
+            self._idle[mode][key] = pile
+        if pile.state in (WorkState.IDLE, WorkState.CHARGING):
+            self._available[mode][key] = pile
+
+    def _publish(self, key: str, value: Optional[dict]):
+        """记录一个待发布到快照的变更（调用方持有锁），下一次 snapshot() 时统一发布"""
+        self._pending[key] = value
+
     def save(self, key: str, value: ChargingPile):
-        """保存充电桩数据"""
-        self.data[key] = value.to_dict()
-        self._save()
-    
+        """登记或更新充电桩：记录变更日志并发布快照"""
+        with self._lock:
+            self.piles[key] = value
+            self._reindex(key, value)
+            state = value.to_dict()
+            self.data[key] = state
+            self._append_log({'op': 'save', 'key': key, 'value': state})
+            self._publish(key, state)
+
     def get(self, key: str) -> Optional[ChargingPile]:
-        """获取充电桩数据"""
-        data = self.data.get(key)
-        if data:
-            return ChargingPile.from_dict(data)
-        return None
-    
+        """获取充电桩的权威对象"""
+        return self.piles.get(key)
+
     def get_all(self) -> List[ChargingPile]:
-        """获取所有充电桩数据"""
-        return [ChargingPile.from_dict(data) for data in self.data.values()]
+        """获取所有充电桩的权威对象"""
+        return list(self.piles.values())
+
+    def get_by_mode(self, mode: ChargeMode) -> List[ChargingPile]:
+        """获取指定模式的全部充电桩"""
+        return list(self._by_mode[mode].values())
+
+    def get_idle_piles(self, mode: ChargeMode) -> List[ChargingPile]:
+        """获取指定模式的空闲充电桩"""
+        return list(self._idle[mode].values())
+
+    def first_idle_pile(self, mode: ChargeMode) -> Optional[ChargingPile]:
+        """获取指定模式中最早空闲的充电桩，O(1)"""
+        return next(iter(self._idle[mode].values()), None)
+
+    def get_available_piles(self, mode: ChargeMode) -> List[ChargingPile]:
+        """获取指定模式中正常工作（空闲或充电中）的充电桩"""
+        return list(self._available[mode].values())
+
+    def count_available(self, mode: ChargeMode) -> int:
+        return len(self._available[mode])
+
+    def snapshot(self) -> Mapping[str, Mapping]:
+        """获取所有充电桩最近一次保存时的只读快照，可在任意线程读取
+
+        没有待发布的变更时无锁返回；否则在锁内复制外层字典、合并全部待发布的变更后整体替换引用，
+        之前取得的快照不受影响。
+        """
+        if self._pending:
+            with self._lock:
+                if self._pending:
+                    snapshot = dict(self._snapshot)
+                    for key, value in self._pending.items():
+                        if value is None:
+                            snapshot.pop(key, None)
+                        else:
+                            snapshot[key] = MappingProxyType(value)
+                    self._pending = {}
+                    self._snapshot = MappingProxyType(snapshot)
+        return self._snapshot
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self.piles:
+                del self.piles[key]
+                self._reindex(key, None)
+                self.data.pop(key, None)
+                self._append_log({'op': 'delete', 'key': key})
+                self._publish(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.piles.clear()
+            for index in (self._by_mode, self._idle, self._available):
+                for piles in index.values():
+                    piles.clear()
+            self.data.clear()
+            self._append_log({'op': 'clear'})
+            self._pending = {}
+            self._snapshot = MappingProxyType({})
+
+    def checkpoint(self):
+        """把全部充电桩状态写入 piles.json 并清空变更日志"""
+        if not self._persist:
+            return
+        with self._lock:
+            self.data = {key: pile.to_dict() for key, pile in self.piles.items()}
+            self._save()
+            self._log_file.close()
+            self._log_file = open(self._log_path, 'w', encoding='utf-8')
+            self._log_records = 0
+            self._last_checkpoint = time.monotonic()
+
+    def checkpoint_if_due(self) -> bool:
+        """日志条数或时间间隔达到阈值时写检查点
+
+        Returns:
+            bool: 是否写了检查点
+        """
+        if not self._persist or self._log_records == 0:
+            return False
+        if (self._log_records < self.CHECKPOINT_MAX_RECORDS and
+                time.monotonic() - self._last_checkpoint < self.CHECKPOINT_INTERVAL):
+            return False
+        self.checkpoint()
+        return True
 
 class SessionRepository(Repository[ChargingSession]):
-    def __init__(self):
-        super().__init__('data/sessions.json')
+    def __init__(self, persist: bool = True):
+        super().__init__('data/sessions.json', persist)
     
     def save(self, key: str, value: ChargingSession):
         """保存充电会话数据"""
@@ -183,13 +386,115 @@ class SessionRepository(Repository[ChargingSession]):
         return [ChargingSession.from_dict(data) for data in self.data.values()]
 
 class BillRepository(Repository[Bill]):
-    def __init__(self):
-        super().__init__('data/bills.json')
+    """账单仓库
+
+    账单ID是按结算时间生成的ULID，键的字典序即时间序：_ids 保存有序的ULID键，
+    时间范围查询直接二分定位；每辆车的账单ID按时间顺序保存在 _by_car 中。
+    旧数据中的UUID键不带时间信息，加载时按结束时间排一次序放在各车列表的前面，
+    范围查询时逐条过滤。
+
+    插入、改写或删除账单后通知已注册的监听者（如报表汇总）。
+    """
+    def __init__(self, persist: bool = True):
+        super().__init__('data/bills.json', persist)
+        self._ids: List[str] = sorted(key for key in self.data if is_ulid(key))
+        self._legacy_ids: List[str] = sorted((key for key in self.data if not is_ulid(key)),
+                                             key=lambda key: self.data[key]['end_time'])
+        self._by_car: Dict[str, List[str]] = {}
+        for key in self._legacy_ids + self._ids:
+            self._by_car.setdefault(self.data[key]['car_id'], []).append(key)
+        self._listeners: List[Callable[[List[Tuple[Optional[Bill], Optional[Bill]]]], None]] = []
+    
+    def add_listener(self, listener: Callable[[List[Tuple[Optional[Bill], Optional[Bill]]]], None]):
+        """注册账单变更回调，参数为一次保存/删除涉及的 (原账单, 新账单) 列表：
+        插入时原账单为 None，删除时新账单为 None"""
+        self._listeners.append(listener)
+    
+    def _notify(self, changes: List[Tuple[Optional[dict], Optional[Bill]]]):
+        if not self._listeners:
+            return
+        changes = [(Bill.from_dict(previous) if previous is not None else None, current)
+                   for previous, current in changes]
+        for listener in self._listeners:
+            listener(changes)
+    
+    def _index(self, key: str, car_id: str):
+        if is_ulid(key):
+            if not self._ids or key > self._ids[-1]:
+                self._ids.append(key)
+            else:
+                insort(self._ids, key)
+        else:
+            self._legacy_ids.append(key)
+        self._by_car.setdefault(car_id, []).append(key)
     
     def save(self, key: str, value: Bill):
         """保存账单数据"""
-        self.data[key] = value.to_dict()
-        self._save()
+        with self._lock:
+            previous = self.data.get(key)
+            if previous is None:
+                self._index(key, value.car_id)
+            self.data[key] = value.to_dict()
+            self._save()
+        self._notify([(previous, value)])
+    
+    def save_many(self, bills: List[Bill]):
+        """批量保存账单，只写一次文件"""
+        with self._lock:
+            previous = []
+            for bill in bills:
+                data = self.data.get(bill.bill_id)
+                if data is None:
+                    self._index(bill.bill_id, bill.car_id)
+                previous.append(data)
+                self.data[bill.bill_id] = bill.to_dict()
+            self._save()
+        self._notify(list(zip(previous, bills)))
+    
+    def delete(self, key: str):
+        """删除账单"""
+        with self._lock:
+            data = self.data.pop(key, None)
+            if data is None:
+                return
+            (self._ids if is_ulid(key) else self._legacy_ids).remove(key)
+            self._by_car[data['car_id']].remove(key)
+            self._save()
+        self._notify([(data, None)])
+    
+    def get_by_car(self, car_id: str, newest_first: bool = True) -> List[Bill]:
+        """获取车辆的所有账单，按结算时间排序"""
+        keys = self._by_car.get(car_id, [])
+        return [Bill.from_dict(self.data[key]) for key in (reversed(keys) if newest_first else keys)]
+    
+    def get_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Bill]:
+        """获取结束时间在 [start, end) 内的账单（None 表示不限），按结算时间排序"""
+        return list(self.iter_range(start, end))
+    
+    def iter_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   chunk_size: int = 1000) -> Iterator[Bill]:
+        """逐张产出结束时间在 [start, end) 内的账单，按结算时间排序
+        
+        每次只在锁内取出 chunk_size 个键对应的记录，再从最后一个键之后继续，
+        因此额外内存与账单总数无关，迭代期间插入新账单也不会错位。
+        """
+        # ID 只精确到毫秒，end 所在毫秒内的账单也要取出再按结束时间过滤
+        upper = ulid_lower_bound(end + timedelta(milliseconds=1)) if end else None
+        with self._lock:
+            records = [self.data[key] for key in self._legacy_ids]
+            lo = bisect_left(self._ids, ulid_lower_bound(start)) if start else 0
+        while True:
+            for data in records:
+                bill = Bill.from_dict(data)
+                if (start is None or bill.end_time >= start) and (end is None or bill.end_time < end):
+                    yield bill
+            with self._lock:
+                hi = bisect_left(self._ids, upper) if upper else len(self._ids)
+                keys = self._ids[lo:min(lo + chunk_size, hi)]
+                if not keys:
+                    return
+                records = [self.data[key] for key in keys]
+                lo = bisect_right(self._ids, keys[-1])
     
     def get(self, key: str) -> Optional[Bill]:
         """获取账单数据"""
@@ -203,8 +508,8 @@ class BillRepository(Repository[Bill]):
         return [Bill.from_dict(data) for data in self.data.values()]
 
 class RequestRepository(Repository[ChargingRequest]):
-    def __init__(self):
-        super().__init__('data/requests.json')
+    def __init__(self, persist: bool = True):
+        super().__init__('data/requests.json', persist)
     
     def save(self, key: str, value: ChargingRequest):
         """保存充电请求数据"""
@@ -229,50 +534,316 @@ class RequestRepository(Repository[ChargingRequest]):
                 return request
         return None
 
-class QueueRepository(Repository[ChargingRequest]):
-    def __init__(self):
-        super().__init__('data/queue.json')
-    
-    def save(self, key: str, value: ChargingRequest):
-        """保存队列数据"""
-        self.data[key] = value.to_dict()
-        self._save()
-    
-    def get(self, key: str) -> Optional[ChargingRequest]:
-        """获取队列数据"""
+class ReservationRepository(Repository[Reservation]):
+    """充电桩预约仓库
+
+    每个充电桩的预约保存在一个 IntervalIndex 中（按开始时间排序的不重叠区间），
+    冲突检查和 “下一个空闲时段” 查询为 O(log n)；另有 车辆ID -> 预约ID 的索引。
+    """
+
+    def __init__(self, persist: bool = True):
+        self._indexes: Dict[str, IntervalIndex] = {}
+        self._by_car: Dict[str, str] = {}
+        super().__init__('data/reservations.json', persist)
+
+    def _load(self):
+        super()._load()
+        for data in self.data.values():
+            self._index(Reservation.from_dict(data))
+
+    def _index(self, reservation: Reservation):
+        index = self._indexes.setdefault(reservation.pile_id, IntervalIndex())
+        index.add(reservation.reservation_id, reservation.start_time.timestamp(),
+                  reservation.end_time.timestamp())
+        self._by_car[reservation.car_id] = reservation.reservation_id
+
+    def _unindex(self, key: str, data: dict):
+        index = self._indexes.get(data['pile_id'])
+        if index is not None:
+            index.remove(key)
+        if self._by_car.get(data['car_id']) == key:
+            del self._by_car[data['car_id']]
+
+    def add(self, reservation: Reservation):
+        """登记预约，与该充电桩已有预约冲突时抛出 ValueError"""
+        with self._lock:
+            self._index(reservation)
+            self.data[reservation.reservation_id] = reservation.to_dict()
+            self._save()
+
+    def save(self, key: str, value: Reservation):
+        """改写预约，新时段与该充电桩其他预约冲突时抛出 ValueError，原预约保持不变"""
+        with self._lock:
+            if value.end_time <= value.start_time:
+                raise ValueError("区间结束时间必须晚于开始时间")
+            index = self._indexes.get(value.pile_id)
+            if index is not None and index.find_conflict(value.start_time.timestamp(), value.end_time.timestamp(),
+                                                         exclude=key) is not None:
+                raise ValueError("区间与已有区间重叠")
+            data = self.data.pop(key, None)
+            if data is not None:
+                self._unindex(key, data)
+            self._index(value)
+            self.data[value.reservation_id] = value.to_dict()
+            self._save()
+
+    def get(self, key: str) -> Optional[Reservation]:
+        """获取预约"""
         data = self.data.get(key)
         if data:
-            return ChargingRequest.from_dict(data)
+            return Reservation.from_dict(data)
         return None
-    
-    def get_all(self) -> List[ChargingRequest]:
-        """获取所有队列数据"""
-        return [ChargingRequest.from_dict(data) for data in self.data.values()]
+
+    def get_all(self) -> List[Reservation]:
+        """获取所有预约"""
+        return [Reservation.from_dict(data) for data in self.data.values()]
+
+    def get_by_car(self, car_id: str) -> Optional[Reservation]:
+        """获取车辆的预约"""
+        reservation_id = self._by_car.get(car_id)
+        return self.get(reservation_id) if reservation_id else None
+
+    def delete(self, key: str):
+        """删除预约"""
+        with self._lock:
+            data = self.data.pop(key, None)
+            if data is None:
+                return
+            self._unindex(key, data)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._by_car.clear()
+        super().clear()
+
+    def find_conflict(self, pile_id: str, start: datetime, end: datetime,
+                      exclude: Optional[str] = None) -> Optional[Reservation]:
+        """查找充电桩上与 [start, end) 重叠的预约（可排除指定预约ID）"""
+        index = self._indexes.get(pile_id)
+        if index is None:
+            return None
+        key = index.find_conflict(start.timestamp(), end.timestamp(), exclude)
+        return self.get(key) if key else None
+
+    def next_free_ts(self, pile_id: str, after_ts: float, duration_seconds: float,
+                     exclude: Optional[str] = None) -> float:
+        """充电桩上不早于 after_ts 且能容纳 duration_seconds 的最早空闲时刻（时间戳）"""
+        index = self._indexes.get(pile_id)
+        if index is None:
+            return after_ts
+        return index.next_free(after_ts, duration_seconds, exclude)
+
+    def pile_intervals(self, pile_id: str) -> Tuple[Tuple[float, float, str], ...]:
+        """充电桩上全部预约的 (开始时间戳, 结束时间戳, 车辆ID)，按开始时间排序"""
+        index = self._indexes.get(pile_id)
+        if not index:
+            return ()
+        return tuple((start, end, self.data[key]['car_id'])
+                     for key, start, end in index.overlapping(float('-inf'), float('inf')))
+
+    def get_pile_reservations(self, pile_id: str, start: datetime, end: datetime) -> List[Reservation]:
+        """按时间顺序获取充电桩在 [start, end) 内的预约"""
+        index = self._indexes.get(pile_id)
+        if index is None:
+            return []
+        return [self.get(key) for key, _, _ in index.overlapping(start.timestamp(), end.timestamp())]
+
+    def has_reservations(self, pile_id: str) -> bool:
+        index = self._indexes.get(pile_id)
+        return bool(index)
+
+    def expire(self, now: datetime) -> List[str]:
+        """删除所有已结束的预约，返回被删除的预约ID"""
+        expired = []
+        with self._lock:
+            for index in self._indexes.values():
+                for key in index.pop_before(now.timestamp()):
+                    data = self.data.pop(key)
+                    if self._by_car.get(data['car_id']) == key:
+                        del self._by_car[data['car_id']]
+                    expired.append(key)
+            if expired:
+                self._save()
+        return expired
 
 class QueueRepository:
-    """Manages the main waiting queues for fast and trickle charging."""
+    """Manages the main waiting queues for fast and trickle charging.
+    
+    每个模式的等候队列是一个以车辆ID为键的 IndexedQueue，另维护 排队号 -> 车辆ID 的映射，
+    因此按车辆或排队号查找、删除、查询位置均不需要线性扫描。
+
+    每个模式另有一条故障优先通道：充电桩故障时被中断的车辆按原请求时间进入一个小顶堆。
+    叫号时先从故障通道取车，通道清空前不再从等候区叫号；故障通道不受等候区容量限制。
+    """
     def __init__(self):
-        self.queues: Dict[ChargeMode, deque] = {
-            ChargeMode.FAST: deque(),
-            ChargeMode.TRICKLE: deque()
+        self.queues: Dict[ChargeMode, IndexedQueue] = {
+            ChargeMode.FAST: IndexedQueue(),
+            ChargeMode.TRICKLE: IndexedQueue()
         }
+        self._modes: Dict[str, ChargeMode] = {}    # 车辆ID -> 所在队列
+        self._numbers: Dict[str, str] = {}         # 排队号 -> 车辆ID
+        self._listeners: List[Callable[[str, ChargingRequest], None]] = []
+        # 故障优先通道: 堆元素为 (原请求时间戳, 序号, 车辆ID)，删除时惰性跳过
+        self.fault_lanes: Dict[ChargeMode, list] = {mode: [] for mode in ChargeMode}
+        self._fault_entries: Dict[str, tuple] = {}  # 车辆ID -> (堆元素, 请求)
+        self._fault_counts: Dict[ChargeMode, int] = {mode: 0 for mode in ChargeMode}
+        self._fault_seq = itertools.count()
+
+    def add_listener(self, listener: Callable[[str, ChargingRequest], None]):
+        """注册队列事件回调，参数为 (事件类型, 请求)，
+        事件类型为 enqueue / enqueue_front / enqueue_fault / dequeue / remove / update"""
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, request: ChargingRequest):
+        for listener in self._listeners:
+            listener(event, request)
+
+    def _index(self, request: ChargingRequest):
+        self._modes[request.car_id] = request.request_mode
+        if request.queue_number:
+            self._numbers[request.queue_number] = request.car_id
+
+    def _unindex(self, request: ChargingRequest):
+        self._modes.pop(request.car_id, None)
+        if request.queue_number and self._numbers.get(request.queue_number) == request.car_id:
+            del self._numbers[request.queue_number]
 
     def add_to_queue(self, request: ChargingRequest):
-        # Add to the end of the line
-        self.queues[request.request_mode].append(request)
-        request.queue_number = f"{request.request_mode.name[0]}{len(self.queues[request.request_mode])}"
+        """把请求加到等候队列末尾；排队号由 QueueService 的共享计数器生成（格式 F001），这里不再分配"""
+        if not request.queue_number:
+            raise ValueError(f"车辆 {request.car_id} 没有排队号，应通过 QueueService.add_to_queue 入队")
+        self.queues[request.request_mode].append(request.car_id, request)
+        self._index(request)
         print(f"[QueueRepo] Car {request.car_id} added to {request.request_mode.value} queue. Number: {request.queue_number}")
+        self._notify('enqueue', request)
 
     def add_to_front_of_queue(self, request: ChargingRequest):
         # For re-queuing failed jobs with priority
-        self.queues[request.request_mode].appendleft(request)
-        # Re-assign queue numbers is complex, skipping for this simulation
+        self.queues[request.request_mode].appendleft(request.car_id, request)
+        self._index(request)
         print(f"[QueueRepo] Car {request.car_id} added to FRONT of {request.request_mode.value} queue.")
+        self._notify('enqueue_front', request)
 
-    def get_next_from_queue(self, mode: ChargeMode) -> Optional[ChargingRequest]:
-        if self.queues[mode]:
-            return self.queues[mode].popleft()
+    def add_to_fault_lane(self, request: ChargingRequest):
+        """故障中断的请求进入故障优先通道，按原请求时间排序，O(log n)"""
+        if request.car_id in self._modes or request.car_id in self._fault_entries:
+            raise KeyError(f"车辆 {request.car_id} 已在排队")
+        mode = request.request_mode
+        entry = (request.request_time.timestamp(), next(self._fault_seq), request.car_id)
+        heapq.heappush(self.fault_lanes[mode], entry)
+        self._fault_entries[request.car_id] = (entry, request)
+        self._fault_counts[mode] += 1
+        if request.queue_number:
+            self._numbers[request.queue_number] = request.car_id
+        print(f"[QueueRepo] Car {request.car_id} added to {mode.value} fault lane.")
+        self._notify('enqueue_fault', request)
+
+    def get_fault_lane_length(self, mode: ChargeMode) -> int:
+        return self._fault_counts[mode]
+
+    def get_fault_lane_status(self, mode: ChargeMode) -> list:
+        """按叫号顺序返回故障通道中的请求"""
+        live = [entry for entry in self.fault_lanes[mode]
+                if self._fault_entries.get(entry[2], (None,))[0] is entry]
+        return [self._fault_entries[entry[2]][1] for entry in sorted(live)]
+
+    def _pop_fault_lane(self, mode: ChargeMode) -> Optional[ChargingRequest]:
+        heap = self.fault_lanes[mode]
+        while heap:
+            entry = heapq.heappop(heap)
+            current = self._fault_entries.get(entry[2])
+            if current and current[0] is entry:
+                return self._unindex_fault(entry[2])
         return None
-        
+
+    def _unindex_fault(self, car_id: str) -> ChargingRequest:
+        _, request = self._fault_entries.pop(car_id)
+        self._fault_counts[request.request_mode] -= 1
+        if request.queue_number and self._numbers.get(request.queue_number) == car_id:
+            del self._numbers[request.queue_number]
+        return request
+
+    def peek_next(self, mode: ChargeMode) -> Optional[ChargingRequest]:
+        """查看下一个将被叫号的请求（不出队）"""
+        heap = self.fault_lanes[mode]
+        while heap:
+            current = self._fault_entries.get(heap[0][2])
+            if current and current[0] is heap[0]:
+                return current[1]
+            heapq.heappop(heap)  # 清理已失效的堆元素
+        return self.queues[mode].peek()
+
+    def get_next_from_queue(self, mode: ChargeMode) -> Optional[ChargingRequest]:
+        """叫号：故障通道未清空时优先从故障通道取车，否则从等候区队首取车"""
+        request = self._pop_fault_lane(mode) if self._fault_counts[mode] else None
+        if request is None:
+            request = self.queues[mode].popleft()
+            if request:
+                self._unindex(request)
+        if request:
+            self._notify('dequeue', request)
+        return request
+
+    def remove_from_queue(self, request: ChargingRequest) -> Optional[ChargingRequest]:
+        """从等候队列中移除请求（按车辆ID），返回被移除的请求"""
+        return self.remove_by_car_id(request.car_id)
+
+    def remove_by_car_id(self, car_id: str) -> Optional[ChargingRequest]:
+        if car_id in self._fault_entries:
+            # 堆中的元素留待叫号时惰性跳过
+            request = self._unindex_fault(car_id)
+            self._notify('remove', request)
+            return request
+        mode = self._modes.get(car_id)
+        if mode is None:
+            return None
+        request = self.queues[mode].remove(car_id)
+        if request:
+            self._unindex(request)
+            self._notify('remove', request)
+        return request
+
+    def find_by_car_id(self, car_id: str) -> Optional[ChargingRequest]:
+        """获取排队中（等候区或故障通道）的请求对象（即队列中的同一对象）"""
+        mode = self._modes.get(car_id)
+        if mode:
+            return self.queues[mode].get(car_id)
+        entry = self._fault_entries.get(car_id)
+        return entry[1] if entry else None
+
+    def find_car_id_by_queue_number(self, queue_number: str) -> Optional[str]:
+        return self._numbers.get(queue_number)
+
+    def get_position(self, car_id: str) -> Optional[int]:
+        """车辆的叫号位置（从1开始）
+
+        故障通道中的车辆按通道内顺序排列；等候区车辆排在同模式故障通道之后，O(log n)。
+        """
+        mode = self._modes.get(car_id)
+        if mode:
+            return self._fault_counts[mode] + self.queues[mode].position(car_id)
+        entry = self._fault_entries.get(car_id)
+        if entry is None:
+            return None
+        key = entry[0]
+        mode = entry[1].request_mode
+        # 故障通道通常很短，直接统计排在前面的有效元素
+        return 1 + sum(1 for other in self.fault_lanes[mode]
+                       if other < key and self._fault_entries.get(other[2], (None,))[0] is other)
+
+    def get_queue_length(self, mode: ChargeMode) -> int:
+        return len(self.queues[mode])
+
+    def update_amount(self, car_id: str, amount_kwh: float) -> bool:
+        """原地修改请求充电量，排队号和位置不变"""
+        request = self.find_by_car_id(car_id)
+        if not request:
+            return False
+        request.request_amount_kwh = amount_kwh
+        self._notify('update', request)
+        return True
+
     def get_queue_status(self, mode: ChargeMode) -> list:
         return list(self.queues[mode])
\ No newline at end of file
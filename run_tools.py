@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import sys
+import time
+from datetime import datetime, timedelta
+
+from repositories.repositories import BillRepository
+from services.billing_service import BillingService
+from services.export_service import EXPORT_FORMATS, ExportService
+from repositories.bill_columns import BillColumnStore
+from services.report_engine import ReportEngine
+from services.report_service import ReportService, TIME_RANGES
+from utils.money import to_yuan
+
+
+def _parse_partition(args):
+    """由命令行参数得到账单分区的 [开始, 结束) 时间范围（按账单结束时间划分，None 表示不限）"""
+    if args.month:
+        start = datetime.strptime(args.month, '%Y-%m')
+        end = (start + timedelta(days=32)).replace(day=1)
+        return start, end
+    start = datetime.fromisoformat(args.date_from) if args.date_from else None
+    end = datetime.fromisoformat(args.date_to) if args.date_to else None
+    return start, end
+
+
+def rerate(args) -> int:
+    """按当前电价重新计价分区内的账单并报告差额"""
+    start, end = _parse_partition(args)
+    bill_repo = BillRepository()
+    bills = [bill for bill in bill_repo.get_range(start, end) if not args.pile or bill.pile_id == args.pile]
+    if not bills:
+        print("分区内没有账单")
+        return 0
+
+    result = BillingService().rerate_bills(bills)
+    print(f"账单数: {len(bills)}，费用变化: {result.changed}")
+    print(f"原总费用: {to_yuan(result.old_total_cents):.2f} 元，新总费用: {to_yuan(result.new_total_cents):.2f} 元，"
+          f"差额: {to_yuan(result.delta_cents):+.2f} 元")
+    changes = sorted(result.changes, key=lambda c: abs(c[2] - c[1]), reverse=True)
+    for bill_id, old_cents, new_cents in changes[:args.top]:
+        print(f"  {bill_id}  {to_yuan(old_cents):>10.2f} -> {to_yuan(new_cents):>10.2f}  "
+              f"({to_yuan(new_cents - old_cents):+.2f})")
+    if len(changes) > args.top:
+        print(f"  ... 另有 {len(changes) - args.top} 张账单")
+
+    if args.dry_run:
+        print("试运行，未写回账单")
+    elif result.changed:
+        # 报表汇总作为监听者随账单一起更新，写回后保存（服务器启动时也会核对汇总与账单）
+        report_service = ReportService(bill_repo)
+        changed_ids = {bill_id for bill_id, _, _ in result.changes}
+        bill_repo.save_many([bill for bill in result.bills if bill.bill_id in changed_ids])
+        report_service.checkpoint()
+        print(f"已写回 {result.changed} 张账单")
+    return 0
+
+
+def rebuild_reports(args) -> int:
+    """从历史账单重建日/周/月报表汇总"""
+    # 忽略已保存的汇总，按当前全部账单重建并写回
+    report_service = ReportService(BillRepository(), load=False)
+    for time_range in TIME_RANGES:
+        rows = report_service.get_report(time_range)
+        print(f"  {time_range}: {len({row['period'] for row in rows})} 个时段，{len(rows)} 行，"
+              f"{sum(row['charge_count'] for row in rows)} 次充电")
+    return 0
+
+
+def export(args) -> int:
+    """把账单或报表流式导出到文件（--output 为 - 时写到标准输出）"""
+    start, end = _parse_partition(args)
+    bill_repo = BillRepository()
+    if args.kind == 'bills':
+        service = ExportService(bill_repo)
+        chunks = service.iter_bills(args.format, start, end, args.pile)
+    else:
+        # 导出到标准输出时，服务的日志不能混进导出内容
+        with contextlib.redirect_stdout(sys.stderr):
+            service = ExportService(bill_repo, ReportService(bill_repo))
+        chunks = service.iter_report(args.format, args.time_range, start.date() if start else None,
+                                     end.date() if end else None, args.pile)
+    if args.output == '-':
+        service.write(chunks, sys.stdout)
+        return 0
+    with open(args.output, 'w', encoding='utf-8', newline='') as f:
+        written = service.write(chunks, f)
+    print(f"已导出到 {args.output}（{written} 个字符）")
+    return 0
+
+
+def stats(args) -> int:
+    """按任意维度分组汇总账单（--workers 大于 1 时按分区多进程并行）"""
+    start, end = _parse_partition(args)
+    bill_repo = BillRepository()
+    engine = ReportEngine(BillColumnStore(bill_repo), workers=args.workers)
+    try:
+        started = time.perf_counter()
+        rows = engine.group_totals(args.by.split(','), start, end, args.pile,
+                                   parallel=True if args.workers > 1 else None)
+        elapsed = time.perf_counter() - started
+    finally:
+        engine.close()
+    dims = args.by.split(',')
+    for row in rows:
+        labels = '  '.join(f"{row[dim]!s:>10}" for dim in dims)
+        print(f"{labels}  {row['charge_count']:>8}  {row['charged_kwh']:>12.2f} 度  {row['total_fee']:>12.2f} 元")
+    print(f"共 {len(rows)} 组，{sum(row['charge_count'] for row in rows)} 张账单，耗时 {elapsed * 1000:.1f} ms")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="充电站运维工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rerate_parser = subparsers.add_parser('rerate', help="按当前分时电价重新计价账单")
+    rerate_parser.add_argument('--month', help="账单月份，如 2024-05")
+    rerate_parser.add_argument('--from', dest='date_from', help="起始时间（含），ISO 格式")
+    rerate_parser.add_argument('--to', dest='date_to', help="结束时间（不含），ISO 格式")
+    rerate_parser.add_argument('--pile', help="只处理该充电桩的账单")
+    rerate_parser.add_argument('--top', type=int, default=20, help="列出差额最大的账单数")
+    rerate_parser.add_argument('--dry-run', action='store_true', help="只报告差额，不写回")
+    rerate_parser.set_defaults(func=rerate)
+
+    rebuild_parser = subparsers.add_parser('rebuild-reports', help="从历史账单重建报表汇总")
+    rebuild_parser.set_defaults(func=rebuild_reports)
+
+    export_parser = subparsers.add_parser('export', help="流式导出账单或报表")
+    export_parser.add_argument('kind', choices=('bills', 'report'), help="导出内容")
+    export_parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help="导出格式")
+    export_parser.add_argument('--output', '-o', default='-', help="输出文件，- 表示标准输出")
+    export_parser.add_argument('--month', help="账单月份，如 2024-05")
+    export_parser.add_argument('--from', dest='date_from', help="起始时间（含），ISO 格式")
+    export_parser.add_argument('--to', dest='date_to', help="结束时间（不含），ISO 格式")
+    export_parser.add_argument('--pile', help="只导出该充电桩")
+    export_parser.add_argument('--time-range', choices=TIME_RANGES, default='day', help="报表的时间范围")
+    export_parser.set_defaults(func=export)
+
+    stats_parser = subparsers.add_parser('stats', help="按任意维度分组汇总账单")
+    stats_parser.add_argument('--by', default='pile', help="分组维度，逗号分隔: pile,mode,hour,weekday,day,month")
+    stats_parser.add_argument('--month', help="账单月份，如 2024-05")
+    stats_parser.add_argument('--from', dest='date_from', help="起始时间（含），ISO 格式")
+    stats_parser.add_argument('--to', dest='date_to', help="结束时间（不含），ISO 格式")
+    stats_parser.add_argument('--pile', help="只统计该充电桩")
+    stats_parser.add_argument('--workers', type=int, default=0, help="工作进程数，大于 1 时按分区并行计算")
+    stats_parser.set_defaults(func=stats)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
 import socket
 import threading
 import json
-from typing import Dict, Any
-from datetime import datetime
+import struct
+from typing import Dict, Any, Iterator, Optional
+from datetime import date, datetime, timedelta
 import time
+from collections import deque
 
 from models.car import Car, ChargingRequest
 from models.charging_pile import ChargingPile, FastChargingPile, TrickleChargingPile
@@ -12,19 +14,58 @@ from models.user import User
 from utils.enums import ChargeMode, CarState, PileState, WorkState
 from repositories.repositories import (
     UserRepository, PileRepository, SessionRepository,
-    BillRepository, RequestRepository, QueueRepository
+    BillRepository, RequestRepository, QueueRepository, ReservationRepository
 )
+from repositories.bill_columns import BillColumnStore
 from services.user_service import UserService
 from services.charging_service import ChargingService
 from services.billing_service import BillingService
 from services.queue_service import QueueService
 from services.dispatch_service import DispatchService
 from services.scheduling_service import SchedulingService
+from services.eta_service import EtaService
+from services.dispatcher import Dispatcher
+from services.load_manager import LoadManager
+from services.reservation_service import ReservationService
+from services.report_service import ReportService, TIME_RANGES
+from services.export_service import ExportService
+from services.report_engine import ReportEngine
+from services.stats_service import StatsService
+from services.telemetry_service import TelemetryService
+from utils.clock import Clock, SYSTEM_CLOCK
+from utils.config import StationConfig, load_station_config
 
 class ChargeServer:
-    def __init__(self, host: str = 'localhost', port: int = 5000):
+    # 需要读写等候队列、充电桩状态、预约索引、充电进度或电价的操作，统一交给调度线程串行执行
+    DISPATCHED_ACTIONS = {
+        'submit_charging_request', 'end_charging', 'get_charging_details',
+        'toggle_pile_state', 'get_pile_queue',
+        'get_current_request', 'modify_charging_request',
+        'report_pile_fault', 'recover_pile', 'add_pile', 'remove_pile',
+        'make_reservation', 'cancel_reservation', 'get_reservation', 'get_next_free_slot',
+        'get_live_cost', 'reload_tariff'
+    }
+    # 在连接线程中直接执行的操作，不触碰调度线程独占的状态：注册和登录只访问用户仓库；
+    # 其余只读取调度线程发布的只读快照（get_all_piles 读充电桩快照，get_eta、get_queue_info 和
+    # simulate_request 读推演快照中的预计时间、排队位置和预约时段副本），或由各自的锁保护的结构（报表汇总、列式账单、分布统计、遥测缓冲区、
+    # 账单仓库的分块范围迭代），试算、耗时的汇总和导出因此既不排队等待调度，也不阻塞调度线程。
+    # 不在这两个集合中的操作一律拒绝
+    DIRECT_ACTIONS = {
+        'register', 'login', 'get_all_piles', 'get_eta', 'get_queue_info', 'simulate_request',
+        'get_reports', 'get_bill_stats', 'get_pile_stats', 'get_pile_telemetry', 'export'
+    }
+    # 结果以数据流返回的操作：响应头之后分帧发送，不拼成一个 JSON 响应
+    STREAMING_ACTIONS = {'export'}
+    # 每隔多少个节拍（秒）例行调度一次
+    SCHEDULE_EVERY_TICKS = 5
+
+    def __init__(self, host: str = 'localhost', port: int = 5000,
+                 station_config: Optional[StationConfig] = None, clock: Optional[Clock] = None):
         self.host = host
         self.port = port
+        self.station_config = station_config or load_station_config()
+        # 所有服务和请求处理共用的时钟，等待时间、预计时间等都按它计算
+        self.clock = clock or SYSTEM_CLOCK
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         
@@ -45,78 +86,135 @@ class ChargeServer:
         self.bill_repo = BillRepository()
         self.request_repo = RequestRepository()
         self.queue_repo = QueueRepository()
+        self.reservation_repo = ReservationRepository()
         
         # 初始化服务
         self.billing_service = BillingService()
         self.user_service = UserService(self.user_repo)
-        self.queue_service = QueueService(self.queue_repo)
-        self.dispatch_service = DispatchService(self.pile_repo, self.queue_repo)
+        # 所有组件共用一个 QueueService，排队号只由一个计数器生成
+        self.queue_service = QueueService(self.queue_repo, self.clock)
+        self.dispatch_service = DispatchService(
+            self.pile_repo, self.queue_repo,
+            waiting_area_capacity=self.station_config.waiting_area_size,
+            queue_service=self.queue_service
+        )
+        self.load_manager = LoadManager(self.station_config.power_budget_kw,
+                                        self.station_config.power_strategy)
         self.charging_service = ChargingService(
             self.pile_repo, self.session_repo, self.bill_repo,
-            self.request_repo, self.queue_repo, self.billing_service
+            self.request_repo, self.queue_repo, self.billing_service,
+            clock=self.clock,
+            queue_service=self.queue_service,
+            load_manager=self.load_manager
         )
+        self.reservation_service = ReservationService(self.reservation_repo, self.pile_repo, self.clock)
+        self.report_service = ReportService(self.bill_repo)
+        self.bill_columns = BillColumnStore(self.bill_repo)
+        self.report_engine = ReportEngine(self.bill_columns, workers=self.station_config.report_workers)
+        self.report_engine.start()
+        self.export_service = ExportService(self.bill_repo, self.report_service)
+        self.stats_service = StatsService(self.bill_repo, self.charging_service)
+        self.telemetry_service = TelemetryService(self.pile_repo, self.charging_service, self.clock)
         self.scheduling_service = SchedulingService(
             self.pile_repo, 
             self.queue_repo, 
             self.charging_service,
-            self.request_repo
+            self.request_repo,
+            reservation_service=self.reservation_service
         )
+        self.eta_service = EtaService(self.pile_repo, self.queue_repo, self.charging_service, self.clock)
+        self.eta_service.attach_reservation_service(self.reservation_service)
+        self.queue_service.attach_eta_service(self.eta_service)
+        self.dispatch_service.attach_eta_service(self.eta_service)
+        self.dispatch_service.attach_reservation_service(self.reservation_service)
         
         # 初始化充电桩
         self._init_charging_piles()
         
         # 启动调度线程
-        self._start_scheduling_thread()
+        self._start_dispatcher()
         
         print("系统组件初始化完成！")
     
     def _init_charging_piles(self):
-        """初始化充电桩"""
+        """按充电站配置初始化充电桩
+        
+        已持久化的充电桩保留累计数据，只补建配置中缺少的编号；
+        多出的充电桩不会自动删除，需通过管理员操作移除。
+        """
         print("正在初始化充电桩...")
         
-        # 清空现有充电桩
-        self.pile_repo.clear()
-        
-        # 创建快充充电桩（2个，30度/小时）
-        for i in range(1, 3):
-            pile_id = f"F{i:02d}"
-            pile = FastChargingPile(
-                pile_id=pile_id,
-                pile_type=ChargeMode.FAST,
-                power_kw=30.0,
-                state=WorkState.IDLE
-            )
-            self.pile_repo.save(pile_id, pile)
-            print(f"创建快充充电桩 {pile_id}")
-        
-        # 创建慢充充电桩（3个，10度/小时）
-        for i in range(1, 4):
-            pile_id = f"T{i:02d}"
-            pile = TrickleChargingPile(
-                pile_id=pile_id,
-                pile_type=ChargeMode.TRICKLE,
-                power_kw=10.0,
-                state=WorkState.IDLE
-            )
-            self.pile_repo.save(pile_id, pile)
-            print(f"创建慢充充电桩 {pile_id}")
+        for pile in self.pile_repo.get_all():
+            pile.local_queue = deque(maxlen=self.station_config.charging_queue_len)
+            if pile.state == WorkState.CHARGING:
+                # 重启前未结束的会话无法继续计量，充电桩恢复为空闲
+                print(f"充电桩 {pile.pile_id} 的未完成会话已失效，恢复为空闲")
+                pile.end_charging(0.0, 0)
+                self.pile_repo.save(pile.pile_id, pile)
+        
+        for mode in ChargeMode:
+            for i in range(1, self.station_config.pile_num(mode) + 1):
+                pile_id = f"{mode.name[0]}{i:02d}"
+                if self.pile_repo.get(pile_id) is None:
+                    self._create_pile(pile_id, mode, self.station_config.power_kw(mode))
         
-        print("充电桩初始化完成！")
+        print(f"充电桩初始化完成！快充 {len(self.pile_repo.get_by_mode(ChargeMode.FAST))} 个，"
+              f"慢充 {len(self.pile_repo.get_by_mode(ChargeMode.TRICKLE))} 个")
     
-    def _start_scheduling_thread(self):
-        """启动调度线程"""
-        def scheduling_loop():
-            while True:
-                try:
-                    self.scheduling_service.run_schedule_cycle()
-                    time.sleep(5)  # 每5秒检查一次
-                except Exception as e:
-                    print(f"调度线程发生错误: {str(e)}")
-                    time.sleep(5)  # 发生错误时等待5秒后继续
-
-        scheduling_thread = threading.Thread(target=scheduling_loop, daemon=True)
-        scheduling_thread.start()
-        print("调度线程已启动")
+    def _create_pile(self, pile_id: str, mode: ChargeMode, power_kw: float) -> ChargingPile:
+        """创建并登记一个充电桩"""
+        pile_class = FastChargingPile if mode == ChargeMode.FAST else TrickleChargingPile
+        pile = pile_class(
+            pile_id=pile_id,
+            pile_type=mode,
+            power_kw=power_kw,
+            state=WorkState.IDLE
+        )
+        pile.local_queue = deque(maxlen=self.station_config.charging_queue_len)
+        self.pile_repo.save(pile_id, pile)
+        print(f"创建{mode.value}充电桩 {pile_id}")
+        return pile
+    
+    def _start_dispatcher(self):
+        """启动调度线程：队列和充电桩状态只由该线程修改"""
+        self._ticks = 0
+        self.dispatcher = Dispatcher(
+            on_tick=self._scheduling_tick,
+            on_cycle=self._scheduling_cycle,
+            tick_interval=1.0
+        )
+        self.dispatcher.start()
+    
+    def _scheduling_cycle(self):
+        """一批命令处理完后运行调度，并发布推演快照供试算查询"""
+        self.scheduling_service.run_schedule_cycle()
+        self.eta_service.refresh()
+    
+    def _scheduling_tick(self):
+        """每秒在调度线程中执行一次"""
+        # 会话完成定时器到期时自动结算并为空出的桩叫号
+        self.charging_service.advance_timers()
+        # 推进充电进度，兜底结束已充满但定时器未覆盖的会话
+        completions = self.charging_service.tick_progress()
+        for event in completions:
+            self.charging_service.end_charging(event.car_id)
+        if completions or self._ticks % self.SCHEDULE_EVERY_TICKS == 0:
+            self.dispatcher.request_cycle()
+        # 记录各充电桩的功率和状态曲线
+        self.telemetry_service.sample()
+        # 清理已过期的预约
+        if self.reservation_service.expire():
+            self.eta_service.invalidate()
+        # 发布最新的推演快照（试算查询只读快照，不进入调度线程）
+        self.eta_service.refresh()
+        # 电价配置文件修改后自动重新加载
+        if self._ticks % self.SCHEDULE_EVERY_TICKS == 0:
+            self.billing_service.reload_tariff_if_changed()
+        # 充电桩状态、报表汇总和分布统计定期写检查点
+        self.pile_repo.checkpoint_if_due()
+        self.report_service.checkpoint_if_due()
+        self.stats_service.checkpoint_if_due()
+        self._ticks += 1
     
     def start(self):
         """启动服务器"""
@@ -126,9 +224,6 @@ class ChargeServer:
             self.server_socket.listen(5)
             print(f"服务器启动成功，监听地址：{self.host}:{self.port}")
             
-            # 初始化系统组件
-            self._init_components()
-            
             while True:
                 # 接受客户端连接
                 client_socket, address = self.server_socket.accept()
@@ -149,6 +244,20 @@ class ChargeServer:
     def stop(self):
         """停止服务器"""
         try:
+            # 停止调度线程
+            if hasattr(self, 'dispatcher'):
+                self.dispatcher.stop(timeout=5)
+            if hasattr(self, 'pile_repo'):
+                self.pile_repo.checkpoint()
+            if hasattr(self, 'report_service'):
+                self.report_service.checkpoint()
+            if hasattr(self, 'stats_service'):
+                self.stats_service.checkpoint()
+            if hasattr(self, 'report_engine'):
+                self.report_engine.close()
+            if hasattr(self, 'bill_columns'):
+                self.bill_columns.close()
+            
             # 关闭所有客户端连接
             for client in self.clients.values():
                 client.close()
@@ -182,6 +291,11 @@ class ChargeServer:
                 if not buffer:
                     break  # 没有数据，退出外层循环
                 
+                if request.get('action') in self.STREAMING_ACTIONS:
+                    # 导出在连接线程中逐块读取账单仓库（每块在仓库锁内取出），见 DIRECT_ACTIONS
+                    self._handle_export(request.get('data', {}), client_socket)
+                    continue
+                
                 # 处理请求并获取响应
                 response = self._process_request(request)
                 
@@ -200,11 +314,60 @@ class ChargeServer:
             client_socket.close()
             print(f"客户端 {address} 断开连接")
     
+    def _open_export(self, data: Dict[str, Any]) -> Iterator[str]:
+        """按导出请求得到文本块生成器
+        
+        参数: kind（bills / report）、format（csv / jsonl）；账单可选 start / end（ISO 时间）、pile_id；
+        报表可选 time_range、start / end（ISO 日期）、pile_id
+        """
+        kind = data.get('kind', 'bills')
+        fmt = data.get('format', 'csv')
+        if kind == 'bills':
+            start = datetime.fromisoformat(data['start']) if data.get('start') else None
+            end = datetime.fromisoformat(data['end']) if data.get('end') else None
+            return self.export_service.iter_bills(fmt, start, end, data.get('pile_id'))
+        if kind == 'report':
+            time_range = data.get('time_range', 'day')
+            if time_range not in TIME_RANGES:
+                raise ValueError('无效的时间范围')
+            start = date.fromisoformat(data['start']) if data.get('start') else None
+            end = date.fromisoformat(data['end']) if data.get('end') else None
+            return self.export_service.iter_report(fmt, time_range, start, end, data.get('pile_id'))
+        raise ValueError(f"不支持的导出内容: {kind}")
+    
+    def _handle_export(self, data: Dict[str, Any], client_socket: socket.socket):
+        """处理导出请求，直接写入客户端套接字
+        
+        先发送一行 JSON 响应头（以换行结尾）；成功时随后逐块发送数据帧：4 字节大端长度 + UTF-8 文本，
+        长度为 0 的帧表示结束。生成器在套接字写完一块后才产出下一块，内存占用与导出行数无关；
+        中途出错时直接断开连接，客户端因收不到结束帧而知道导出不完整。
+        """
+        try:
+            chunks = self._open_export(data)
+        except Exception as e:
+            client_socket.sendall(json.dumps({'status': 'error', 'message': str(e)}).encode('utf-8') + b'\n')
+            return
+        header = {'status': 'success', 'data': {'kind': data.get('kind', 'bills'), 'format': data.get('format', 'csv')}}
+        client_socket.sendall(json.dumps(header).encode('utf-8') + b'\n')
+        for chunk in chunks:
+            payload = chunk.encode('utf-8')
+            client_socket.sendall(struct.pack('>I', len(payload)) + payload)
+        client_socket.sendall(struct.pack('>I', 0))
+    
     def _process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """处理客户端请求"""
         action = request.get('action')
         data = request.get('data', {})
         
+        if action in self.DISPATCHED_ACTIONS:
+            # 连接线程只负责投递命令并等待结果
+            return self.dispatcher.call(self._dispatch_request, action, data)
+        if action not in self.DIRECT_ACTIONS:
+            return {'status': 'error', 'message': '未知的操作类型'}
+        return self._dispatch_request(action, data)
+    
+    def _dispatch_request(self, action: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """按操作类型分发请求"""
         try:
             if action == 'register':
                 return self._handle_register(data)
@@ -224,8 +387,42 @@ class ChargeServer:
                 return self._handle_get_pile_queue(data)
             elif action == 'get_reports':
                 return self._handle_get_reports(data)
+            elif action == 'get_bill_stats':
+                return self._handle_get_bill_stats(data)
+            elif action == 'get_pile_stats':
+                return self._handle_get_pile_stats(data)
+            elif action == 'get_pile_telemetry':
+                return self._handle_get_pile_telemetry(data)
             elif action == 'get_current_request':
                 return self._handle_get_current_request(data)
+            elif action == 'get_eta':
+                return self._handle_get_eta(data)
+            elif action == 'get_queue_info':
+                return self._handle_get_queue_info(data)
+            elif action == 'modify_charging_request':
+                return self._handle_modify_charging_request(data)
+            elif action == 'report_pile_fault':
+                return self._handle_report_pile_fault(data)
+            elif action == 'recover_pile':
+                return self._handle_recover_pile(data)
+            elif action == 'add_pile':
+                return self._handle_add_pile(data)
+            elif action == 'remove_pile':
+                return self._handle_remove_pile(data)
+            elif action == 'simulate_request':
+                return self._handle_simulate_request(data)
+            elif action == 'make_reservation':
+                return self._handle_make_reservation(data)
+            elif action == 'cancel_reservation':
+                return self._handle_cancel_reservation(data)
+            elif action == 'get_reservation':
+                return self._handle_get_reservation(data)
+            elif action == 'get_next_free_slot':
+                return self._handle_get_next_free_slot(data)
+            elif action == 'reload_tariff':
+                return self._handle_reload_tariff()
+            elif action == 'get_live_cost':
+                return self._handle_get_live_cost(data)
             else:
                 return {'status': 'error', 'message': '未知的操作类型'}
         except Exception as e:
@@ -315,10 +512,28 @@ class ChargeServer:
                     'message': '充电量必须是数字'
                 }
             
+            # 检查等候区容量和可用充电桩
+            accepted, reason = self.dispatch_service.can_accept(
+                ChargeMode.FAST if request_mode == "FAST" else ChargeMode.TRICKLE
+            )
+            if not accepted:
+                return {'status': 'error', 'message': reason}
+            
+            # 带上车辆的电池容量和类型，按充电曲线估算充电时长
+            car = self.user_service.find_car(car_id)
+            start_soc = data.get('start_soc')
+            if start_soc is not None and not 0 <= float(start_soc) <= 1:
+                return {'status': 'error', 'message': '荷电状态必须在0到1之间'}
+            
             # 创建充电请求
             request = self.charging_service.create_charging_request(
-                car_id, request_mode, amount
+                car_id, request_mode, amount,
+                battery_capacity_kwh=car.capacity_kwh if car else None,
+                battery_class=car.battery_class if car else None,
+                start_soc=float(start_soc) if start_soc is not None else None
             )
+            # 本批命令处理完后统一调度一次
+            self.dispatcher.request_cycle()
             
             if not request or not request.queue_number:
                 return {
@@ -350,6 +565,7 @@ class ChargeServer:
             
             bill = self.charging_service.end_charging(car_id)
             if bill:
+                self.dispatcher.request_cycle()
                 return {
                     'status': 'success',
                     'message': '充电已结束',
@@ -391,7 +607,7 @@ class ChargeServer:
             print(f"[Server] 当前充电会话: {current_session.to_dict() if current_session else None}")
 
             # 获取历史账单
-            bills = [bill for bill in self.bill_repo.get_all() if bill.car_id == car_id]
+            bills = self.bill_repo.get_by_car(car_id)
             print(f"[Server] 历史账单数量: {len(bills)}")
 
             # 如果请求已完成且没有当前会话，则清除当前请求
@@ -404,19 +620,17 @@ class ChargeServer:
                 'data': {
                     'current_request': current_request.to_dict() if current_request else None,
                     'current_session': current_session.to_dict() if current_session else None,
-                    'bills': [bill.to_dict() for bill in sorted(bills, key=lambda x: x.end_time, reverse=True)]
+                    'bills': [bill.to_dict() for bill in bills]
                 }
             }
 
             # 如果当前请求存在但没有排队号码，尝试从队列中获取
             if current_request and not current_request.queue_number:
-                queue = self.queue_service.get_queue_status(current_request.request_mode)
-                for request in queue:
-                    if request.car_id == car_id:
-                        current_request.queue_number = request.queue_number
-                        self.request_repo.save(car_id, current_request)
-                        response_data['data']['current_request'] = current_request.to_dict()
-                        break
+                queued = self.queue_repo.find_by_car_id(car_id)
+                if queued:
+                    current_request.queue_number = queued.queue_number
+                    self.request_repo.save(car_id, current_request)
+                    response_data['data']['current_request'] = current_request.to_dict()
 
             print(f"[Server] 充电详情获取成功")
             return response_data
@@ -427,12 +641,18 @@ class ChargeServer:
             return {'status': 'error', 'message': error_msg}
     
     def _handle_get_all_piles(self) -> Dict[str, Any]:
-        """处理获取所有充电桩数据的请求"""
+        """处理获取所有充电桩数据的请求（读取只读快照，不经过调度线程）"""
         try:
-            piles = self.pile_repo.get_all()
+            data = []
+            for pile_id, snapshot in self.pile_repo.snapshot().items():
+                pile_data = dict(snapshot)
+                if pile_data['state'] == WorkState.CHARGING.value:
+                    pile_data['charged_kwh'] = self.charging_service.get_charged_kwh(pile_id)
+                    pile_data['allocated_power_kw'] = self.charging_service.get_allocated_power(pile_id)
+                data.append(pile_data)
             return {
                 'status': 'success',
-                'data': [pile.to_dict() for pile in piles]
+                'data': data
             }
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
@@ -453,6 +673,7 @@ class ChargeServer:
                 pile.set_state(WorkState.OFFLINE)
             
             self.pile_repo.save(pile_id, pile)
+            self.dispatcher.request_cycle()
             return {'status': 'success', 'message': '状态更新成功'}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
@@ -474,7 +695,7 @@ class ChargeServer:
                         'user_id': request.car_id,
                         'battery_capacity': request.request_amount_kwh,
                         'request_amount': request.request_amount_kwh,
-                        'waiting_time': (datetime.now() - request.request_time).total_seconds() / 3600
+                        'waiting_time': (self.clock.now() - request.request_time).total_seconds() / 3600
                     })
             
             return {
@@ -485,13 +706,72 @@ class ChargeServer:
             return {'status': 'error', 'message': str(e)}
     
     def _handle_get_reports(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理获取报表数据的请求"""
+        """处理获取报表数据的请求（由报表汇总表直接给出，不扫描账单）
+        
+        可选参数: start / end（ISO 日期，时段第一天的范围 [start, end)）、pile_id、limit（最近的时段数）
+        """
         try:
             time_range = data.get('time_range', 'day')
-            # TODO: 实现实际的报表数据生成逻辑
+            if time_range not in TIME_RANGES:
+                return {'status': 'error', 'message': '无效的时间范围'}
+            start = date.fromisoformat(data['start']) if data.get('start') else None
+            end = date.fromisoformat(data['end']) if data.get('end') else None
+            limit = int(data['limit']) if data.get('limit') is not None else None
+            return {
+                'status': 'success',
+                'data': self.report_service.get_report(time_range, start, end, data.get('pile_id'), limit)
+            }
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    def _handle_get_bill_stats(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理按任意维度分组汇总账单的请求（在列式账单存储上向量化计算，大窗口按分区多进程并行）
+        
+        参数: group_by（pile / mode / hour / weekday / day / month，多个维度用列表或逗号分隔），
+        可选 start / end（ISO 时间，按账单结束时间过滤 [start, end)）、pile_id
+        """
+        try:
+            group_by = data.get('group_by', 'pile')
+            if isinstance(group_by, str):
+                group_by = group_by.split(',')
+            start = datetime.fromisoformat(data['start']) if data.get('start') else None
+            end = datetime.fromisoformat(data['end']) if data.get('end') else None
+            return {
+                'status': 'success',
+                'data': self.report_engine.group_totals(group_by, start, end, data.get('pile_id'))
+            }
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    def _handle_get_pile_stats(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理查询等待时间、充电时长、充电量分布的请求（由流式直方图合并得出分位数，不保存原始样本）
+        
+        可选参数: metric（wait / duration / energy）、scope（pile / mode）、key（充电桩ID或充电模式）、
+        start / end（ISO 日期，[start, end)，缺省时为累计统计）、percentiles（默认 [50, 90, 99]）
+        """
+        try:
+            start = date.fromisoformat(data['start']) if data.get('start') else None
+            end = date.fromisoformat(data['end']) if data.get('end') else None
+            percentiles = [float(p) for p in data.get('percentiles') or (50, 90, 99)]
+            return {
+                'status': 'success',
+                'data': self.stats_service.get_stats(data.get('metric'), data.get('scope'), data.get('key'),
+                                                     start, end, percentiles)
+            }
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    def _handle_get_pile_telemetry(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理查询充电桩功率和状态历史曲线的请求（读取固定容量的环形缓冲区）
+        
+        参数: pile_id；可选 start / end（ISO 时间，[start, end)）、resolution（1s / 1m / 1h，缺省时自动选择）
+        """
+        try:
+            start = datetime.fromisoformat(data['start']) if data.get('start') else None
+            end = datetime.fromisoformat(data['end']) if data.get('end') else None
             return {
                 'status': 'success',
-                'data': []
+                'data': self.telemetry_service.query(data.get('pile_id'), start, end, data.get('resolution'))
             }
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
@@ -529,12 +809,10 @@ class ChargeServer:
 
             # 如果请求存在但没有排队号码，尝试从队列中获取
             if not current_request.queue_number:
-                queue = self.queue_service.get_queue_status(current_request.request_mode)
-                for request in queue:
-                    if request.car_id == car_id:
-                        current_request.queue_number = request.queue_number
-                        self.request_repo.save(car_id, current_request)
-                        break
+                queued = self.queue_repo.find_by_car_id(car_id)
+                if queued:
+                    current_request.queue_number = queued.queue_number
+                    self.request_repo.save(car_id, current_request)
 
             return {
                 'status': 'success',
@@ -546,6 +824,309 @@ class ChargeServer:
             print(f"[Server] {error_msg}")
             return {'status': 'error', 'message': error_msg}
 
+    def _handle_get_eta(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理查询预计等待时间的请求（在连接线程中读取推演快照，不加锁，可高频调用）"""
+        car_id = data.get('car_id')
+        if not car_id:
+            return {'status': 'error', 'message': '缺少车辆ID'}
+        
+        estimate = self.eta_service.get_eta(car_id)
+        return {
+            'status': 'success',
+            'data': estimate.to_dict(self.clock.now()) if estimate else None
+        }
+
+    def _handle_get_queue_info(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理查询排队位置的请求（在连接线程中读取推演快照，不加锁，可高频调用）
+
+        位置按叫号顺序计算（故障通道中的车辆在前），与最近一次发布快照时的队列一致。
+        """
+        car_id = data.get('car_id')
+        if not car_id:
+            return {'status': 'error', 'message': '缺少车辆ID'}
+        
+        for mode in ChargeMode:
+            snapshot = self.eta_service.get_snapshot(mode)
+            estimate = snapshot.etas.get(car_id) if snapshot else None
+            if estimate:
+                return {
+                    'status': 'success',
+                    'data': {
+                        'queue_number': estimate.queue_number,
+                        'request_mode': mode.value,
+                        'position': estimate.position,
+                        'cars_ahead': estimate.position - 1,
+                        'queue_length': snapshot.waiting
+                    }
+                }
+        return {'status': 'success', 'data': None}
+
+    def _handle_modify_charging_request(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理修改充电请求：修改充电量不改变排队号，修改充电模式则重新排到新模式队尾"""
+        car_id = data.get('car_id')
+        if not car_id:
+            return {'status': 'error', 'message': '缺少车辆ID'}
+        
+        new_mode = None
+        request_mode = data.get('request_mode')
+        if request_mode:
+            if request_mode in ("快充", "FAST"):
+                new_mode = ChargeMode.FAST
+            elif request_mode in ("慢充", "TRICKLE"):
+                new_mode = ChargeMode.TRICKLE
+            else:
+                return {'status': 'error', 'message': '无效的充电模式'}
+        
+        new_amount = data.get('amount')
+        if new_amount is not None:
+            try:
+                new_amount = float(new_amount)
+            except (TypeError, ValueError):
+                return {'status': 'error', 'message': '充电量必须是数字'}
+            if new_amount <= 0:
+                return {'status': 'error', 'message': '充电量必须大于0'}
+        
+        queued = self.queue_repo.find_by_car_id(car_id)
+        if not queued or not self.dispatch_service.modify_request(queued, new_mode, new_amount):
+            return {'status': 'error', 'message': '当前请求不可修改（不在等候区或目标队列已满）'}
+        
+        self.request_repo.save(car_id, queued)
+        self.dispatcher.request_cycle()
+        return {
+            'status': 'success',
+            'message': '充电请求已修改',
+            'data': {'queue_number': queued.queue_number}
+        }
+
+    def _handle_report_pile_fault(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理充电桩故障上报，支持一次上报多个充电桩（pile_id 或 pile_ids）"""
+        pile_ids = data.get('pile_ids') or ([data['pile_id']] if data.get('pile_id') else [])
+        if not pile_ids:
+            return {'status': 'error', 'message': '缺少充电桩ID'}
+        unknown = [pile_id for pile_id in pile_ids if not self.pile_repo.get(pile_id)]
+        if unknown:
+            return {'status': 'error', 'message': f"充电桩不存在: {', '.join(unknown)}"}
+        
+        bills = self.scheduling_service.handle_pile_faults(pile_ids)
+        return {
+            'status': 'success',
+            'message': '故障已登记，受影响车辆已进入故障优先队列',
+            'data': {'bills': [bill.to_dict() for bill in bills]}
+        }
+
+    def _handle_recover_pile(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理充电桩故障恢复"""
+        pile_id = data.get('pile_id')
+        pile = self.pile_repo.get(pile_id)
+        if not pile:
+            return {'status': 'error', 'message': '充电桩不存在'}
+        if pile.state != WorkState.FAULTY:
+            return {'status': 'error', 'message': '充电桩未处于故障状态'}
+        
+        self.charging_service.recover_pile(pile_id)
+        self.dispatcher.request_cycle()
+        return {'status': 'success', 'message': '充电桩已恢复'}
+
+    def _handle_add_pile(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理新增充电桩（运行时扩容）"""
+        pile_type = data.get('pile_type')
+        if pile_type in ("快充", "FAST"):
+            mode = ChargeMode.FAST
+        elif pile_type in ("慢充", "TRICKLE"):
+            mode = ChargeMode.TRICKLE
+        else:
+            return {'status': 'error', 'message': '无效的充电桩类型'}
+        
+        try:
+            power_kw = float(data.get('power_kw') or self.station_config.power_kw(mode))
+        except (TypeError, ValueError):
+            return {'status': 'error', 'message': '功率必须是数字'}
+        if power_kw <= 0:
+            return {'status': 'error', 'message': '功率必须大于0'}
+        
+        pile_id = data.get('pile_id')
+        if pile_id and self.pile_repo.get(pile_id):
+            return {'status': 'error', 'message': '充电桩编号已存在'}
+        if not pile_id:
+            # 取该类型下一个未使用的编号
+            number = len(self.pile_repo.get_by_mode(mode)) + 1
+            while self.pile_repo.get(f"{mode.name[0]}{number:02d}"):
+                number += 1
+            pile_id = f"{mode.name[0]}{number:02d}"
+        
+        pile = self._create_pile(pile_id, mode, power_kw)
+        self.dispatcher.request_cycle()
+        return {'status': 'success', 'message': '充电桩已添加', 'data': pile.to_dict()}
+
+    def _handle_remove_pile(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理移除充电桩，正在充电的充电桩不能移除"""
+        pile_id = data.get('pile_id')
+        pile = self.pile_repo.get(pile_id)
+        if not pile:
+            return {'status': 'error', 'message': '充电桩不存在'}
+        if pile.state == WorkState.CHARGING:
+            return {'status': 'error', 'message': '充电桩正在充电，请先结束充电'}
+        
+        self.pile_repo.delete(pile_id)
+        self.eta_service.invalidate(pile.pile_type)
+        return {'status': 'success', 'message': '充电桩已移除'}
+
+    def _handle_simulate_request(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理试算请求：假设现在提交请求，预测排队位置、充电桩和完成时间
+        
+        在连接线程中执行，只读取调度线程发布的推演快照（含预约时段副本），不进入调度线程、
+        不修改队列和充电桩，也不写任何文件，可在用户填写请求表单时随输入实时调用。未指定充电模式时同时返回快充和慢充的结果。
+        """
+        try:
+            amount = float(data.get('amount'))
+        except (TypeError, ValueError):
+            return {'status': 'error', 'message': '充电量必须是数字'}
+        if amount <= 0:
+            return {'status': 'error', 'message': '充电量必须大于0'}
+        
+        modes = list(ChargeMode)
+        if data.get('request_mode'):
+            mode = self._parse_mode(data['request_mode'])
+            if mode is None:
+                return {'status': 'error', 'message': '无效的充电模式'}
+            modes = [mode]
+        
+        car_id = data.get('car_id') or ''
+        car = self.user_service.find_car(car_id) if car_id else None
+        start_soc = data.get('start_soc')
+        now = self.clock.now()
+        results = []
+        for mode in modes:
+            request = ChargingRequest(
+                car_id, mode, amount, request_time=now,
+                battery_capacity_kwh=car.capacity_kwh if car else None,
+                battery_class=car.battery_class if car else None,
+                start_soc=float(start_soc) if start_soc is not None else None
+            )
+            snapshot = self.eta_service.get_snapshot(mode)
+            estimate = self.eta_service.simulate(request)
+            accepted = snapshot is not None and bool(snapshot.heap) and \
+                snapshot.waiting < self.station_config.waiting_area_size
+            result = estimate.to_dict(now) if estimate else {}
+            result.pop('queue_number', None)
+            result.update({
+                'request_mode': mode.value,
+                'accepted': accepted,
+                'total_hours': (estimate.estimated_end - now).total_seconds() / 3600 if estimate else None,
+                'as_of': snapshot.built_at.isoformat() if snapshot else None
+            })
+            results.append(result)
+        return {'status': 'success', 'data': results}
+
+    @staticmethod
+    def _parse_mode(value: Optional[str]) -> Optional[ChargeMode]:
+        if value in ("快充", "FAST"):
+            return ChargeMode.FAST
+        if value in ("慢充", "TRICKLE"):
+            return ChargeMode.TRICKLE
+        return None
+
+    def _parse_reservation_window(self, data: Dict[str, Any]):
+        """解析预约开始时间和时长：时长可直接给出（duration_hours），也可按充电量（amount）估算"""
+        start_time = datetime.fromisoformat(data['start_time']) if data.get('start_time') else None
+        if start_time is None:
+            raise ValueError('缺少预约开始时间')
+        if data.get('duration_hours'):
+            return start_time, timedelta(hours=float(data['duration_hours']))
+        amount = float(data.get('amount') or 0)
+        mode = self._parse_mode(data.get('request_mode'))
+        if amount <= 0 or mode is None:
+            raise ValueError('缺少预约时长或充电量')
+        car = self.user_service.find_car(data.get('car_id', ''))
+        request = ChargingRequest(
+            data.get('car_id', ''), mode, amount,
+            battery_capacity_kwh=car.capacity_kwh if car else None,
+            battery_class=car.battery_class if car else None
+        )
+        return start_time, timedelta(hours=request.charge_hours(self.station_config.power_kw(mode)))
+
+    def _handle_make_reservation(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理预约充电时段：可指定充电桩（pile_id），或按充电模式（request_mode）自动选择"""
+        car_id = data.get('car_id')
+        if not car_id:
+            return {'status': 'error', 'message': '缺少车辆ID'}
+        mode = self._parse_mode(data.get('request_mode'))
+        try:
+            start_time, duration = self._parse_reservation_window(data)
+            reservation = self.reservation_service.reserve(
+                car_id, start_time, duration, pile_id=data.get('pile_id'), mode=mode)
+        except (TypeError, ValueError) as e:
+            return {'status': 'error', 'message': f'预约失败: {str(e)}'}
+        
+        self.eta_service.invalidate(reservation.charge_mode)
+        return {'status': 'success', 'message': '预约成功', 'data': reservation.to_dict()}
+
+    def _handle_cancel_reservation(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理取消预约"""
+        car_id = data.get('car_id')
+        reservation = self.reservation_service.get_reservation(car_id) if car_id else None
+        if not reservation:
+            return {'status': 'error', 'message': '没有找到预约'}
+        
+        self.reservation_service.cancel(car_id)
+        self.eta_service.invalidate(reservation.charge_mode)
+        self.dispatcher.request_cycle()
+        return {'status': 'success', 'message': '预约已取消'}
+
+    def _handle_get_reservation(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理查询预约：按车辆查询，或查询充电桩在某时段内的预约（pile_id + start_time/end_time）"""
+        if data.get('pile_id'):
+            start = datetime.fromisoformat(data['start_time']) if data.get('start_time') else self.clock.now()
+            end = datetime.fromisoformat(data['end_time']) if data.get('end_time') else start + timedelta(days=1)
+            reservations = self.reservation_service.get_pile_reservations(data['pile_id'], start, end)
+            return {'status': 'success', 'data': [r.to_dict() for r in reservations]}
+        
+        car_id = data.get('car_id')
+        if not car_id:
+            return {'status': 'error', 'message': '缺少车辆ID或充电桩ID'}
+        reservation = self.reservation_service.get_reservation(car_id)
+        return {'status': 'success', 'data': reservation.to_dict() if reservation else None}
+
+    def _handle_get_next_free_slot(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理查询最早可预约时段"""
+        mode = self._parse_mode(data.get('request_mode'))
+        if mode is None:
+            return {'status': 'error', 'message': '无效的充电模式'}
+        try:
+            data = dict(data, start_time=data.get('start_time') or self.clock.now().isoformat())
+            after, duration = self._parse_reservation_window(data)
+        except (TypeError, ValueError) as e:
+            return {'status': 'error', 'message': str(e)}
+        
+        slot = self.reservation_service.next_free_slot(mode, after, duration)
+        if slot is None:
+            return {'status': 'error', 'message': '当前没有可用的充电桩'}
+        pile_id, start_time = slot
+        return {
+            'status': 'success',
+            'data': {
+                'pile_id': pile_id,
+                'start_time': start_time.isoformat(),
+                'end_time': (start_time + duration).isoformat()
+            }
+        }
+
+    def _handle_get_live_cost(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """处理查询进行中会话的实时费用（在调度线程中读取进度引擎的累加器）"""
+        car_id = data.get('car_id')
+        if not car_id:
+            return {'status': 'error', 'message': '缺少车辆ID'}
+        live = self.charging_service.get_live_cost(car_id)
+        if live is None:
+            return {'status': 'error', 'message': '该车辆当前没有进行中的充电'}
+        return {'status': 'success', 'data': live.to_dict()}
+
+    def _handle_reload_tariff(self) -> Dict[str, Any]:
+        """处理重新加载电价配置，新电价对此后结算的账单生效"""
+        if not self.billing_service.reload_tariff():
+            return {'status': 'error', 'message': '电价配置无效，仍使用当前电价'}
+        return {'status': 'success', 'message': '电价配置已重新加载'}
+
 if __name__ == '__main__':
     server = ChargeServer()
     try:
@@ -1,68 +1,71 @@
 # services/billing_service.py
-import uuid
-from datetime import datetime, time
+import os
+from datetime import datetime
 from models.bill import Bill
 from models.charging_pile import ChargingPile
-from utils import config
-from dataclasses import dataclass
-from typing import Tuple
+from services.tariff import load_tariff_calendar, np
+from utils.config import TARIFF_CONFIG_PATH
+from utils.ids import new_ulid
+from utils.money import to_cents, to_cents_array
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
 
 @dataclass
-class BillingConfig:
-    """Configuration for billing rates."""
-    PEAK_RATE = 1.0  # 元/度
-    NORMAL_RATE = 0.7  # 元/度
-    VALLEY_RATE = 0.4  # 元/度
-    SERVICE_RATE = 0.8  # 元/度
-
-    @staticmethod
-    def get_peak_hours() -> list:
-        return [
-            (time(10, 0), time(15, 0)),
-            (time(18, 0), time(21, 0))
-        ]
-
-    @staticmethod
-    def get_normal_hours() -> list:
-        return [
-            (time(7, 0), time(10, 0)),
-            (time(15, 0), time(18, 0)),
-            (time(21, 0), time(23, 0))
-        ]
-
-    @staticmethod
-    def get_valley_hours() -> list:
-        return [
-            (time(23, 0), time(23, 59, 59)),
-            (time(0, 0), time(7, 0))
-        ]
+class RerateResult:
+    """一批账单重新计价的结果"""
+    bills: List[Bill]                                    # 重新计价后的账单（与输入顺序一致）
+    changes: List[Tuple[str, int, int]] = field(default_factory=list)  # (账单ID, 原总费用, 新总费用)，单位分
+    old_total_cents: int = 0
+    new_total_cents: int = 0
+
+    @property
+    def changed(self) -> int:
+        return len(self.changes)
+
+    @property
+    def delta_cents(self) -> int:
+        return self.new_total_cents - self.old_total_cents
 
 class BillingService:
     """Service for handling charging billing calculations."""
 
-    def __init__(self):
-        # 分时段电价（元/度）
-        self.PEAK_RATE = 1.0  # 峰时：10:00~15:00，18:00~21:00
-        self.NORMAL_RATE = 0.7  # 平时：7:00~10:00，15:00~18:00，21:00~23:00
-        self.VALLEY_RATE = 0.4  # 谷时：23:00~次日7:00
-        
-        # 服务费单价（元/度）
-        self.SERVICE_RATE = 0.8
+    def __init__(self, tariff_path: str = TARIFF_CONFIG_PATH):
+        # 分时电价、服务费、周末/节假日和季节方案都来自电价配置，加载时编译为按分钟的电价表，
+        # 计费为 O(1) 查表。重新加载时整体替换 self.tariff，每次计费只读取一次引用，
+        # 因此一张账单总是完整地按同一版电价计算。
+        self._tariff_path = tariff_path
+        self._tariff_mtime = self._tariff_config_mtime()
+        self.tariff = load_tariff_calendar(tariff_path)
 
-    def _get_time_rate(self, current_time: time) -> float:
-        """获取当前时段的电价"""
-        hour = current_time.hour
-        
-        # 峰时
-        if (10 <= hour < 15) or (18 <= hour < 21):
-            return self.PEAK_RATE
-        
-        # 平时
-        if (7 <= hour < 10) or (15 <= hour < 18) or (21 <= hour < 23):
-            return self.NORMAL_RATE
-        
-        # 谷时
-        return self.VALLEY_RATE
+    def _tariff_config_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._tariff_path)
+        except OSError:
+            return None
+
+    def reload_tariff(self) -> bool:
+        """重新加载电价配置
+
+        新配置完整编译后才替换当前电价；配置无效时保留当前电价。
+
+        Returns:
+            bool: 是否已切换到新配置
+        """
+        self._tariff_mtime = self._tariff_config_mtime()
+        try:
+            tariff = load_tariff_calendar(self._tariff_path)
+        except (OSError, ValueError) as e:
+            print(f"[BillingService] Tariff reload failed, keeping current tariff: {e}")
+            return False
+        self.tariff = tariff
+        print(f"[BillingService] Tariff reloaded from {self._tariff_path} ({len(tariff.tables)} tables)")
+        return True
+
+    def reload_tariff_if_changed(self) -> bool:
+        """电价配置文件有修改时重新加载"""
+        if self._tariff_config_mtime() == self._tariff_mtime:
+            return False
+        return self.reload_tariff()
 
     def calculate_charging_cost(self, charged_kwh: float, start_time: datetime, end_time: datetime) -> Tuple[float, float, float]:
         """计算充电费用
@@ -75,74 +78,91 @@ class BillingService:
         Returns:
             Tuple[float, float, float]: (充电费用, 服务费用, 总费用)
         """
-        # 计算充电费用
-        charge_fee = 0.0
-        current_time = start_time
-        
-        # 如果充电跨天，需要分段计算
-        while current_time < end_time:
-            # 计算当前时段的结束时间
-            if current_time.hour < 7:
-                next_time = current_time.replace(hour=7, minute=0, second=0)
-            elif current_time.hour < 10:
-                next_time = current_time.replace(hour=10, minute=0, second=0)
-            elif current_time.hour < 15:
-                next_time = current_time.replace(hour=15, minute=0, second=0)
-            elif current_time.hour < 18:
-                next_time = current_time.replace(hour=18, minute=0, second=0)
-            elif current_time.hour < 21:
-                next_time = current_time.replace(hour=21, minute=0, second=0)
-            elif current_time.hour < 23:
-                next_time = current_time.replace(hour=23, minute=0, second=0)
-            else:
-                next_time = current_time.replace(hour=23, minute=59, second=59)
-            
-            # 如果下一个时间点超过了结束时间，就使用结束时间
-            if next_time > end_time:
-                next_time = end_time
-            
-            # 计算当前时段的时长（小时）
-            duration = (next_time - current_time).total_seconds() / 3600
-            
-            # 计算当前时段的充电量
-            total_duration = (end_time - start_time).total_seconds() / 3600
-            current_kwh = charged_kwh * (duration / total_duration)
-            
-            # 计算当前时段的费用
-            rate = self._get_time_rate(current_time.time())
-            charge_fee += current_kwh * rate
-            
-            # 更新时间
-            current_time = next_time
-        
-        # 计算服务费
-        service_fee = charged_kwh * self.SERVICE_RATE
+        # 充电量按时长均匀分布：电费 = 充电量 × 区间内电价积分 / 时长（查表，O(1)）；
+        # 服务费 = 充电量 × 开始充电当天的服务费单价。只读取一次 self.tariff，重新加载电价不影响本次计算
+        charge_fee, service_fee = self.tariff.fees(charged_kwh, start_time, end_time)
         
         # 计算总费用
         total_fee = charge_fee + service_fee
         
         return charge_fee, service_fee, total_fee
 
-    def calculate_and_create_bill(self, session, pile: ChargingPile, end_time: datetime) -> Bill:
-        duration_hours = (end_time - session.start_time).total_seconds() / 3600
-        charged_kwh = min(pile.power_kw * duration_hours, session.request_amount_kwh)
+    def bulk_charging_cost(self, charged_kwh: Sequence[float], start_times, end_times):
+        """批量计算充电费用，逐项结果与 calculate_charging_cost 完全相同
+
+        Args:
+            charged_kwh: 充电量数组（度）
+            start_times: 开始时间数组（datetime 或 numpy.datetime64）
+            end_times: 结束时间数组
+
+        Returns:
+            (充电费用, 服务费用, 总费用) 三个数组；没有 numpy 时为列表
+        """
+        charge_fees, service_fees = self.tariff.bulk_fees(charged_kwh, start_times, end_times)
+        if np is None:
+            return charge_fees, service_fees, [c + s for c, s in zip(charge_fees, service_fees)]
+        return charge_fees, service_fees, charge_fees + service_fees
+
+    def rerate_bills(self, bills: Sequence[Bill]) -> RerateResult:
+        """按当前分时电价对一批账单重新计价
+
+        一次批量计算所有账单的费用，再按账单生成时的方式逐项四舍五入为整数分。
+
+        Args:
+            bills: 待重新计价的账单
+
+        Returns:
+            RerateResult: 重新计价后的账单及总费用有变化的账单
+        """
+        result = RerateResult(bills=[])
+        if not bills:
+            return result
+        charge_fees, service_fees, total_fees = self.bulk_charging_cost(
+            [bill.charged_kwh for bill in bills],
+            [bill.start_time for bill in bills],
+            [bill.end_time for bill in bills]
+        )
+        charge_cents = to_cents_array(charge_fees)
+        service_cents = to_cents_array(service_fees)
+        for bill, charge_fee_cents, service_fee_cents in zip(bills, charge_cents, service_cents):
+            rerated = Bill(
+                bill_id=bill.bill_id,
+                car_id=bill.car_id,
+                pile_id=bill.pile_id,
+                start_time=bill.start_time,
+                end_time=bill.end_time,
+                charged_kwh=bill.charged_kwh,
+                charge_mode=bill.charge_mode,
+                charge_fee_cents=int(charge_fee_cents),
+                service_fee_cents=int(service_fee_cents)
+            )
+            result.bills.append(rerated)
+            result.old_total_cents += bill.total_fee_cents
+            result.new_total_cents += rerated.total_fee_cents
+            if rerated.total_fee_cents != bill.total_fee_cents:
+                result.changes.append((bill.bill_id, bill.total_fee_cents, rerated.total_fee_cents))
+        return result
+
+    def calculate_and_create_bill(self, session, pile: ChargingPile, end_time: datetime,
+                                  charged_kwh: Optional[float] = None) -> Bill:
+        if charged_kwh is None:
+            duration_hours = (end_time - session.start_time).total_seconds() / 3600
+            charged_kwh = min(pile.power_kw * duration_hours, session.request_amount_kwh)
+        # 账单保存两位小数的电量，按同一电量计价，重新计价（rerate_bills）时费用才能复现
+        charged_kwh = round(charged_kwh, 2)
         
-        price_per_kwh = config.PRICE_PER_KWH[pile.pile_type]
-        charge_fee = charged_kwh * price_per_kwh
-        service_fee = config.SERVICE_FEE
-        total_fee = charge_fee + service_fee
+        charge_fee, service_fee, _ = self.calculate_charging_cost(charged_kwh, session.start_time, end_time)
         
         bill = Bill(
-            bill_id=str(uuid.uuid4()),
+            bill_id=new_ulid(end_time),
             car_id=session.car_id,
             pile_id=session.pile_id,
             start_time=session.start_time,
             end_time=end_time,
-            charged_kwh=round(charged_kwh, 2),
+            charged_kwh=charged_kwh,
             charge_mode=pile.pile_type,
-            charge_fee=round(charge_fee, 2),
-            service_fee=round(service_fee, 2),
-            total_fee=round(total_fee, 2)
+            charge_fee_cents=to_cents(charge_fee),
+            service_fee_cents=to_cents(service_fee)
         )
         print(f"[BillingService] Bill created for Car {bill.car_id}. Total: ${bill.total_fee:.2f}")
         return bill
\ No newline at end of file
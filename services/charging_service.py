@@ -1,35 +1,68 @@
 # services/charging_service.py
-import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from models.car import ChargingRequest
 from models.charging_pile import ChargingPile
-from models.bill import ChargingSession
+from models.bill import ChargingSession, Bill
 from repositories.repositories import (
     PileRepository, SessionRepository, BillRepository, RequestRepository, QueueRepository
 )
 from services.billing_service import BillingService
 from services.queue_service import QueueService
+from services.progress_service import ChargingProgressEngine, CompletionEvent, LiveCost
+from services.load_manager import LoadManager, PowerDemand
 from utils.enums import WorkState, CarState, ChargeMode
+from utils.clock import Clock, SYSTEM_CLOCK
+from utils.ids import new_ulid
+from utils.timer_wheel import TimerWheel, TimerHandle
+from typing import Callable, Dict, List, Optional
 
 class ChargingService:
     def __init__(self, pile_repo: PileRepository, session_repo: SessionRepository, 
                  bill_repo: BillRepository, request_repo: RequestRepository, 
-                 queue_repo: QueueRepository, billing_service: BillingService):
+                 queue_repo: QueueRepository, billing_service: BillingService,
+                 clock: Optional[Clock] = None,
+                 progress_engine: Optional[ChargingProgressEngine] = None,
+                 timer_wheel: Optional[TimerWheel] = None,
+                 queue_service: Optional[QueueService] = None,
+                 load_manager: Optional[LoadManager] = None):
         self._pile_repo = pile_repo
         self._session_repo = session_repo
         self._bill_repo = bill_repo
         self._request_repo = request_repo
         self._queue_repo = queue_repo
         self._billing_service = billing_service
-        self._queue_service = QueueService(queue_repo)
+        self._clock = clock or SYSTEM_CLOCK
+        # 与服务器其他组件共用同一个 QueueService，保证排队号计数器唯一
+        self._queue_service = queue_service or QueueService(queue_repo, self._clock)
+        self._progress = progress_engine or ChargingProgressEngine()
+        # 充电进度按当前生效的分时电价累计实时费用
+        self._progress.attach_tariff(lambda: self._billing_service.tariff)
+        # 会话完成定时器：开始充电时按 请求电量/功率 精确安排，无需扫描会话
+        self._timers = timer_wheel or TimerWheel(self._clock.now())
+        self._completion_timers: Dict[str, TimerHandle] = {}
+        self._completion_deadlines: Dict[str, datetime] = {}
+        # 站级功率预算：会话开始/结束时重新分配各会话功率
+        self._load_manager = load_manager
+        self._session_demands: Dict[str, tuple] = {}  # 充电桩ID -> (优先级, 截止时间)
+        # 按车辆充电曲线折算的会话平均功率上限（充电桩ID -> 千瓦）
+        self._session_caps: Dict[str, float] = {}
+        self._completion_listeners: List[Callable[[str], None]] = []
+        self._pile_listeners: List[Callable[[str], None]] = []
+        self._start_listeners: List[Callable[[ChargingRequest, ChargingSession], None]] = []
 
-    def create_charging_request(self, car_id: str, mode: str, amount: float) -> ChargingRequest:
+    def create_charging_request(self, car_id: str, mode: str, amount: float,
+                                battery_capacity_kwh: Optional[float] = None,
+                                battery_class: Optional[str] = None,
+                                start_soc: Optional[float] = None) -> ChargingRequest:
         """创建充电请求
         
         Args:
             car_id: 车辆ID
             mode: 充电模式（"FAST" 或 "TRICKLE"）
             amount: 充电量（kWh）
+            battery_capacity_kwh: 电池容量（kWh），未知时按恒定功率估算充电时长
+            battery_class: 电池类型（充电曲线）
+            start_soc: 到站时的荷电状态（0~1）
             
         Returns:
             ChargingRequest: 创建的充电请求
@@ -37,12 +70,20 @@ class ChargingService:
         # 转换充电模式字符串为枚举值
         request_mode = ChargeMode.FAST if mode == "FAST" else ChargeMode.TRICKLE
         
+        # 同一车辆不能在等候区重复排队
+        if self._queue_repo.find_by_car_id(car_id) is not None:
+            raise ValueError(f"车辆 {car_id} 已在等候区排队")
+        
         # 创建充电请求
         request = ChargingRequest(
             car_id=car_id,
             request_mode=request_mode,
             request_amount_kwh=amount,
-            state=CarState.WAITING_IN_MAIN_QUEUE  # 设置初始状态
+            request_time=self._clock.now(),
+            state=CarState.WAITING_IN_MAIN_QUEUE,  # 设置初始状态
+            battery_capacity_kwh=battery_capacity_kwh,
+            battery_class=battery_class,
+            start_soc=start_soc
         )
         
         # 保存请求
@@ -63,19 +104,153 @@ class ChargingService:
             return
 
         print(f"[ChargingService] Starting charge for Car {request.car_id} at Pile {pile.pile_id}.")
-        pile.state = WorkState.CHARGING
+        now = self._clock.now()
+        pile.start_charging(request.car_id, now)
         request.state = CarState.CHARGING
         
         session = ChargingSession(
-            session_id=str(uuid.uuid4()),
+            session_id=new_ulid(now),
             car_id=request.car_id,
             pile_id=pile.pile_id,
-            start_time=datetime.now(),
+            start_time=now,
             request_amount_kwh=request.request_amount_kwh
         )
         self._session_repo.save(session.session_id, session)
         pile.current_charging_session = session
         self._pile_repo.save(pile.pile_id, pile) # Update pile state in repo
+        # 电池高SOC段降功率，会话按曲线折算的平均功率推进，充满请求电量的时刻与曲线一致
+        power_cap = self._session_power(request, pile.power_kw)
+        self._progress.start(pile.pile_id, session.car_id, session.session_id,
+                             power_cap, session.request_amount_kwh, now)
+        self._session_demands[pile.pile_id] = (request.priority, request.deadline)
+        self._session_caps[pile.pile_id] = power_cap
+        self._schedule_completion(pile.pile_id, session.car_id, now)
+        self._rebalance(now)
+        for listener in self._start_listeners:
+            listener(request, session)
+        self._notify_pile_changed(pile.pile_id)
+
+    @staticmethod
+    def _session_power(request: ChargingRequest, rated_kw: float) -> float:
+        """车辆在额定功率为 rated_kw 的充电桩上按充电曲线充满请求电量的平均功率"""
+        hours = request.charge_hours(rated_kw)
+        if hours <= 0:
+            return rated_kw
+        return min(request.request_amount_kwh / hours, rated_kw)
+
+    def _schedule_completion(self, pile_id: str, car_id: str, now: datetime):
+        """按当前分配功率和剩余电量（重新）安排会话完成定时器"""
+        self._timers.cancel(self._completion_timers.pop(pile_id, None))
+        self._completion_deadlines.pop(pile_id, None)
+        power = self._progress.power_kw(pile_id)
+        if power <= 0:
+            return  # 暂未分配到功率，等下一次重新分配
+        done_at = now + timedelta(hours=self._progress.remaining_kwh(pile_id, now) / power)
+        self._completion_timers[pile_id] = self._timers.schedule(
+            done_at, self._on_completion_timer, pile_id, car_id)
+        self._completion_deadlines[pile_id] = done_at
+
+    def _cancel_completion(self, pile_id: str):
+        self._timers.cancel(self._completion_timers.pop(pile_id, None))
+        self._completion_deadlines.pop(pile_id, None)
+        self._session_demands.pop(pile_id, None)
+        self._session_caps.pop(pile_id, None)
+
+    def _rebalance(self, now: datetime):
+        """按站级功率预算重新分配所有活跃会话的功率，功率变化的会话重新安排完成时间"""
+        if self._load_manager is None:
+            return
+        demands = []
+        for pile_id in self._progress.active_pile_ids():
+            pile = self._pile_repo.get(pile_id)
+            if not pile:
+                continue
+            priority, deadline = self._session_demands.get(pile_id, (0, None))
+            demands.append(PowerDemand(pile_id, self._session_caps.get(pile_id, pile.power_kw),
+                                       self._progress.remaining_kwh(pile_id, now), priority, deadline))
+        for pile_id, power in self._load_manager.allocate(demands, now).items():
+            if abs(power - self._progress.power_kw(pile_id)) < 1e-9:
+                continue
+            self._progress.set_power(pile_id, power, now)
+            pile = self._pile_repo.get(pile_id)
+            self._schedule_completion(pile_id, pile.current_car_id, now)
+            self._notify_pile_changed(pile_id)
+
+    def get_allocated_power(self, pile_id: str) -> float:
+        """获取充电桩当前会话的分配功率（千瓦），空闲时为0"""
+        return self._progress.power_kw(pile_id)
+
+    def get_expected_powers(self, piles: List[ChargingPile]) -> Dict[str, float]:
+        """估算新会话在各充电桩上能获得的功率（按当前负载近似），用于预计等待时间"""
+        if self._load_manager is None:
+            return {pile.pile_id: pile.power_kw for pile in piles}
+        active_rated = [self._session_caps.get(pile_id, self._pile_repo.get(pile_id).power_kw)
+                        for pile_id in self._progress.active_pile_ids()]
+        by_rating: Dict[float, float] = {}
+        for pile in piles:
+            if pile.power_kw not in by_rating:
+                by_rating[pile.power_kw] = self._load_manager.estimate_power(pile.power_kw, active_rated)
+        return {pile.pile_id: by_rating[pile.power_kw] for pile in piles}
+
+    def get_completion_deadline(self, pile_id: str) -> Optional[datetime]:
+        """获取充电桩当前会话的预计完成时间"""
+        return self._completion_deadlines.get(pile_id)
+
+    def add_completion_listener(self, listener: Callable[[str], None]):
+        """注册会话自动完成后的回调，参数为空出的充电桩ID"""
+        self._completion_listeners.append(listener)
+
+    def add_pile_listener(self, listener: Callable[[str], None]):
+        """注册充电桩状态变化（开始/结束充电、故障、恢复）的回调，参数为充电桩ID"""
+        self._pile_listeners.append(listener)
+
+    def add_start_listener(self, listener: Callable[[ChargingRequest, ChargingSession], None]):
+        """注册会话开始充电的回调，参数为充电请求和新建的充电会话"""
+        self._start_listeners.append(listener)
+
+    def _notify_pile_changed(self, pile_id: str):
+        for listener in self._pile_listeners:
+            listener(pile_id)
+
+    def advance_timers(self) -> int:
+        """推进会话完成定时器，到期的会话自动结算并叫下一辆车
+        
+        Returns:
+            int: 本次自动完成的会话数量
+        """
+        return self._timers.advance(self._clock.now())
+
+    def _on_completion_timer(self, pile_id: str, car_id: str):
+        """会话完成定时器到期：结算账单，然后通知调度为该桩叫号"""
+        self._completion_timers.pop(pile_id, None)
+        self._completion_deadlines.pop(pile_id, None)
+        print(f"[ChargingService] Session for Car {car_id} at Pile {pile_id} reached its requested amount.")
+        if self.end_charging(car_id):
+            for listener in self._completion_listeners:
+                listener(pile_id)
+
+    def tick_progress(self) -> List[CompletionEvent]:
+        """推进所有活跃会话的充电进度
+        
+        Returns:
+            List[CompletionEvent]: 已充满请求电量的会话
+        """
+        return self._progress.tick(self._clock.now())
+
+    def get_charged_kwh(self, pile_id: str) -> float:
+        """获取充电桩当前会话的已充电量（度）"""
+        return self._progress.charged_kwh(pile_id)
+
+    def get_live_cost(self, car_id: str) -> Optional[LiveCost]:
+        """获取车辆进行中会话的实时充电量和费用（截至上次充电进度 tick），不在充电时返回 None"""
+        return self._progress.live_cost(car_id)
+
+    def get_remaining_hours(self, pile_id: str) -> float:
+        """获取充电桩当前会话的剩余充电时长（小时），空闲时为0"""
+        power = self._progress.power_kw(pile_id)
+        if power <= 0:
+            return 0.0
+        return self._progress.remaining_kwh(pile_id, self._clock.now()) / power
 
     def end_charging(self, car_id: str):
         """结束充电
@@ -83,12 +258,17 @@ class ChargingService:
         Args:
             car_id: 车辆ID
         """
-        # 查找当前充电会话
+        # 查找当前充电会话：先通过请求记录的充电桩直接定位，找不到时再扫描会话
         current_session = None
-        for session in self._session_repo.get_all():
-            if session.car_id == car_id:
-                current_session = session
-                break
+        request = self._request_repo.get(car_id)
+        pile = self._pile_repo.get(request.pile_id) if request and request.pile_id else None
+        if pile and pile.current_charging_session and pile.current_charging_session.car_id == car_id:
+            current_session = pile.current_charging_session
+        else:
+            for session in self._session_repo.get_all():
+                if session.car_id == car_id:
+                    current_session = session
+                    break
 
         if not current_session:
             print(f"[ChargingService] Error: No active charging session found for Car {car_id}")
@@ -100,12 +280,22 @@ class ChargingService:
             print(f"[ChargingService] Error: Pile {current_session.pile_id} not found")
             return None
 
+        # 取消完成定时器（手动结束时定时器尚未触发）
+        self._cancel_completion(pile.pile_id)
+
+        # 结算充电进度（未被进度引擎跟踪的会话按功率×时长估算）
+        now = self._clock.now()
+        charged_kwh = None
+        if self._progress.is_active(pile.pile_id):
+            charged_kwh = self._progress.stop(pile.pile_id, now)
+            pile.update_charging(charged_kwh)
+
         print(f"[ChargingService] Ending charge for Car {car_id} at Pile {pile.pile_id}")
         print(f"[ChargingService] Current pile state: {pile.state.value}")
         print(f"[ChargingService] Current pile charged_kwh: {pile.charged_kwh}")
 
         # 计算账单
-        bill = self._billing_service.calculate_and_create_bill(current_session, pile, datetime.now())
+        bill = self._billing_service.calculate_and_create_bill(current_session, pile, now, charged_kwh)
         self._bill_repo.save(bill.bill_id, bill)
         print(f"[ChargingService] Created bill for Car {car_id}")
         
@@ -117,7 +307,7 @@ class ChargingService:
             print(f"[ChargingService] Updated request state to CHARGING_COMPLETED for Car {car_id}")
 
         # 更新充电桩状态
-        pile.end_charging(pile.charged_kwh, bill.total_fee)
+        pile.end_charging(bill.charged_kwh, bill.total_fee_cents, now)
         self._pile_repo.save(pile.pile_id, pile)
         print(f"[ChargingService] Updated pile state to {pile.state.value} for Pile {pile.pile_id}")
         print(f"[ChargingService] Pile charged_kwh after end_charging: {pile.charged_kwh}")
@@ -127,34 +317,68 @@ class ChargingService:
         print(f"[ChargingService] Deleted charging session for Car {car_id}")
         
         print(f"[ChargingService] Charging completed for Car {car_id}. Total amount: {bill.total_fee}")
+        # 释放的功率分配给其他会话
+        self._rebalance(now)
+        self._notify_pile_changed(pile.pile_id)
         return bill
         
-    def report_pile_failure(self, pile_id: str):
+    def report_pile_failure(self, pile_id: str) -> Optional[Bill]:
+        """充电桩故障：中断正在充电的车辆，为已充电量生成详单，剩余电量进入故障优先通道
+        
+        Args:
+            pile_id: 故障充电桩ID
+            
+        Returns:
+            Optional[Bill]: 被中断会话的详单，故障时没有车辆在充电则返回None
+        """
         pile = self._pile_repo.get(pile_id)
-        if not pile: return
+        if not pile: return None
 
         print(f"[ChargingService] EMERGENCY: Pile {pile_id} reported a failure!")
-        pile.state = WorkState.FAULTY
+        bill = None
         
         # If a car was charging, interrupt it
-        if pile.current_charging_session:
-            session = pile.current_charging_session
+        session = pile.current_charging_session
+        if session and pile.state == WorkState.CHARGING:
             print(f"  -> Interrupting charge for Car {session.car_id}.")
-            # A real system would calculate partial bill and re-queue the car
-            # For simplicity, we just end the session without a full bill
-            interrupted_request = self._request_repo.get(session.car_id)
-            interrupted_request.state = CarState.WAITING_IN_MAIN_QUEUE
-            self._queue_repo.add_to_front_of_queue(interrupted_request) # Re-add to front of the queue
-            print(f"  -> Car {session.car_id} has been re-queued with priority.")
-            
-            pile.current_charging_session = None
-            self._session_repo.delete(session.session_id)
-            
+            original = self._request_repo.get(session.car_id)
+            # 按已充电量结算被中断的会话（同时停止进度和完成定时器）
+            bill = self.end_charging(session.car_id)
+            remaining = round(session.request_amount_kwh - (bill.charged_kwh if bill else 0.0), 2)
+            if remaining > 0:
+                # 剩余电量保留原请求时间和排队号，按时间顺序在故障通道中优先叫号
+                request = ChargingRequest(
+                    car_id=session.car_id,
+                    request_mode=pile.pile_type,
+                    request_amount_kwh=remaining,
+                    request_time=original.request_time if original else session.start_time,
+                    state=CarState.WAITING_IN_MAIN_QUEUE,
+                    queue_number=original.queue_number if original else None
+                )
+                if original and original.battery_capacity_kwh:
+                    # 续充请求从已充到的荷电状态开始
+                    request.battery_capacity_kwh = original.battery_capacity_kwh
+                    request.battery_class = original.battery_class
+                    request.start_soc = min(original.initial_soc() + (bill.charged_kwh if bill else 0.0)
+                                            / original.battery_capacity_kwh, 1.0)
+                self._request_repo.save(request.car_id, request)
+                self._queue_repo.add_to_fault_lane(request)
+                print(f"  -> Car {session.car_id} has been re-queued with priority ({remaining} kWh remaining).")
+        else:
+            self._progress.stop(pile_id, self._clock.now())
+            self._cancel_completion(pile_id)
+            self._rebalance(self._clock.now())
+        
+        pile.state = WorkState.FAULTY
+        pile.current_charging_session = None
         self._pile_repo.save(pile.pile_id, pile)
+        self._notify_pile_changed(pile_id)
+        return bill
 
     def recover_pile(self, pile_id: str):
         pile = self._pile_repo.get(pile_id)
         if pile and pile.state == WorkState.FAULTY:
             pile.state = WorkState.IDLE
             self._pile_repo.save(pile.pile_id, pile)
-            print(f"[ChargingService] Pile {pile_id} has been recovered and is now IDLE.")
\ No newline at end of file
+            print(f"[ChargingService] Pile {pile_id} has been recovered and is now IDLE.")
+            self._notify_pile_changed(pile_id)
\ No newline at end of file
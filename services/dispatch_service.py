@@ -8,32 +8,52 @@ from services.queue_service import QueueService
 class DispatchService:
     """Service for handling charging pile dispatch strategies."""
 
-    def __init__(self, pile_repo, queue_repo, waiting_area_capacity: int = 10):
+    def __init__(self, pile_repo, queue_repo, waiting_area_capacity: int = 10,
+                 queue_service: Optional[QueueService] = None):
         self.pile_repo = pile_repo
         self.queue_repo = queue_repo
-        self.queue_service = QueueService(queue_repo)
+        self.queue_service = queue_service or QueueService(queue_repo)
         self.waiting_area_capacity = waiting_area_capacity
+        self._eta_service = None
+        self._reservation_service = None
 
-    def can_accept_request(self, request: ChargingRequest) -> Tuple[bool, str]:
-        """检查是否可以接受新的充电请求
+    def attach_eta_service(self, eta_service):
+        """使用 EtaService 的推演结果选择充电桩，避免逐桩计算"""
+        self._eta_service = eta_service
+
+    def attach_reservation_service(self, reservation_service):
+        """估算完成时间时避开充电桩上他人的预约时段"""
+        self._reservation_service = reservation_service
+
+    def can_accept(self, mode: ChargeMode) -> Tuple[bool, str]:
+        """检查指定模式是否可以接受新的充电请求，O(1)
         
         Args:
-            request: 充电请求
+            mode: 充电模式
             
         Returns:
             Tuple[bool, str]: (是否可以接受, 原因说明)
         """
         # 检查等待区容量
-        current_queue_size = self.queue_service.get_queue_length(request.request_mode)
-        if current_queue_size >= self.waiting_area_capacity:
+        if self.queue_service.get_queue_length(mode) >= self.waiting_area_capacity:
             return False, "等待区已满，请稍后再试"
         
         # 检查是否有可用的充电桩
-        available_piles = self._get_available_piles(request.request_mode)
-        if not available_piles:
+        if not self.pile_repo.count_available(mode):
             return False, "当前没有可用的充电桩"
         
         return True, "可以接受请求"
+
+    def can_accept_request(self, request: ChargingRequest) -> Tuple[bool, str]:
+        """检查是否可以接受新的充电请求
+        
+        Args:
+            request: 充电请求
+            
+        Returns:
+            Tuple[bool, str]: (是否可以接受, 原因说明)
+        """
+        return self.can_accept(request.request_mode)
     
     def _get_available_piles(self, mode: ChargeMode) -> List[ChargingPile]:
         """获取指定模式下可用的充电桩
@@ -44,12 +64,7 @@ class DispatchService:
         Returns:
             List[ChargingPile]: 可用的充电桩列表
         """
-        return [
-            pile for pile in self.pile_repo.get_all()
-            if (pile.pile_type == mode and 
-                pile.state != PileState.FAULT and 
-                pile.state != PileState.REPAIRING)
-        ]
+        return self.pile_repo.get_available_piles(mode)
     
     def find_best_pile(self, request: ChargingRequest) -> Optional[Tuple[ChargingPile, float]]:
         """为充电请求找到最佳充电桩
@@ -66,6 +81,14 @@ class DispatchService:
         if not can_accept:
             return None
         
+        # 已接入 EtaService 时直接取推演堆顶：排到队尾后最早空闲的同类型充电桩
+        if self._eta_service is not None:
+            predicted = self._eta_service.predict_assignment(request)
+            if predicted is None:
+                return None
+            pile_id, total_time = predicted
+            return self.pile_repo.get(pile_id), total_time
+        
         # 获取所有同类型的充电桩
         available_piles = self._get_available_piles(request.request_mode)
         
@@ -80,8 +103,13 @@ class DispatchService:
             # 计算等待时间（当前队列中所有车辆的充电时间之和）
             waiting_time = self._calculate_waiting_time(pile)
             
-            # 计算充电时间
-            charging_time = request.request_amount_kwh / pile.power_kw
+            # 计算充电时间（按车辆充电曲线，高SOC段降功率）
+            charging_time = request.charge_hours(pile.power_kw)
+            
+            # 充完前会占用他人预约时段时，需等到预约之后再开始
+            if self._reservation_service is not None:
+                waiting_time = self._reservation_service.adjusted_wait_hours(
+                    pile.pile_id, request, waiting_time, charging_time)
             
             # 计算总时长
             total_time = waiting_time + charging_time
@@ -110,47 +138,11 @@ class DispatchService:
         # 计算队列中所有车辆的充电时间
         for request in queue:
             if request.pile_id == pile.pile_id:
-                charging_time = request.request_amount_kwh / pile.power_kw
+                charging_time = request.charge_hours(pile.power_kw)
                 waiting_time += charging_time
         
         return waiting_time
     
-    def handle_pile_fault(self, fault_pile: ChargingPile) -> List[ChargingRequest]:
-        """处理充电桩故障
-        
-        Args:
-            fault_pile: 故障充电桩
-            
-        Returns:
-            List[ChargingRequest]: 需要重新调度的请求列表
-        """
-        # 获取故障充电桩的排队队列
-        queue = self.queue_service.get_queue_status(fault_pile.pile_type)
-        affected_requests = []
-        
-        # 找出故障充电桩队列中的请求
-        for request in queue:
-            if request.pile_id == fault_pile.pile_id:
-                affected_requests.append(request)
-                # 从原队列中移除
-                self.queue_service.remove_from_queue(request.queue_number)
-        
-        # 重新调度这些请求
-        for request in affected_requests:
-            # 检查等待区容量
-            can_accept, _ = self.can_accept_request(request)
-            if not can_accept:
-                # 如果等待区已满，将请求标记为等待中
-                request.status = "等待中"
-                continue
-                
-            best_pile, _ = self.find_best_pile(request)
-            if best_pile:
-                request.pile_id = best_pile.pile_id
-                self.queue_service.add_to_queue(request)
-        
-        return affected_requests
-    
     def handle_pile_repair(self, repaired_pile: ChargingPile) -> List[ChargingRequest]:
         """处理充电桩修复
         
@@ -206,27 +198,29 @@ class DispatchService:
         if not self._can_modify_request(request):
             return False
         
-        # 从原队列中移除
-        self.queue_service.remove_from_queue(request.queue_number)
+        mode_changed = new_mode is not None and new_mode != request.request_mode
         
-        # 修改请求
-        if new_mode is not None:
-            request.request_mode = new_mode
-            # 重新生成排队号码
-            request.queue_number = None
+        if not mode_changed:
+            # 只修改充电量：原地修改，排队号和位置不变
+            if new_amount is not None:
+                self.queue_repo.update_amount(request.car_id, new_amount)
+                request.request_amount_kwh = new_amount
+            return True
         
-        if new_amount is not None:
-            request.request_amount_kwh = new_amount
-        
-        # 检查等待区容量
-        can_accept, _ = self.can_accept_request(request)
-        if not can_accept:
-            # 如果等待区已满，将请求标记为等待中
-            request.status = "等待中"
+        # 修改充电模式：检查新模式的等待区容量后，从原队列移除并排到新队列队尾
+        if self.queue_service.get_queue_length(new_mode) >= self.waiting_area_capacity:
             return False
-        
-        # 重新加入队列
-        self.queue_service.add_to_queue(request)
+        queued = self.queue_repo.remove_by_car_id(request.car_id) or request
+        queued.request_mode = new_mode
+        if new_amount is not None:
+            queued.request_amount_kwh = new_amount
+        # 重新生成排队号码
+        queued.queue_number = None
+        self.queue_service.add_to_queue(queued)
+        if queued is not request:
+            request.request_mode = queued.request_mode
+            request.request_amount_kwh = queued.request_amount_kwh
+            request.queue_number = queued.queue_number
         return True
     
     def _can_modify_request(self, request: ChargingRequest) -> bool:
@@ -238,16 +232,9 @@ class DispatchService:
         Returns:
             bool: 是否可以修改
         """
-        # 检查充电桩状态
-        pile = self.pile_repo.find_by_id(request.pile_id)
-        if not pile:
-            return True  # 如果没有分配充电桩，可以修改
-        
-        # 如果已经在充电，不能修改
-        if pile.state == PileState.CHARGING:
-            return False
-        
-        return True
+        # 只有仍在等候区排队的请求可以修改，已叫号或正在充电的不能修改
+        return (request.state == CarState.WAITING_IN_MAIN_QUEUE and
+                self.queue_repo.find_by_car_id(request.car_id) is not None)
 
     def batch_dispatch(self, requests: List[ChargingRequest]) -> None:
         """
@@ -256,8 +243,7 @@ class DispatchService:
         across all vehicles in the batch.
         """
         # Combine all available piles
-        all_piles = self.pile_repo.get_all()
-        available_piles = [p for p in all_piles if p.state != PileState.FAULT and p.state != PileState.REPAIRING]
+        available_piles = [pile for mode in ChargeMode for pile in self.pile_repo.get_available_piles(mode)]
 
         # Calculate total charging time for each possible assignment
         best_assignment = None
@@ -271,8 +257,8 @@ class DispatchService:
 
             for pile in available_piles:
                 # Calculate total time for this pile
-                queue_time = sum(r.request_amount_kwh / pile.power_kw for r in self.queue_service.get_queue_status(pile.pile_type))
-                charging_time = request.request_amount_kwh / pile.power_kw
+                queue_time = sum(r.charge_hours(pile.power_kw) for r in self.queue_service.get_queue_status(pile.pile_type))
+                charging_time = request.charge_hours(pile.power_kw)
                 total_time = queue_time + charging_time
 
                 if total_time < min_time:
@@ -0,0 +1,148 @@
+# services/dispatcher.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+
+class Dispatcher:
+    """单写者调度线程
+
+    所有修改等候队列和充电桩状态的操作都封装成命令投递到本线程的命令队列，
+    由唯一的调度线程按顺序执行，调用方拿到 Future 等待结果。
+    因此队列、排队号计数器、充电桩状态都只有一个写者，无需加锁。
+
+    调度线程每次取出当前积压的全部命令依次执行，执行期间通过 request_cycle()
+    标记需要调度，一批命令处理完后只运行一次调度周期（批量决策）。
+    request_cycle() 也可以在其他线程调用：标记是 threading.Event，并投递一个唤醒命令，
+    调度线程不必等到下一个节拍才运行调度周期。
+    另外每隔 tick_interval 秒执行一次 on_tick（推进定时器、充电进度等）。
+    """
+
+    _STOP = object()
+    _WAKE = object()
+
+    def __init__(self, on_tick: Optional[Callable[[], None]] = None,
+                 on_cycle: Optional[Callable[[], None]] = None,
+                 tick_interval: float = 1.0, max_batch: int = 256):
+        self._commands: queue.Queue = queue.Queue()
+        self._on_tick = on_tick
+        self._on_cycle = on_cycle
+        self._tick_interval = tick_interval
+        self._max_batch = max_batch
+        self._cycle_requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._state_lock = threading.Lock()  # 只保护启动/停止状态与命令投递的原子性
+
+    @property
+    def in_dispatcher_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def start(self):
+        """启动调度线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="dispatcher", daemon=True)
+        self._thread.start()
+        print("[Dispatcher] 调度线程已启动")
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止调度线程，已投递的命令会先执行完"""
+        if not self._running:
+            return
+        self._commands.put(self._STOP)
+        if not self.in_dispatcher_thread:
+            self._thread.join(timeout)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """投递一个命令，返回其结果的 Future"""
+        future = Future()
+        with self._state_lock:
+            if not self._running:
+                future.set_exception(RuntimeError("调度线程未启动"))
+                return future
+            self._commands.put((future, fn, args, kwargs))
+        return future
+
+    def call(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """投递命令并等待结果；在调度线程内调用时直接执行，避免自我等待"""
+        if self.in_dispatcher_thread:
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def request_cycle(self):
+        """标记本批命令执行完后需要运行一次调度周期（多次标记只运行一次）"""
+        if self._cycle_requested.is_set():
+            return
+        self._cycle_requested.set()
+        if not self.in_dispatcher_thread:
+            self._commands.put(self._WAKE)
+
+    def _run(self):
+        next_tick = time.monotonic() + self._tick_interval
+        while True:
+            timeout = max(next_tick - time.monotonic(), 0.0)
+            for command in self._next_batch(timeout):
+                if command is self._STOP:
+                    with self._state_lock:
+                        self._running = False
+                    continue
+                if command is self._WAKE:
+                    continue
+                self._execute(command)
+
+            if time.monotonic() >= next_tick:
+                next_tick = time.monotonic() + self._tick_interval
+                self._guarded(self._on_tick)
+
+            if self._cycle_requested.is_set():
+                self._cycle_requested.clear()
+                self._guarded(self._on_cycle)
+
+            if not self._running:
+                with self._state_lock:
+                    self._drain()
+                break
+
+    def _next_batch(self, timeout: float) -> list:
+        """等待第一个命令（最多 timeout 秒），再取出当前积压的其余命令"""
+        try:
+            batch = [self._commands.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self._max_batch:
+            try:
+                batch.append(self._commands.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _execute(self, command):
+        future, fn, args, kwargs = command
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _drain(self):
+        """停止后仍留在队列中的命令直接以异常结束，避免调用方永久等待"""
+        while True:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if command is not self._STOP and command is not self._WAKE:
+                command[0].set_exception(RuntimeError("调度线程已停止"))
+
+    def _guarded(self, fn: Optional[Callable[[], None]]):
+        if fn is None:
+            return
+        try:
+            fn()
+        except Exception as e:
+            print(f"[Dispatcher] 调度线程发生错误: {str(e)}")
@@ -0,0 +1,318 @@
+# services/eta_service.py
+import heapq
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from models.car import ChargingRequest
+from utils.clock import Clock, SYSTEM_CLOCK
+from utils.enums import ChargeMode
+
+
+@dataclass(frozen=True)
+class EtaEstimate:
+    """排队车辆的预计开始/结束充电时间"""
+    car_id: str
+    queue_number: Optional[str]
+    position: int                # 在本模式等候队列中的位置（从1开始）
+    pile_id: Optional[str]       # 预计分配的充电桩
+    estimated_start: Optional[datetime]
+    estimated_end: Optional[datetime]
+
+    def to_dict(self, now: datetime) -> dict:
+        waiting_hours = None
+        if self.estimated_start:
+            waiting_hours = max((self.estimated_start - now).total_seconds(), 0.0) / 3600
+        return {
+            'car_id': self.car_id,
+            'queue_number': self.queue_number,
+            'position': self.position,
+            'cars_ahead': self.position - 1,
+            'pile_id': self.pile_id,
+            'waiting_hours': waiting_hours,
+            'estimated_start': self.estimated_start.isoformat() if self.estimated_start else None,
+            'estimated_end': self.estimated_end.isoformat() if self.estimated_end else None
+        }
+
+
+# 充电桩上的预约时段 (开始时间戳, 结束时间戳, 预约车辆ID)，按开始时间排序
+Intervals = Tuple[Tuple[float, float, str], ...]
+# (充电桩ID, 请求, 最早时刻, 充电小时数) -> 考虑预约后最早可开始的时刻
+AvailableFrom = Callable[[str, ChargingRequest, float, float], float]
+
+
+@dataclass(frozen=True)
+class PlanSnapshot:
+    """某一模式推演结果的只读快照：推演到队尾后各充电桩的空闲时刻堆、排队车辆数、
+    每辆排队车辆的预计时间和排队号索引，以及发布时各充电桩预约时段的不可变副本（没有预约的充电桩不出现）"""
+    mode: ChargeMode
+    heap: Tuple[Tuple[float, str, float], ...]
+    waiting: int
+    built_at: datetime
+    reservations: Mapping[str, Intervals]
+    etas: Mapping[str, EtaEstimate]      # 车辆ID -> 预计时间
+    numbers: Mapping[str, str]           # 排队号 -> 车辆ID
+
+    def available_from(self, pile_id: str, request: ChargingRequest, after_ts: float, hours: float) -> float:
+        """按快照中的预约时段计算请求在充电桩上最早可以开始的时刻（跳过该车自己的预约），
+        与 ReservationService.available_from 的规则相同"""
+        start_ts = after_ts
+        duration = hours * 3600
+        for begin, end, car_id in self.reservations.get(pile_id, ()):
+            if begin >= start_ts + duration:
+                break
+            if end > start_ts and car_id != request.car_id:
+                start_ts = end
+        return start_ts
+
+
+class EtaService:
+    """预计等待时间服务
+
+    按真实请求电量、充电桩功率、车辆充电曲线和当前会话剩余电量推演每辆排队车辆的开始时间：
+    等候队列按顺序依次分配给最早空闲的同类型充电桩（与调度器叫号规则一致）。
+    结果按模式缓存，队尾入队时增量计算（O(log 桩数)），其他队列或充电桩事件
+    只标记失效，在调度线程下一次 refresh() 时重建。
+
+    调度线程每次节拍/调度周期后调用 refresh() 发布各模式推演结果的只读快照，快照中带有
+    每辆排队车辆的预计时间、排队号索引和各充电桩预约时段的不可变副本。
+    get_eta()、get_eta_by_queue_number() 和 simulate() 只读快照，不访问队列和预约索引、不加锁，
+    可在连接线程中高频调用而不阻塞调度线程；结果反映最近一次 refresh() 时的状态。
+    """
+
+    def __init__(self, pile_repo, queue_repo, charging_service, clock: Optional[Clock] = None):
+        self._pile_repo = pile_repo
+        self._queue_repo = queue_repo
+        self._charging_service = charging_service
+        self._clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+
+        self._etas: Dict[ChargeMode, Dict[str, EtaEstimate]] = {mode: {} for mode in ChargeMode}
+        self._numbers: Dict[ChargeMode, Dict[str, str]] = {mode: {} for mode in ChargeMode}  # 排队号 -> 车辆ID
+        # 推演到队尾后各充电桩的空闲时刻堆: (空闲时间戳, 充电桩ID, 功率)
+        self._heaps: Dict[ChargeMode, List[Tuple[float, str, float]]] = {mode: [] for mode in ChargeMode}
+        self._valid: Dict[ChargeMode, bool] = {mode: False for mode in ChargeMode}
+        self._snapshots: Dict[ChargeMode, PlanSnapshot] = {}
+        self._dirty: Dict[ChargeMode, bool] = {mode: True for mode in ChargeMode}
+
+        self._reservation_service = None
+
+        queue_repo.add_listener(self._on_queue_event)
+        charging_service.add_pile_listener(self._on_pile_changed)
+
+    def attach_reservation_service(self, reservation_service):
+        """推演时避开充电桩上他人的预约时段"""
+        with self._lock:
+            self._reservation_service = reservation_service
+            for mode in ChargeMode:
+                self._valid[mode] = False
+
+    def invalidate(self, mode: Optional[ChargeMode] = None):
+        """使缓存失效，下次查询时重建"""
+        with self._lock:
+            for m in ([mode] if mode else list(ChargeMode)):
+                self._valid[m] = False
+
+    def _on_queue_event(self, event: str, request: ChargingRequest):
+        mode = request.request_mode
+        with self._lock:
+            if event == 'enqueue' and self._valid[mode]:
+                self._append(mode, request, len(self._etas[mode]) + 1)
+            else:
+                self._valid[mode] = False
+
+    def _on_pile_changed(self, pile_id: str):
+        pile = self._pile_repo.get(pile_id)
+        self.invalidate(pile.pile_type if pile else None)
+
+    def refresh(self):
+        """重建已失效的推演，推演或预约时段有变化时发布只读快照（在调度线程中调用）"""
+        with self._lock:
+            for mode in ChargeMode:
+                if not self._valid[mode]:
+                    self._rebuild(mode)
+                reservations = self._reservation_view(mode)
+                previous = self._snapshots.get(mode)
+                if self._dirty[mode] or previous is None or previous.reservations != reservations:
+                    self._snapshots[mode] = PlanSnapshot(
+                        mode, tuple(self._heaps[mode]), len(self._etas[mode]), self._clock.now(), reservations,
+                        MappingProxyType(dict(self._etas[mode])), MappingProxyType(dict(self._numbers[mode])))
+                    self._dirty[mode] = False
+
+    def _reservation_view(self, mode: ChargeMode) -> Mapping[str, Intervals]:
+        """该模式各充电桩当前预约时段的只读副本（调用方持有锁，在调度线程中）"""
+        view = {}
+        if self._reservation_service is not None:
+            for pile in self._pile_repo.get_by_mode(mode):
+                intervals = self._reservation_service.pile_intervals(pile.pile_id)
+                if intervals:
+                    view[pile.pile_id] = intervals
+        return MappingProxyType(view)
+
+    def _available_from(self) -> Optional[AvailableFrom]:
+        """推演时使用的实时预约查询（调度线程），未关联预约服务时为 None"""
+        return self._reservation_service.available_from if self._reservation_service is not None else None
+
+    def get_snapshot(self, mode: ChargeMode) -> Optional[PlanSnapshot]:
+        return self._snapshots.get(mode)
+
+    def simulate(self, request: ChargingRequest) -> Optional[EtaEstimate]:
+        """假设现在提交该请求，预测其排队位置、分配的充电桩和开始/结束时间
+        
+        只读取最近发布的快照（预约时段也取自快照），不访问预约索引，不修改任何队列、
+        充电桩或持久化数据，也不获取锁，可在连接线程中直接调用。
+        快照的堆是不可变元组：堆顶充电桩可直接使用时为 O(1)；堆顶被预约占用时
+        才复制一份再比较（写时复制）。
+        
+        Args:
+            request: 假设的充电请求（不会被保存）
+            
+        Returns:
+            Optional[EtaEstimate]: 预测结果，尚未发布快照或没有可用充电桩时返回None
+        """
+        snapshot = self._snapshots.get(request.request_mode)
+        if snapshot is None or not snapshot.heap:
+            return None
+        now_ts = self._clock.now().timestamp()
+        entry = snapshot.heap[0]
+        start_ts = max(entry[0], now_ts)
+        if snapshot.reservations and snapshot.available_from(
+                entry[1], request, start_ts, request.charge_hours(entry[2])) > start_ts:
+            start_ts, entry = self._select(list(snapshot.heap), request, now_ts, snapshot.available_from)
+        end_ts = start_ts + request.charge_hours(entry[2]) * 3600
+        return EtaEstimate(
+            car_id=request.car_id,
+            queue_number=None,
+            position=snapshot.waiting + 1,
+            pile_id=entry[1],
+            estimated_start=datetime.fromtimestamp(start_ts),
+            estimated_end=datetime.fromtimestamp(end_ts)
+        )
+
+    def get_eta(self, car_id: str, mode: Optional[ChargeMode] = None) -> Optional[EtaEstimate]:
+        """从最近发布的快照查询车辆的预计开始/结束时间（不加锁），车辆不在等候队列时返回 None"""
+        for m in ([mode] if mode else list(ChargeMode)):
+            snapshot = self._snapshots.get(m)
+            estimate = snapshot.etas.get(car_id) if snapshot else None
+            if estimate:
+                return estimate
+        return None
+
+    def get_eta_by_queue_number(self, queue_number: str) -> Optional[EtaEstimate]:
+        """从最近发布的快照按排队号码查询预计时间（不加锁）"""
+        mode = ChargeMode.FAST if queue_number.startswith("F") else ChargeMode.TRICKLE
+        snapshot = self._snapshots.get(mode)
+        if snapshot is None:
+            return None
+        car_id = snapshot.numbers.get(queue_number)
+        return snapshot.etas.get(car_id) if car_id else None
+
+    def get_waiting_hours(self, car_id: str) -> Optional[float]:
+        """查询车辆预计还需等待的时长（小时）"""
+        estimate = self.get_eta(car_id)
+        if not estimate or not estimate.estimated_start:
+            return None
+        return max((estimate.estimated_start - self._clock.now()).total_seconds(), 0.0) / 3600
+
+    def predict_assignment(self, request: ChargingRequest) -> Optional[Tuple[str, float]]:
+        """预测一个新请求排到队尾后将被分配的充电桩及其完成所需总时长
+        
+        直接查看推演堆的堆顶，缓存有效时为 O(1)；充电时长按车辆的充电曲线计算。
+        
+        Args:
+            request: 充电请求（使用其模式、请求电量和电池信息）
+            
+        Returns:
+            Optional[Tuple[str, float]]: (充电桩ID, 等待时间+充电时间（小时）)，没有可用充电桩时返回None
+        """
+        mode = request.request_mode
+        with self._lock:
+            if not self._valid[mode]:
+                self._rebuild(mode)
+            heap = self._heaps[mode]
+            if not heap:
+                return None
+            now_ts = self._clock.now().timestamp()
+            start_ts, entry = self._select(heap, request, now_ts, self._available_from())
+            heapq.heappush(heap, entry)  # 只是预测，不改变推演状态
+            _, pile_id, power = entry
+            return pile_id, (start_ts - now_ts) / 3600 + request.charge_hours(power)
+
+    def _rebuild(self, mode: ChargeMode):
+        """按当前充电桩状态和等候队列重新推演该模式下的全部预计时间"""
+        now = self._clock.now()
+        now_ts = now.timestamp()
+        heap = []
+        piles = self._pile_repo.get_available_piles(mode)
+        # 后续会话按站级功率预算下预计能获得的功率推演
+        powers = self._charging_service.get_expected_powers(piles)
+        for pile in piles:
+            free_ts = now_ts + self._charging_service.get_remaining_hours(pile.pile_id) * 3600
+            heap.append((free_ts, pile.pile_id, powers[pile.pile_id]))
+        heapq.heapify(heap)
+
+        self._heaps[mode] = heap
+        self._etas[mode] = {}
+        self._numbers[mode] = {}
+        # 故障通道中的车辆先于等候区叫号
+        waiting = self._queue_repo.get_fault_lane_status(mode) + self._queue_repo.get_queue_status(mode)
+        for position, request in enumerate(waiting, 1):
+            self._append(mode, request, position)
+        self._valid[mode] = True
+        self._dirty[mode] = True
+
+    @staticmethod
+    def _select(heap: list, request: ChargingRequest, now_ts: float,
+                available_from: Optional[AvailableFrom]) -> Tuple[float, tuple]:
+        """弹出请求实际会使用的充电桩：考虑预约后开始时间最早的那个
+        
+        没有预约时就是堆顶。有预约时，被预约推迟的充电桩先取出比较，直到堆顶的空闲时刻
+        不早于已找到的最早开始时间为止，未被选中的充电桩放回堆中。
+        
+        Args:
+            available_from: 预约查询，推演时为实时预约索引，试算时为快照中的预约时段；None 表示不考虑预约
+        
+        Returns:
+            Tuple[float, tuple]: (开始时间戳, 被选中的堆元素)
+        """
+        if available_from is None:
+            entry = heapq.heappop(heap)
+            return max(entry[0], now_ts), entry
+        best = None
+        popped = []
+        while heap and (best is None or max(heap[0][0], now_ts) < best[0]):
+            entry = heapq.heappop(heap)
+            popped.append(entry)
+            free_ts, pile_id, power = entry
+            start_ts = available_from(pile_id, request, max(free_ts, now_ts), request.charge_hours(power))
+            if best is None or start_ts < best[0]:
+                best = (start_ts, entry)
+        for entry in popped:
+            if entry is not best[1]:
+                heapq.heappush(heap, entry)
+        return best
+
+    def _append(self, mode: ChargeMode, request: ChargingRequest, position: int):
+        heap = self._heaps[mode]
+        self._dirty[mode] = True
+        if request.queue_number:
+            self._numbers[mode][request.queue_number] = request.car_id
+        if not heap:
+            # 没有可用的充电桩，无法估计
+            self._etas[mode][request.car_id] = EtaEstimate(
+                request.car_id, request.queue_number, position, None, None, None)
+            return
+        start_ts, (_, pile_id, power) = self._select(heap, request, self._clock.now().timestamp(),
+                                                     self._available_from())
+        end_ts = start_ts + request.charge_hours(power) * 3600
+        heapq.heappush(heap, (end_ts, pile_id, power))
+        self._etas[mode][request.car_id] = EtaEstimate(
+            car_id=request.car_id,
+            queue_number=request.queue_number,
+            position=position,
+            pile_id=pile_id,
+            estimated_start=datetime.fromtimestamp(start_ts),
+            estimated_end=datetime.fromtimestamp(end_ts)
+        )
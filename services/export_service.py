@@ -0,0 +1,99 @@
+# services/export_service.py
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional, TextIO
+
+from models.bill import Bill
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+BILL_FIELDS = ('bill_id', 'car_id', 'pile_id', 'charge_mode', 'start_time', 'end_time',
+               'charged_kwh', 'charge_fee', 'service_fee', 'total_fee')
+REPORT_FIELDS = ('time_range', 'period', 'pile_id', 'charge_count', 'charge_duration',
+                 'charged_kwh', 'charge_fee', 'service_fee', 'total_fee')
+
+
+def _bill_row(bill: Bill) -> dict:
+    row = bill.to_dict()
+    for field in ('charge_fee', 'service_fee', 'total_fee'):
+        row[field] = f"{row[field]:.2f}"
+    return row
+
+
+class ExportService:
+    """账单和报表的流式导出（CSV / JSONL）
+
+    导出内容由生成器逐块产出文本：账单通过 BillRepository.iter_range 按键顺序分块读取，
+    每块格式化为一段文本后交给调用方写入文件或套接字，写完再取下一块。
+    内存占用只与块大小有关，与账单数量无关，也不会拼出一个完整的响应字符串。
+    """
+
+    def __init__(self, bill_repo, report_service=None, chunk_size: int = 1000):
+        self._bill_repo = bill_repo
+        self._report_service = report_service
+        self._chunk_size = chunk_size
+
+    def _format(self, fmt: str, fields, rows: Iterable[dict]) -> Iterator[str]:
+        """把行逐块格式化为文本（CSV 先产出表头）；格式无效时立即报错，而不是在第一次取块时"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        return self._chunks(fmt, fields, rows)
+
+    def _chunks(self, fmt: str, fields, rows: Iterable[dict]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore', lineterminator='\n') \
+            if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+        count = 0
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, ensure_ascii=False))
+                buffer.write('\n')
+            count += 1
+            if count % self._chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def iter_bills(self, fmt: str = 'csv', start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   pile_id: Optional[str] = None) -> Iterator[str]:
+        """逐块产出结束时间在 [start, end) 内的账单
+
+        Args:
+            fmt: 导出格式 csv / jsonl
+            start: 起始时间（含），None 表示不限
+            end: 结束时间（不含），None 表示不限
+            pile_id: 只导出该充电桩的账单
+
+        Returns:
+            Iterator[str]: 文本块；CSV 的费用为保留两位小数的元，JSONL 每行为完整账单（含以分为单位的费用）
+        """
+        bills = self._bill_repo.iter_range(start, end, self._chunk_size)
+        if pile_id:
+            bills = (bill for bill in bills if bill.pile_id == pile_id)
+        to_row = _bill_row if fmt == 'csv' else Bill.to_dict
+        return self._format(fmt, BILL_FIELDS, (to_row(bill) for bill in bills))
+
+    def iter_report(self, fmt: str = 'csv', time_range: str = 'day', start: Optional[date] = None,
+                    end: Optional[date] = None, pile_id: Optional[str] = None) -> Iterator[str]:
+        """逐块产出各充电桩的日/周/月报表（参数同 ReportService.get_report）"""
+        if self._report_service is None:
+            raise ValueError("未配置报表服务")
+        rows = self._report_service.get_report(time_range, start, end, pile_id)
+        return self._format(fmt, REPORT_FIELDS, rows)
+
+    @staticmethod
+    def write(chunks: Iterable[str], out: TextIO) -> int:
+        """把文本块依次写入 out，返回写入的字符数"""
+        written = 0
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+        return written
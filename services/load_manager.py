@@ -0,0 +1,104 @@
+# services/load_manager.py
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+@dataclass
+class PowerDemand:
+    """一个活跃会话的功率需求"""
+    pile_id: str
+    rated_kw: float                       # 充电桩额定功率（分配上限）
+    remaining_kwh: float                  # 仍需充入的电量
+    priority: int = 0                     # 数值越大越优先
+    deadline: Optional[datetime] = None   # 期望完成时间
+
+
+class LoadManager:
+    """站级功率预算分配
+
+    充电站并网容量小于各充电桩额定功率之和时，把 budget_kw 分配给正在充电的会话，
+    每个会话的分配功率不超过其充电桩额定功率。支持三种策略：
+      - fair:     最大最小公平（注水法），先满足需求小的会话，剩余功率平均分给其他会话
+      - priority: 按优先级从高到低依次分配额定功率，同优先级内公平分配
+      - deadline: 按截止时间从早到晚先分配按时完成所需的最低功率，剩余功率再公平分配
+    budget_kw 为 None 时不限制，所有会话按额定功率充电。
+    """
+
+    STRATEGIES = ('fair', 'priority', 'deadline')
+
+    def __init__(self, budget_kw: Optional[float] = None, strategy: str = 'fair'):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未知的功率分配策略: {strategy}")
+        if budget_kw is not None and budget_kw <= 0:
+            raise ValueError("站级功率预算必须大于0")
+        self.budget_kw = budget_kw
+        self.strategy = strategy
+
+    def allocate(self, demands: List[PowerDemand], now: datetime) -> Dict[str, float]:
+        """计算每个会话的分配功率
+
+        Args:
+            demands: 当前所有活跃会话的功率需求
+            now: 当前时间（deadline 策略使用）
+
+        Returns:
+            Dict[str, float]: 充电桩ID -> 分配功率（千瓦）
+        """
+        if self.budget_kw is None or sum(d.rated_kw for d in demands) <= self.budget_kw:
+            return {d.pile_id: d.rated_kw for d in demands}
+        if self.strategy == 'priority':
+            return self._allocate_priority(demands)
+        if self.strategy == 'deadline':
+            return self._allocate_deadline(demands, now)
+        return self._water_fill(demands, self.budget_kw)
+
+    def estimate_power(self, rated_kw: float, active_rated: List[float]) -> float:
+        """估算一个新会话在当前负载下可获得的功率（公平分配近似），用于预计等待时间"""
+        if self.budget_kw is None:
+            return rated_kw
+        demands = [PowerDemand(str(i), kw, 0.0) for i, kw in enumerate(active_rated)]
+        demands.append(PowerDemand('new', rated_kw, 0.0))
+        if sum(d.rated_kw for d in demands) <= self.budget_kw:
+            return rated_kw
+        return self._water_fill(demands, self.budget_kw)['new']
+
+    @staticmethod
+    def _water_fill(demands: List[PowerDemand], budget: float,
+                    caps: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """最大最小公平分配：按上限从小到大依次满足，O(n log n)"""
+        caps = caps or {d.pile_id: d.rated_kw for d in demands}
+        allocation = {d.pile_id: 0.0 for d in demands}
+        pending = sorted(demands, key=lambda d: caps[d.pile_id])
+        remaining = max(budget, 0.0)
+        for i, demand in enumerate(pending):
+            share = remaining / (len(pending) - i)
+            power = min(caps[demand.pile_id], share)
+            allocation[demand.pile_id] = power
+            remaining -= power
+        return allocation
+
+    def _allocate_priority(self, demands: List[PowerDemand]) -> Dict[str, float]:
+        allocation = {}
+        remaining = self.budget_kw
+        for priority in sorted({d.priority for d in demands}, reverse=True):
+            group = [d for d in demands if d.priority == priority]
+            shares = self._water_fill(group, remaining)
+            allocation.update(shares)
+            remaining -= sum(shares.values())
+        return allocation
+
+    def _allocate_deadline(self, demands: List[PowerDemand], now: datetime) -> Dict[str, float]:
+        allocation = {d.pile_id: 0.0 for d in demands}
+        remaining = self.budget_kw
+        # 先按截止时间顺序满足按时完成所需的最低功率
+        for demand in sorted((d for d in demands if d.deadline), key=lambda d: d.deadline):
+            hours_left = (demand.deadline - now).total_seconds() / 3600
+            needed = demand.rated_kw if hours_left <= 0 else min(demand.remaining_kwh / hours_left, demand.rated_kw)
+            power = min(needed, remaining)
+            allocation[demand.pile_id] = power
+            remaining -= power
+        # 剩余功率在所有会话间公平分配（不超过各自剩余的额定功率）
+        headroom = {d.pile_id: d.rated_kw - allocation[d.pile_id] for d in demands}
+        extra = self._water_fill(demands, remaining, headroom)
+        return {pile_id: allocation[pile_id] + extra[pile_id] for pile_id in allocation}
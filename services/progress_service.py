@@ -0,0 +1,267 @@
+# services/progress_service.py
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时退化为逐桩循环
+    np = None
+
+from services.tariff import TariffCalendar, wall_microseconds
+
+
+@dataclass
+class CompletionEvent:
+    """充电完成事件：会话已充满请求的电量"""
+    pile_id: str
+    car_id: str
+    session_id: str
+    charged_kwh: float
+    completed_at: datetime
+
+
+@dataclass
+class LiveCost:
+    """进行中会话截至上次结算的充电量和费用"""
+    pile_id: str
+    car_id: str
+    session_id: str
+    charged_kwh: float
+    charge_fee: float
+    service_fee: float
+    as_of: datetime
+
+    @property
+    def total_fee(self) -> float:
+        return self.charge_fee + self.service_fee
+
+    def to_dict(self) -> dict:
+        return {
+            'pile_id': self.pile_id,
+            'car_id': self.car_id,
+            'session_id': self.session_id,
+            'charged_kwh': round(self.charged_kwh, 3),
+            'charge_fee': round(self.charge_fee, 2),
+            'service_fee': round(self.service_fee, 2),
+            'total_fee': round(self.total_fee, 2),
+            'as_of': self.as_of.isoformat()
+        }
+
+
+class ChargingProgressEngine:
+    """充电进度引擎
+
+    每个充电桩占用一个固定槽位，功率、开始时间、请求电量、已充电量、上次结算时间
+    分别保存在按槽位对齐的数组中。tick() 在一次向量化运算中推进所有活跃会话，
+    无需逐桩的 Python 循环，可扩展到数千个充电桩。
+    已充电量按 “功率 × 时间” 累加，因此会话中途调整功率（负载管理）也能准确结算。
+    关联电价后，每次结算同时把新充入的电量按这段时间的分时电价计入电费累加器，
+    查询进行中会话的实时费用只需读取数组，无需重新积分。
+    """
+
+    def __init__(self, capacity: int = 16):
+        self._slots: Dict[str, int] = {}
+        self._car_slots: Dict[str, int] = {}
+        self._tariff: Optional[Callable[[], TariffCalendar]] = None
+        self._pile_ids: List[str] = []
+        self._car_ids: List[Optional[str]] = []
+        self._session_ids: List[Optional[str]] = []
+        self._capacity = 0
+        self._size = 0
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity: int):
+        """按新容量重新分配数组，保留已有数据"""
+        def grow(old, typecode, fill):
+            if np is not None:
+                dtype = bool if typecode == '?' else np.float64
+                new = np.full(capacity, fill, dtype=dtype)
+                if old is not None:
+                    new[:len(old)] = old
+                return new
+            code = 'b' if typecode == '?' else 'd'
+            new = array(code, [fill] * capacity)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+
+        self._power = grow(getattr(self, '_power', None), 'd', 0.0)
+        self._start = grow(getattr(self, '_start', None), 'd', 0.0)
+        self._requested = grow(getattr(self, '_requested', None), 'd', 0.0)
+        self._charged = grow(getattr(self, '_charged', None), 'd', 0.0)
+        self._last = grow(getattr(self, '_last', None), 'd', 0.0)
+        self._charge_fee = grow(getattr(self, '_charge_fee', None), 'd', 0.0)
+        self._service_rate = grow(getattr(self, '_service_rate', None), 'd', 0.0)
+        self._active = grow(getattr(self, '_active', None), '?', False)
+        self._notified = grow(getattr(self, '_notified', None), '?', False)
+        self._capacity = capacity
+
+    def _slot(self, pile_id: str) -> int:
+        """获取充电桩槽位，不存在时分配新槽位"""
+        slot = self._slots.get(pile_id)
+        if slot is None:
+            if self._size == self._capacity:
+                self._allocate(self._capacity * 2)
+            slot = self._size
+            self._size += 1
+            self._slots[pile_id] = slot
+            self._pile_ids.append(pile_id)
+            self._car_ids.append(None)
+            self._session_ids.append(None)
+        return slot
+
+    def attach_tariff(self, tariff: Callable[[], TariffCalendar]):
+        """关联电价，tariff 返回当前生效的电价日历（电价重新加载后下一次结算即按新电价计）"""
+        self._tariff = tariff
+
+    def start(self, pile_id: str, car_id: str, session_id: str, power_kw: float,
+              requested_kwh: float, start_time: datetime):
+        """登记一个开始充电的会话"""
+        slot = self._slot(pile_id)
+        ts = start_time.timestamp()
+        self._charge_fee[slot] = 0.0
+        self._service_rate[slot] = self._tariff().table_for(start_time).service_rate if self._tariff else 0.0
+        self._car_slots[car_id] = slot
+        self._power[slot] = power_kw
+        self._start[slot] = ts
+        self._last[slot] = ts
+        self._requested[slot] = requested_kwh
+        self._charged[slot] = 0.0
+        self._active[slot] = True
+        self._notified[slot] = False
+        self._car_ids[slot] = car_id
+        self._session_ids[slot] = session_id
+
+    def stop(self, pile_id: str, now: datetime) -> float:
+        """结束会话，先结算到当前时间，返回实际充电量（度）"""
+        slot = self._slots.get(pile_id)
+        if slot is None or not self._active[slot]:
+            return 0.0
+        self._accrue_slot(slot, now.timestamp())
+        charged = float(self._charged[slot])
+        self._active[slot] = False
+        self._power[slot] = 0.0
+        if self._car_slots.get(self._car_ids[slot]) == slot:
+            del self._car_slots[self._car_ids[slot]]
+        self._car_ids[slot] = None
+        self._session_ids[slot] = None
+        return charged
+
+    def set_power(self, pile_id: str, power_kw: float, now: datetime):
+        """调整会话功率，调整前的电量按旧功率结算"""
+        slot = self._slots.get(pile_id)
+        if slot is None or not self._active[slot]:
+            return
+        self._accrue_slot(slot, now.timestamp())
+        self._power[slot] = power_kw
+
+    def _accrue_slot(self, slot: int, ts: float):
+        dt = max(ts - self._last[slot], 0.0)
+        charged = min(self._charged[slot] + self._power[slot] * dt / 3600, self._requested[slot])
+        if self._tariff is not None and charged > self._charged[slot]:
+            # 新充入的电量在 [上次结算, ts) 内均匀分布，按这段时间的平均电价计费
+            rate_hours = self._tariff().integral(datetime.fromtimestamp(self._last[slot]), datetime.fromtimestamp(ts))
+            self._charge_fee[slot] += (charged - self._charged[slot]) * rate_hours / (dt / 3600)
+        self._charged[slot] = charged
+        self._last[slot] = max(ts, self._last[slot])
+
+    def tick(self, now: datetime) -> List[CompletionEvent]:
+        """推进所有活跃会话到当前时间
+
+        Returns:
+            List[CompletionEvent]: 本次新达到请求电量的会话（每个会话只报告一次）
+        """
+        ts = now.timestamp()
+        n = self._size
+        if np is not None:
+            active = self._active[:n]
+            dt = np.maximum(ts - self._last[:n], 0.0)
+            accrued = np.minimum(self._charged[:n] + self._power[:n] * dt / 3600, self._requested[:n])
+            if self._tariff is not None:
+                self._accrue_fees(now, ts, np.where(active, accrued - self._charged[:n], 0.0), dt)
+            self._charged[:n] = np.where(active, accrued, self._charged[:n])
+            self._last[:n] = np.where(active, np.maximum(ts, self._last[:n]), self._last[:n])
+            done = active & ~self._notified[:n] & (self._charged[:n] >= self._requested[:n] - 1e-9)
+            done_slots = np.flatnonzero(done).tolist()
+        else:
+            done_slots = []
+            for slot in range(n):
+                if not self._active[slot]:
+                    continue
+                self._accrue_slot(slot, ts)
+                if not self._notified[slot] and self._charged[slot] >= self._requested[slot] - 1e-9:
+                    done_slots.append(slot)
+
+        events = []
+        for slot in done_slots:
+            self._notified[slot] = True
+            events.append(CompletionEvent(
+                pile_id=self._pile_ids[slot],
+                car_id=self._car_ids[slot],
+                session_id=self._session_ids[slot],
+                charged_kwh=float(self._charged[slot]),
+                completed_at=now
+            ))
+        return events
+
+    def _accrue_fees(self, now: datetime, ts: float, added_kwh, dt):
+        """把本次 tick 新充入的电量按各自结算区间的分时电价一次性计入电费"""
+        slots = np.flatnonzero(added_kwh > 0)
+        if not slots.size:
+            return
+        # 时间戳换算为与 now 相同的本地墙上时间（整数微秒）
+        end_us = int(wall_microseconds([now])[0])
+        start_us = np.round(self._last[slots] * 1e6).astype(np.int64) + (end_us - round(ts * 1e6))
+        rate_hours = self._tariff().bulk_integral(start_us, np.full(slots.size, end_us, dtype=np.int64))
+        self._charge_fee[slots] += added_kwh[slots] * rate_hours / (dt[slots] / 3600)
+
+    def live_cost(self, car_id: str) -> Optional[LiveCost]:
+        """车辆进行中会话截至上次结算的充电量和费用，O(1)；没有进行中的会话时返回 None"""
+        slot = self._car_slots.get(car_id)
+        if slot is None or not self._active[slot]:
+            return None
+        charged = float(self._charged[slot])
+        live = LiveCost(
+            pile_id=self._pile_ids[slot],
+            car_id=car_id,
+            session_id=self._session_ids[slot],
+            charged_kwh=charged,
+            charge_fee=float(self._charge_fee[slot]),
+            service_fee=charged * float(self._service_rate[slot]),
+            as_of=datetime.fromtimestamp(float(self._last[slot]))
+        )
+        # 读取期间会话可能已在调度线程中结束
+        return live if self._car_ids[slot] == car_id else None
+
+    def charged_kwh(self, pile_id: str) -> float:
+        """获取充电桩当前会话截至上次 tick 的充电量"""
+        slot = self._slots.get(pile_id)
+        if slot is None or not self._active[slot]:
+            return 0.0
+        return float(self._charged[slot])
+
+    def remaining_kwh(self, pile_id: str, now: datetime) -> float:
+        """估算充电桩当前会话到 now 时刻仍需充入的电量（度），不修改进度"""
+        slot = self._slots.get(pile_id)
+        if slot is None or not self._active[slot]:
+            return 0.0
+        dt = max(now.timestamp() - self._last[slot], 0.0)
+        charged = min(self._charged[slot] + self._power[slot] * dt / 3600, self._requested[slot])
+        return float(self._requested[slot] - charged)
+
+    def power_kw(self, pile_id: str) -> float:
+        """获取充电桩当前会话的功率"""
+        slot = self._slots.get(pile_id)
+        if slot is None or not self._active[slot]:
+            return 0.0
+        return float(self._power[slot])
+
+    def active_pile_ids(self) -> List[str]:
+        """获取所有正在充电的充电桩ID"""
+        return [pile_id for pile_id, slot in self._slots.items() if self._active[slot]]
+
+    def is_active(self, pile_id: str) -> bool:
+        slot = self._slots.get(pile_id)
+        return slot is not None and bool(self._active[slot])
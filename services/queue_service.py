@@ -2,21 +2,28 @@ from typing import Optional, List, Dict
 from datetime import datetime
 from models.car import ChargingRequest
 from utils.enums import ChargeMode
+from utils.clock import Clock, SYSTEM_CLOCK
 
 class QueueService:
-    def __init__(self, queue_repo):
+    def __init__(self, queue_repo, clock: Optional[Clock] = None):
         self.queue_repo = queue_repo
+        self._clock = clock or SYSTEM_CLOCK
+        self._eta_service = None
         # 初始化排队号码计数器
         self._queue_counters = {
             ChargeMode.FAST: 0,
             ChargeMode.TRICKLE: 0
         }
         # 初始化日期记录
-        self._last_date = datetime.now().date()
+        self._last_date = self._clock.now().date()
+    
+    def attach_eta_service(self, eta_service):
+        """使用 EtaService 提供基于真实电量和功率的等待时间估计"""
+        self._eta_service = eta_service
     
     def _reset_counters_if_new_day(self):
         """如果是新的一天，重置计数器"""
-        current_date = datetime.now().date()
+        current_date = self._clock.now().date()
         if current_date != self._last_date:
             self._queue_counters = {
                 ChargeMode.FAST: 0,
@@ -70,39 +77,33 @@ class QueueService:
         Returns:
             Optional[int]: 队列位置（从1开始），如果未找到返回None
         """
-        # 确定充电模式
-        mode = ChargeMode.FAST if queue_number.startswith("F") else ChargeMode.TRICKLE
-        
-        # 获取队列
-        queue = self.queue_repo.get_queue_status(mode)
-        
-        # 查找位置
-        for i, request in enumerate(queue, 1):
-            if request.queue_number == queue_number:
-                return i
+        car_id = self.queue_repo.find_car_id_by_queue_number(queue_number)
+        if car_id is None:
+            return None
+        return self.queue_repo.get_position(car_id)
+    
+    def get_cars_ahead(self, car_id: str) -> Optional[int]:
+        """获取排在该车辆前面的车辆数
         
-        return None
+        Args:
+            car_id: 车辆ID
+            
+        Returns:
+            Optional[int]: 前车数量，车辆不在等候队列时返回None
+        """
+        position = self.queue_repo.get_position(car_id)
+        return position - 1 if position is not None else None
     
-    def get_queue_status(self, mode: ChargeMode) -> List[Dict]:
+    def get_queue_status(self, mode: ChargeMode) -> List[ChargingRequest]:
         """获取队列状态
         
         Args:
             mode: 充电模式
             
         Returns:
-            List[Dict]: 队列状态信息列表
+            List[ChargingRequest]: 按排队顺序排列的请求列表
         """
-        queue = self.queue_repo.get_queue_status(mode)
-        return [
-            {
-                "queue_number": request.queue_number,
-                "car_id": request.car_id,
-                "amount": request.amount,
-                "status": request.status,
-                "create_time": request.create_time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            for request in queue
-        ]
+        return self.queue_repo.get_queue_status(mode)
     
     def remove_from_queue(self, queue_number: str) -> bool:
         """从队列中移除请求
@@ -113,19 +114,10 @@ class QueueService:
         Returns:
             bool: 是否成功移除
         """
-        # 确定充电模式
-        mode = ChargeMode.FAST if queue_number.startswith("F") else ChargeMode.TRICKLE
-        
-        # 获取队列
-        queue = self.queue_repo.get_queue_status(mode)
-        
-        # 查找并移除请求
-        for request in queue:
-            if request.queue_number == queue_number:
-                self.queue_repo.remove_from_queue(request)
-                return True
-        
-        return False
+        car_id = self.queue_repo.find_car_id_by_queue_number(queue_number)
+        if car_id is None:
+            return False
+        return self.queue_repo.remove_by_car_id(car_id) is not None
     
     def get_queue_length(self, mode: ChargeMode) -> int:
         """获取队列长度
@@ -136,7 +128,7 @@ class QueueService:
         Returns:
             int: 队列长度
         """
-        return len(self.queue_repo.get_queue_status(mode))
+        return self.queue_repo.get_queue_length(mode)
     
     def get_estimated_waiting_time(self, queue_number: str) -> Optional[float]:
         """获取预计等待时间
@@ -147,21 +139,16 @@ class QueueService:
         Returns:
             Optional[float]: 预计等待时间（小时），如果未找到返回None
         """
-        # 确定充电模式
-        mode = ChargeMode.FAST if queue_number.startswith("F") else ChargeMode.TRICKLE
-        
-        # 获取队列
-        queue = self.queue_repo.get_queue_status(mode)
+        if self._eta_service is not None:
+            estimate = self._eta_service.get_eta_by_queue_number(queue_number)
+            if estimate is None or estimate.estimated_start is None:
+                return None
+            return max((estimate.estimated_start - self._clock.now()).total_seconds(), 0.0) / 3600
         
         # 查找请求位置
         position = self.get_queue_position(queue_number)
         if position is None:
             return None
         
-        # 计算前面所有请求的充电时间
-        waiting_time = 0.0
-        for request in queue[:position-1]:
-            # 假设每个请求平均充电时间为30分钟
-            waiting_time += 0.5
-        
-        return waiting_time 
\ No newline at end of file
+        # 假设每个请求平均充电时间为30分钟
+        return (position - 1) * 0.5
\ No newline at end of file
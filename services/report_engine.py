@@ -0,0 +1,96 @@
+# services/report_engine.py
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from repositories.bill_columns import check_group_by, merge_totals, partition_totals
+
+
+class ReportEngine:
+    """即席账单报表引擎
+
+    在列式账单存储上按任意维度分组汇总。配置了多个工作进程且行数足够多时，
+    把账单按行号（即结算时间）切成与进程数相同的分区，交给 ProcessPoolExecutor：
+    每个工作进程只读取本分区的列文件并算出部分汇总，父进程合并各分区的结果。
+    计算不占用服务器的请求线程和 GIL，大时间窗口的报表随 CPU 核数扩展。
+
+    workers 为 0 或 1、列存储未持久化、进程池无法创建或异常退出时，在本进程内串行计算，
+    结果相同（各分区电量的累加顺序不同，浮点和可能相差最后几位）。
+
+    服务器启动时调用 start() 创建进程池并预热工作进程（spawn 启动并导入 numpy 需要数百毫秒），
+    不让第一个报表请求承担这部分开销；未调用 start() 时在第一次并行计算时创建。
+    """
+
+    # 少于该行数时直接串行计算（python -m benchmarks.report_engine）：分区并行读取列文件、传回结果的
+    # 总 CPU 开销约为串行的 2.1 倍，至少 3 个核才可能更快；100 万行时串行按天分组只需约 34 ms，
+    # 更少的行数即使多核并行也省不下几毫秒。部署机器核数较多时可用该基准重新测定
+    MIN_PARALLEL_ROWS = 1_000_000
+
+    def __init__(self, bill_columns, workers: int = 0):
+        self._columns = bill_columns
+        self._workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def start(self):
+        """创建进程池，并让每个工作进程先执行一次空的分区汇总，提前完成启动和导入（不等待完成）"""
+        pool = self._pool()
+        plan = self._columns.partitions(1) if pool else None
+        if plan is None:
+            return
+        for _ in range(self._workers):
+            pool.submit(partition_totals, plan[0], 0, 0, ('pile',))
+        print(f"[ReportEngine] Started {self._workers} report worker processes")
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        with self._executor_lock:
+            if self._executor is None and self._workers > 1:
+                try:
+                    # 服务器是多线程进程，用 spawn 启动工作进程，避免 fork 时复制其他线程持有的锁
+                    self._executor = ProcessPoolExecutor(self._workers, mp_context=multiprocessing.get_context('spawn'))
+                except (OSError, NotImplementedError) as e:
+                    print(f"[ReportEngine] Cannot start worker processes, computing reports serially: {e}")
+                    self._workers = 0
+            return self._executor
+
+    def _parallel_totals(self, by: Tuple[str, ...], filters) -> Optional[Dict[Tuple[int, ...], list]]:
+        pool = self._pool()
+        plan = self._columns.partitions(self._workers, filters[0], filters[1]) if pool else None
+        if plan is None:
+            return None
+        directory, partitions = plan
+        try:
+            futures = [pool.submit(partition_totals, directory, lo, hi, by, *filters) for lo, hi in partitions]
+            return merge_totals(future.result() for future in futures)
+        except BrokenProcessPool as e:
+            print(f"[ReportEngine] Worker pool broken, falling back to serial computation: {e}")
+            self.close()
+            return None
+
+    def group_totals(self, by='pile', start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     pile_id: Optional[str] = None, parallel: Optional[bool] = None) -> List[dict]:
+        """按一个或多个维度分组汇总账单（参数和结果同 BillColumnStore.group_totals）
+
+        Args:
+            parallel: True 总是分区并行，False 总是串行，None 时按行数决定
+        """
+        by = check_group_by(by)
+        filters = self._columns.filters(start, end, pile_id)
+        if filters is None:
+            return []
+        totals = None
+        if parallel is not False and self._workers > 1 and (parallel or len(self._columns) >= self.MIN_PARALLEL_ROWS):
+            totals = self._parallel_totals(by, filters)
+        if totals is None:
+            totals = self._columns.aggregate(by, *filters)
+        return self._columns.format_totals(by, totals)
+
+    def close(self):
+        """关闭工作进程池"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,256 @@
+# services/report_service.py
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.bill import Bill
+from utils.money import to_yuan
+
+TIME_RANGES = ('day', 'week', 'month')
+# 日报和周报只保留最近的时段（天数），月报全部保留
+RETENTION_DAYS = {'day': 400, 'week': 5 * 366}
+
+
+def bucket_start(moment: datetime, time_range: str) -> date:
+    """时间所在的报表时段的第一天：当天 / 所在周的周一 / 所在月的1日"""
+    day = moment.date()
+    if time_range == 'day':
+        return day
+    if time_range == 'week':
+        return day - timedelta(days=day.weekday())
+    if time_range == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"无效的报表时间范围: {time_range}")
+
+
+@dataclass
+class PileTotals:
+    """一个充电桩在一个报表时段内的累计值
+
+    全部用整数保存（时长为毫秒，电量为瓦时，费用为分），账单插入、改价和删除时
+    增减都是精确的，增量维护的结果与从历史账单重建的结果完全一致。
+    """
+    charge_count: int = 0
+    duration_ms: int = 0
+    energy_wh: int = 0
+    charge_fee_cents: int = 0
+    service_fee_cents: int = 0
+
+    def add(self, bill: Bill, sign: int = 1):
+        self.charge_count += sign
+        self.duration_ms += sign * round((bill.end_time - bill.start_time).total_seconds() * 1000)
+        self.energy_wh += sign * round(bill.charged_kwh * 1000)
+        self.charge_fee_cents += sign * bill.charge_fee_cents
+        self.service_fee_cents += sign * bill.service_fee_cents
+
+    def to_list(self) -> List[int]:
+        return [self.charge_count, self.duration_ms, self.energy_wh,
+                self.charge_fee_cents, self.service_fee_cents]
+
+    def to_dict(self) -> dict:
+        total_fee_cents = self.charge_fee_cents + self.service_fee_cents
+        return {
+            'charge_count': self.charge_count,
+            'charge_duration': round(self.duration_ms / 3_600_000, 2),  # 小时
+            'charged_kwh': round(self.energy_wh / 1000, 2),
+            'charge_fee': to_yuan(self.charge_fee_cents),
+            'service_fee': to_yuan(self.service_fee_cents),
+            'total_fee': to_yuan(total_fee_cents),
+            'charge_fee_cents': self.charge_fee_cents,
+            'service_fee_cents': self.service_fee_cents,
+            'total_fee_cents': total_fee_cents
+        }
+
+
+class ReportService:
+    """充电桩日/周/月报表
+
+    对每种时间范围维护一张汇总表：时段第一天 -> 充电桩ID -> PileTotals。账单按结束时间
+    归入时段，账单仓库每次插入、改写或删除账单时增量更新汇总表，因此查询只遍历
+    汇总表中的时段（O(时段数 × 充电桩数)），从不扫描账单。
+
+    日报只保留最近 400 天、周报只保留最近 5 年的时段（RETENTION_DAYS），月报全部保留，
+    汇总表的大小不随运行时长无限增长。
+
+    汇总表持久化在 data/report_rollups.json：账单变更只把汇总表标记为已修改，由调度线程定期调用
+    checkpoint_if_due() 写文件，服务器停止时再调用 checkpoint() 写一次。加载时用月报汇总的
+    账单数和总费用核对账单仓库（账单可能被其他进程改写），文件不存在（首次启动或升级）、
+    与账单不一致或 load=False 时从账单仓库重建，也可以用 run_tools.py rebuild-reports 手动重建。
+    """
+
+    # 有未保存的修改且距上次保存超过该秒数时写文件
+    CHECKPOINT_INTERVAL = 60.0
+
+    def __init__(self, bill_repo, persist: bool = True, load: bool = True,
+                 file_path: str = 'data/report_rollups.json'):
+        self._bill_repo = bill_repo
+        self._persist = persist
+        self._file_path = file_path
+        self._lock = threading.Lock()
+        self._rollups: Dict[str, Dict[date, Dict[str, PileTotals]]] = {r: {} for r in TIME_RANGES}
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+
+        if load and self._persist and os.path.exists(self._file_path):
+            self._load()
+        else:
+            self.rebuild()
+
+        bill_repo.add_listener(self._on_bills_changed)
+
+    def _load(self):
+        try:
+            with open(self._file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for time_range in TIME_RANGES:
+                self._rollups[time_range] = {
+                    date.fromisoformat(period): {pile_id: PileTotals(*values) for pile_id, values in piles.items()}
+                    for period, piles in data.get(time_range, {}).items()
+                }
+        except Exception as e:
+            print(f"[ReportService] 加载报表汇总失败，从账单重建: {str(e)}")
+            self.rebuild()
+            return
+        if not self._matches():
+            print("[ReportService] 报表汇总与账单不一致，从账单重建")
+            self.rebuild()
+
+    def _matches(self) -> bool:
+        """月报汇总（全部保留）的账单数和总费用是否与账单仓库一致"""
+        count = cents = 0
+        for piles in self._rollups['month'].values():
+            for totals in piles.values():
+                count += totals.charge_count
+                cents += totals.charge_fee_cents + totals.service_fee_cents
+        if count != len(self._bill_repo.data):
+            return False
+        return cents == sum(bill.total_fee_cents for bill in self._bill_repo.get_all())
+
+    def checkpoint(self):
+        """把汇总表写入文件（在锁内取出数据，锁外写文件）"""
+        if not self._persist:
+            return
+        with self._lock:
+            data = {
+                time_range: {
+                    period.isoformat(): {pile_id: totals.to_list() for pile_id, totals in piles.items()}
+                    for period, piles in rollup.items()
+                }
+                for time_range, rollup in self._rollups.items()
+            }
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+        temp_file = f"{self._file_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_file, self._file_path)
+        except Exception as e:
+            print(f"[ReportService] 保存报表汇总失败: {str(e)}")
+            self._dirty = True
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def checkpoint_if_due(self) -> bool:
+        """有未保存的修改且距上次保存超过 CHECKPOINT_INTERVAL 秒时写文件
+
+        Returns:
+            bool: 是否写了文件
+        """
+        if not self._persist or not self._dirty or time.monotonic() - self._last_checkpoint < self.CHECKPOINT_INTERVAL:
+            return False
+        self.checkpoint()
+        return True
+
+    def _apply(self, bill: Bill, sign: int):
+        for time_range, rollup in self._rollups.items():
+            period = bucket_start(bill.end_time, time_range)
+            piles = rollup.get(period)
+            if piles is None:
+                if sign < 0:
+                    continue  # 已过保留期而被删除的时段
+                retention = RETENTION_DAYS.get(time_range)
+                if retention is not None and rollup:
+                    cutoff = max(max(rollup), period) - timedelta(days=retention)
+                    if period < cutoff:
+                        continue  # 已过保留期的时段
+                    for old_period in [p for p in rollup if p < cutoff]:
+                        del rollup[old_period]
+                piles = rollup[period] = {}
+            totals = piles.get(bill.pile_id)
+            if totals is None:
+                totals = piles[bill.pile_id] = PileTotals()
+            totals.add(bill, sign)
+            if totals.charge_count == 0:
+                del piles[bill.pile_id]
+                if not piles:
+                    del rollup[period]
+
+    def _on_bills_changed(self, changes: List[Tuple[Optional[Bill], Optional[Bill]]]):
+        with self._lock:
+            for previous, current in changes:
+                if previous is not None:
+                    self._apply(previous, -1)
+                if current is not None:
+                    self._apply(current, 1)
+            self._dirty = True
+
+    def rebuild(self, bills: Optional[Iterable[Bill]] = None) -> int:
+        """从历史账单重建汇总表
+
+        Args:
+            bills: 用于重建的账单，默认为账单仓库中的全部账单
+
+        Returns:
+            int: 参与汇总的账单数
+        """
+        if bills is None:
+            bills = self._bill_repo.get_all()
+        with self._lock:
+            self._rollups = {r: {} for r in TIME_RANGES}
+            count = 0
+            for bill in bills:
+                self._apply(bill, 1)
+                count += 1
+        self.checkpoint()
+        print(f"[ReportService] Rebuilt report rollups from {count} bills")
+        return count
+
+    def get_report(self, time_range: str = 'day', start: Optional[date] = None, end: Optional[date] = None,
+                   pile_id: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """查询各充电桩的日/周/月报表
+
+        Args:
+            time_range: 时间范围 day / week / month
+            start: 只返回第一天不早于该日期的时段
+            end: 只返回第一天早于该日期的时段
+            pile_id: 只返回该充电桩
+            limit: 只返回最近的若干个时段
+
+        Returns:
+            List[dict]: 每个时段每个充电桩一行，按时段从新到旧、充电桩编号排序
+        """
+        if time_range not in self._rollups:
+            raise ValueError(f"无效的报表时间范围: {time_range}")
+        with self._lock:
+            rollup = self._rollups[time_range]
+            periods = sorted((period for period in rollup
+                              if (start is None or period >= start) and (end is None or period < end)),
+                             reverse=True)
+            if limit is not None:
+                periods = periods[:limit]
+            rows = []
+            for period in periods:
+                piles = rollup[period]
+                for pid in sorted(piles):
+                    if pile_id and pid != pile_id:
+                        continue
+                    row = {'time_range': time_range, 'period': period.isoformat(), 'pile_id': pid}
+                    row.update(piles[pid].to_dict())
+                    rows.append(row)
+        return rows
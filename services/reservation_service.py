@@ -0,0 +1,159 @@
+# services/reservation_service.py
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from models.car import ChargingRequest
+from models.reservation import Reservation
+from repositories.repositories import PileRepository, ReservationRepository
+from utils.clock import Clock, SYSTEM_CLOCK
+from utils.enums import ChargeMode, WorkState
+from utils.ids import new_ulid
+
+
+class ReservationService:
+    """充电桩时段预约
+
+    车主可以为某个充电桩（或某种模式下任意一个充电桩）预约未来的一个时段。
+    预约开始前，调度器不会把会与预约时段重叠的排队车辆分配到该充电桩；
+    预约时段内预约车辆提交的请求优先在该充电桩上开始充电。
+    """
+
+    MAX_ADVANCE = timedelta(days=7)      # 最多提前预约的时长
+    MAX_DURATION = timedelta(hours=12)   # 单次预约的最长时段
+
+    def __init__(self, reservation_repo: ReservationRepository, pile_repo: PileRepository,
+                 clock: Optional[Clock] = None):
+        self._reservation_repo = reservation_repo
+        self._pile_repo = pile_repo
+        self._clock = clock or SYSTEM_CLOCK
+
+    def reserve(self, car_id: str, start_time: datetime, duration: timedelta,
+                pile_id: Optional[str] = None, mode: Optional[ChargeMode] = None) -> Reservation:
+        """预约充电时段
+
+        Args:
+            car_id: 车辆ID
+            start_time: 预约开始时间
+            duration: 预约时长
+            pile_id: 指定充电桩（不能是故障充电桩）；为None时在 mode 模式的充电桩中选择该时段空闲的一个
+            mode: 充电模式（未指定充电桩时必填；同时指定充电桩时须与其类型一致）
+
+        Returns:
+            Reservation: 创建的预约
+        """
+        now = self._clock.now()
+        if start_time < now:
+            raise ValueError("预约开始时间不能早于当前时间")
+        if start_time > now + self.MAX_ADVANCE:
+            raise ValueError(f"最多只能提前 {self.MAX_ADVANCE.days} 天预约")
+        if duration <= timedelta(0) or duration > self.MAX_DURATION:
+            raise ValueError("预约时长无效")
+        if self._reservation_repo.get_by_car(car_id):
+            raise ValueError(f"车辆 {car_id} 已有预约")
+
+        end_time = start_time + duration
+        if pile_id:
+            pile = self._pile_repo.get(pile_id)
+            if not pile:
+                raise ValueError("充电桩不存在")
+            if pile.state == WorkState.FAULTY:
+                raise ValueError(f"充电桩 {pile_id} 故障，无法预约")
+            if mode is not None and pile.pile_type != mode:
+                raise ValueError(f"充电桩 {pile_id} 不是{mode.value}充电桩")
+            if self._reservation_repo.find_conflict(pile_id, start_time, end_time):
+                raise ValueError(f"充电桩 {pile_id} 在该时段已被预约")
+        else:
+            if mode is None:
+                raise ValueError("未指定充电桩时必须指定充电模式")
+            pile = next((p for p in self._pile_repo.get_by_mode(mode)
+                         if p.state != WorkState.FAULTY and
+                         not self._reservation_repo.find_conflict(p.pile_id, start_time, end_time)), None)
+            if pile is None:
+                raise ValueError(f"该时段没有空闲的{mode.value}充电桩")
+
+        reservation = Reservation(
+            reservation_id=new_ulid(now),
+            car_id=car_id,
+            pile_id=pile.pile_id,
+            charge_mode=pile.pile_type,
+            start_time=start_time,
+            end_time=end_time,
+            created_at=now
+        )
+        self._reservation_repo.add(reservation)
+        print(f"[ReservationService] Car {car_id} reserved Pile {pile.pile_id} "
+              f"from {start_time:%Y-%m-%d %H:%M} to {end_time:%H:%M}")
+        return reservation
+
+    def cancel(self, car_id: str) -> bool:
+        """取消车辆的预约"""
+        reservation = self._reservation_repo.get_by_car(car_id)
+        if not reservation:
+            return False
+        self._reservation_repo.delete(reservation.reservation_id)
+        print(f"[ReservationService] Reservation of Car {car_id} on Pile {reservation.pile_id} cancelled")
+        return True
+
+    def get_reservation(self, car_id: str) -> Optional[Reservation]:
+        return self._reservation_repo.get_by_car(car_id)
+
+    def get_pile_reservations(self, pile_id: str, start: datetime, end: datetime) -> List[Reservation]:
+        return self._reservation_repo.get_pile_reservations(pile_id, start, end)
+
+    def next_free_slot(self, mode: ChargeMode, after: datetime,
+                       duration: timedelta) -> Optional[Tuple[str, datetime]]:
+        """该模式下能容纳 duration 的最早空闲预约时段
+
+        Returns:
+            Optional[Tuple[str, datetime]]: (充电桩ID, 开始时间)，没有可用充电桩时返回None
+        """
+        best = None
+        for pile in self._pile_repo.get_by_mode(mode):
+            if pile.state == WorkState.FAULTY:
+                continue
+            ts = self._reservation_repo.next_free_ts(pile.pile_id, after.timestamp(), duration.total_seconds())
+            if best is None or ts < best[1]:
+                best = (pile.pile_id, ts)
+        return (best[0], datetime.fromtimestamp(best[1])) if best else None
+
+    def available_from(self, pile_id: str, request: ChargingRequest, after_ts: float, hours: float) -> float:
+        """请求在充电桩上最早可以开始充电的时刻（时间戳），不会与他人的预约重叠"""
+        own = self._reservation_repo.get_by_car(request.car_id)
+        exclude = own.reservation_id if own and own.pile_id == pile_id else None
+        return self._reservation_repo.next_free_ts(pile_id, after_ts, hours * 3600, exclude)
+
+    def pile_intervals(self, pile_id: str) -> Tuple[Tuple[float, float, str], ...]:
+        """充电桩上全部预约时段的不可变副本 (开始时间戳, 结束时间戳, 车辆ID)，按开始时间排序"""
+        return self._reservation_repo.pile_intervals(pile_id)
+
+    def can_start_now(self, pile_id: str, request: ChargingRequest, hours: float) -> bool:
+        """请求现在在充电桩上开始充电是否不会占用他人的预约时段"""
+        now_ts = self._clock.now().timestamp()
+        return self.available_from(pile_id, request, now_ts, hours) <= now_ts
+
+    def adjusted_wait_hours(self, pile_id: str, request: ChargingRequest, wait_hours: float, hours: float) -> float:
+        """预计 wait_hours 小时后轮到请求时，考虑充电桩预约后实际需要等待的小时数"""
+        now_ts = self._clock.now().timestamp()
+        start_ts = self.available_from(pile_id, request, now_ts + wait_hours * 3600, hours)
+        return (start_ts - now_ts) / 3600
+
+    def has_reservations(self, pile_id: str) -> bool:
+        return self._reservation_repo.has_reservations(pile_id)
+
+    def active_reservation(self, pile_id: str) -> Optional[Reservation]:
+        """充电桩当前正处于其时段内的预约"""
+        now = self._clock.now()
+        for reservation in self._reservation_repo.get_pile_reservations(pile_id, now, now + timedelta(seconds=1)):
+            if reservation.is_active(now):
+                return reservation
+        return None
+
+    def fulfil(self, car_id: str):
+        """预约车辆已开始充电，释放其预约"""
+        reservation = self._reservation_repo.get_by_car(car_id)
+        if reservation:
+            self._reservation_repo.delete(reservation.reservation_id)
+
+    def expire(self) -> int:
+        """清理已过期的预约，返回清理数量"""
+        return len(self._reservation_repo.expire(self._clock.now()))
@@ -1,15 +1,23 @@
 # services/scheduling_service.py
+from typing import Iterable, List, Optional
+from models.bill import Bill
+from models.car import ChargingRequest
 from repositories.repositories import PileRepository, QueueRepository, RequestRepository
 from services.charging_service import ChargingService
-from utils.enums import WorkState, CarState
+from services.reservation_service import ReservationService
+from utils.enums import WorkState, CarState, ChargeMode
 
 class SchedulingService:
     """A simple scheduler that runs periodically to assign cars to idle piles."""
-    def __init__(self, pile_repo: PileRepository, queue_repo: QueueRepository, charging_service: ChargingService, request_repo: RequestRepository):
+    def __init__(self, pile_repo: PileRepository, queue_repo: QueueRepository, charging_service: ChargingService, request_repo: RequestRepository,
+                 reservation_service: Optional[ReservationService] = None):
         self._pile_repo = pile_repo
         self._queue_repo = queue_repo
         self._charging_service = charging_service
         self._request_repo = request_repo
+        self._reservation_service = reservation_service
+        # 会话自动完成后立即为空出的充电桩叫号
+        self._charging_service.add_completion_listener(self.dispatch_to_pile)
 
     def run_schedule_cycle(self):
         """
@@ -18,25 +26,110 @@ class SchedulingService:
         This implements the "常规调度" (Routine Dispatch) from the sequence diagram.
         """
         print("\n--- [Scheduler] Running a scheduling cycle ---")
-        idle_piles = [p for p in self._pile_repo.get_all() if p.state == WorkState.IDLE]
+        # 只在有车等待的模式下从空闲索引取桩，耗时与叫号数量成正比，与充电桩总数无关
+        assigned = 0
+        for mode in ChargeMode:
+            assigned += self._fill_idle_piles(mode, fault_lane_only=False)
         
-        if not idle_piles:
-            print("[Scheduler] No idle piles available.")
-            return
+        if not assigned:
+            print("[Scheduler] No idle piles available or no cars waiting.")
 
+    def _waiting_count(self, mode: ChargeMode, fault_lane_only: bool) -> int:
+        lane = self._queue_repo.get_fault_lane_length(mode)
+        return lane if fault_lane_only else lane + self._queue_repo.get_queue_length(mode)
+
+    def _fill_idle_piles(self, mode: ChargeMode, fault_lane_only: bool) -> int:
+        """按空闲先后依次为空闲充电桩叫号，直到没有空闲桩或没有等待车辆
+        
+        因预约而暂时保留的充电桩会保持空闲，继续尝试下一个空闲桩。
+        """
+        assigned = 0
+        idle_piles = self._pile_repo.get_idle_piles(mode)
+        if self._reservation_service is not None:
+            # 正处于预约时段的充电桩先叫号，预约车辆优先回到自己预约的充电桩
+            idle_piles.sort(key=lambda p: self._reservation_service.active_reservation(p.pile_id) is None)
         for pile in idle_piles:
-            # Check if there's a car in the corresponding main queue
+            if not self._waiting_count(mode, fault_lane_only):
+                break
+            self._assign_next_car(pile)
+            if pile.state != WorkState.IDLE:
+                assigned += 1
+        return assigned
+
+    def handle_pile_faults(self, pile_ids: Iterable[str]) -> List[Bill]:
+        """处理一个或多个充电桩同时故障
+        
+        逐个中断故障桩上的会话并结算，被中断车辆进入故障优先通道；
+        全部登记完后只扫描一次空闲充电桩，按原请求时间顺序为故障通道叫号。
+        
+        Args:
+            pile_ids: 故障充电桩ID
+            
+        Returns:
+            List[Bill]: 被中断会话的详单
+        """
+        bills = []
+        modes = set()
+        for pile_id in pile_ids:
+            pile = self._pile_repo.get(pile_id)
+            if not pile:
+                continue
+            modes.add(pile.pile_type)
+            bill = self._charging_service.report_pile_failure(pile_id)
+            if bill:
+                bills.append(bill)
+        self.drain_fault_lanes(modes)
+        return bills
+
+    def drain_fault_lanes(self, modes: Iterable = None):
+        """为故障通道中的车辆分配空闲充电桩（一次批量叫号）"""
+        for mode in (set(modes) if modes is not None else ChargeMode):
+            self._fill_idle_piles(mode, fault_lane_only=True)
+
+    def dispatch_to_pile(self, pile_id: str):
+        """为单个刚空出的充电桩叫号，无需扫描所有充电桩"""
+        pile = self._pile_repo.get(pile_id)
+        if pile and pile.state == WorkState.IDLE:
+            self._assign_next_car(pile)
+
+    def _next_request_for_reserved_pile(self, pile) -> Optional[ChargingRequest]:
+        """有预约的充电桩：预约时段内优先叫预约车辆；否则只有队首车辆能在下一个预约开始前
+        充完时才叫号，不能充完则保持空闲"""
+        active = self._reservation_service.active_reservation(pile.pile_id)
+        if active:
+            queued = self._queue_repo.find_by_car_id(active.car_id)
+            if queued and queued.request_mode == pile.pile_type:
+                print(f"[Scheduler] Car {active.car_id} arrived for its reservation on Pile {pile.pile_id}")
+                return self._queue_repo.remove_by_car_id(active.car_id)
+        head = self._queue_repo.peek_next(pile.pile_type)
+        if head is None:
+            return None
+        if not self._reservation_service.can_start_now(pile.pile_id, head, head.charge_hours(pile.power_kw)):
+            print(f"[Scheduler] Pile {pile.pile_id} is held for an upcoming reservation")
+            return None
+        return self._queue_repo.get_next_from_queue(pile.pile_type)
+
+    def _assign_next_car(self, pile):
+        # Check if there's a car in the corresponding main queue
+        if self._reservation_service is not None and self._reservation_service.has_reservations(pile.pile_id):
+            next_car_request = self._next_request_for_reserved_pile(pile)
+            if next_car_request is None:
+                return
+        else:
             next_car_request = self._queue_repo.get_next_from_queue(pile.pile_type)
+        
+        if next_car_request:
+            print(f"[Scheduler] Assigning Car {next_car_request.car_id} to Idle Pile {pile.pile_id}")
+            
+            # 更新请求状态为充电中
+            next_car_request.state = CarState.CHARGING
+            next_car_request.pile_id = pile.pile_id
+            self._request_repo.save(next_car_request.car_id, next_car_request)
             
-            if next_car_request:
-                print(f"[Scheduler] Assigning Car {next_car_request.car_id} to Idle Pile {pile.pile_id}")
-                
-                # 更新请求状态为充电中
-                next_car_request.state = CarState.CHARGING
-                next_car_request.pile_id = pile.pile_id
-                self._request_repo.save(next_car_request.car_id, next_car_request)
-                
-                # 开始充电
-                self._charging_service.start_charging(pile, next_car_request)
-            else:
-                print(f"[Scheduler] No cars waiting in {pile.pile_type.value} queue for Pile {pile.pile_id}")
\ No newline at end of file
+            # 开始充电
+            self._charging_service.start_charging(pile, next_car_request)
+            if self._reservation_service is not None:
+                # 预约车辆已开始充电（无论是否在预约的充电桩上），释放其预约
+                self._reservation_service.fulfil(next_car_request.car_id)
+        else:
+            print(f"[Scheduler] No cars waiting in {pile.pile_type.value} queue for Pile {pile.pile_id}")
\ No newline at end of file
@@ -0,0 +1,242 @@
+# services/stats_service.py
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models.bill import Bill, ChargingSession
+from models.car import ChargingRequest
+from utils.histogram import LogHistogram
+
+# 指标 -> (说明, 返回值单位, 记录的整数单位折合返回单位的倍数)
+METRICS = {
+    'wait': ('排队等待时间', '分钟', 60),     # 记录秒
+    'duration': ('充电时长', '分钟', 60),     # 记录秒
+    'energy': ('单次充电量', 'kWh', 1000),    # 记录瓦时
+}
+SCOPES = ('pile', 'mode')
+PERCENTILES = (50, 90, 99)
+
+# (指标, 维度, 充电桩ID或充电模式)
+SketchKey = Tuple[str, str, str]
+
+
+class StatsService:
+    """充电桩和充电模式的等待时间、充电时长、充电量分布统计
+
+    每个 (指标, 充电桩) 和 (指标, 充电模式) 按天各保存一个 LogHistogram，另保存一个不分天的累计直方图。
+    车辆开始充电时记录排队等待时间（开始充电时间 - 请求时间，按开始日期归档），
+    账单仓库插入、改写或删除账单时增减充电时长和充电量（按结束日期归档），不保存原始样本。
+    查询时把时间窗口内各天的直方图合并后计算分位数；只保留最近 retention_days 天的
+    按天直方图，内存上限由充电桩数、保留天数和直方图子桶数决定，与运行时长无关。
+
+    统计持久化在 data/pile_stats.json：事件只把统计标记为已修改，由调度线程定期调用
+    checkpoint_if_due() 写文件，服务器停止时再调用 checkpoint() 写一次。
+    文件不存在或 load=False 时从账单重建充电时长和充电量（等待时间无法从账单恢复，从零开始累计）。
+    """
+
+    # 有未保存的修改且距上次保存超过该秒数时写文件
+    CHECKPOINT_INTERVAL = 60.0
+
+    def __init__(self, bill_repo, charging_service=None, persist: bool = True, load: bool = True,
+                 retention_days: int = 31, file_path: str = 'data/pile_stats.json'):
+        self._bill_repo = bill_repo
+        self._persist = persist
+        self._retention_days = retention_days
+        self._file_path = file_path
+        self._lock = threading.Lock()
+        self._days: Dict[date, Dict[SketchKey, LogHistogram]] = {}
+        self._totals: Dict[SketchKey, LogHistogram] = {}
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+
+        if load and self._persist and os.path.exists(self._file_path):
+            self._load()
+        else:
+            self.rebuild()
+
+        bill_repo.add_listener(self._on_bills_changed)
+        if charging_service is not None:
+            charging_service.add_start_listener(self._on_session_started)
+
+    def _load(self):
+        try:
+            with open(self._file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._totals = {tuple(key.split('/', 2)): LogHistogram.from_dict(histogram)
+                            for key, histogram in data.get('totals', {}).items()}
+            self._days = {
+                date.fromisoformat(day): {tuple(key.split('/', 2)): LogHistogram.from_dict(histogram)
+                                          for key, histogram in sketches.items()}
+                for day, sketches in data.get('days', {}).items()
+            }
+        except Exception as e:
+            print(f"[StatsService] 加载分布统计失败，从账单重建: {str(e)}")
+            self.rebuild()
+
+    def checkpoint(self):
+        """把统计写入文件（在锁内取出数据，锁外写文件，不阻塞事件的记录）"""
+        if not self._persist:
+            return
+        with self._lock:
+            data = {
+                'totals': {'/'.join(key): histogram.to_dict() for key, histogram in self._totals.items()},
+                'days': {day.isoformat(): {'/'.join(key): histogram.to_dict() for key, histogram in sketches.items()}
+                         for day, sketches in self._days.items()}
+            }
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+        temp_file = f"{self._file_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_file, self._file_path)
+        except Exception as e:
+            print(f"[StatsService] 保存分布统计失败: {str(e)}")
+            self._dirty = True
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def checkpoint_if_due(self) -> bool:
+        """有未保存的修改且距上次保存超过 CHECKPOINT_INTERVAL 秒时写文件
+
+        Returns:
+            bool: 是否写了文件
+        """
+        if not self._persist or not self._dirty or time.monotonic() - self._last_checkpoint < self.CHECKPOINT_INTERVAL:
+            return False
+        self.checkpoint()
+        return True
+
+    def _record(self, metric: str, pile_id: str, mode: str, day: date, value: int, count: int = 1):
+        """把一个值记入充电桩和充电模式两个维度的当天直方图和累计直方图（调用方持有锁）"""
+        newest = max(self._days) if self._days else day
+        cutoff = max(newest, day) - timedelta(days=self._retention_days - 1)
+        sketches = None
+        if day >= cutoff:
+            sketches = self._days.get(day)
+            if sketches is None:
+                sketches = self._days[day] = {}
+                for old_day in [d for d in self._days if d < cutoff]:
+                    del self._days[old_day]
+        targets = [self._totals] if sketches is None else [self._totals, sketches]
+        for key in ((metric, 'pile', pile_id), (metric, 'mode', mode)):
+            for sketches_of in targets:
+                histogram = sketches_of.get(key)
+                if histogram is None:
+                    if count < 0:
+                        continue
+                    histogram = sketches_of[key] = LogHistogram()
+                try:
+                    histogram.record(value, count)
+                except ValueError:
+                    # 撤销统计建立之前（或已过保留期）的账单，忽略
+                    continue
+                if not histogram.count:
+                    del sketches_of[key]
+
+    def _apply_bill(self, bill: Bill, sign: int):
+        mode = bill.charge_mode.value
+        day = bill.end_time.date()
+        self._record('duration', bill.pile_id, mode, day,
+                     round((bill.end_time - bill.start_time).total_seconds()), sign)
+        self._record('energy', bill.pile_id, mode, day, round(bill.charged_kwh * 1000), sign)
+
+    def _on_bills_changed(self, changes: List[Tuple[Optional[Bill], Optional[Bill]]]):
+        with self._lock:
+            for previous, current in changes:
+                if previous is not None:
+                    self._apply_bill(previous, -1)
+                if current is not None:
+                    self._apply_bill(current, 1)
+            self._dirty = True
+
+    def _on_session_started(self, request: ChargingRequest, session: ChargingSession):
+        wait = round((session.start_time - request.request_time).total_seconds())
+        with self._lock:
+            self._record('wait', session.pile_id, request.request_mode.value, session.start_time.date(), wait)
+            self._dirty = True
+
+    def rebuild(self, bills: Optional[Iterable[Bill]] = None) -> int:
+        """从历史账单重建充电时长和充电量的统计，保留已有的等待时间统计
+
+        Args:
+            bills: 用于重建的账单，默认为账单仓库中的全部账单
+
+        Returns:
+            int: 参与统计的账单数
+        """
+        if bills is None:
+            bills = self._bill_repo.get_all()
+        with self._lock:
+            self._totals = {key: histogram for key, histogram in self._totals.items() if key[0] == 'wait'}
+            for day in list(self._days):
+                sketches = {key: histogram for key, histogram in self._days[day].items() if key[0] == 'wait'}
+                if sketches:
+                    self._days[day] = sketches
+                else:
+                    del self._days[day]
+            count = 0
+            for bill in bills:
+                self._apply_bill(bill, 1)
+                count += 1
+        self.checkpoint()
+        print(f"[StatsService] Rebuilt session distributions from {count} bills")
+        return count
+
+    def get_stats(self, metric: Optional[str] = None, scope: Optional[str] = None, key: Optional[str] = None,
+                  start: Optional[date] = None, end: Optional[date] = None,
+                  percentiles: Sequence[float] = PERCENTILES) -> List[dict]:
+        """查询分布统计的分位数
+
+        Args:
+            metric: 指标 wait / duration / energy，None 表示全部
+            scope: 维度 pile / mode，None 表示全部
+            key: 只返回该充电桩ID或充电模式（如 "快充"）
+            start: 起始日期（含）；start 和 end 都为 None 时使用不分天的累计统计
+            end: 结束日期（不含）；只能查询保留期内的日期
+            percentiles: 要计算的百分位数
+
+        Returns:
+            List[dict]: 每个 (指标, 维度, 键) 一行，含样本数、均值、最小值、最大值和 p50 等分位数
+        """
+        if metric is not None and metric not in METRICS:
+            raise ValueError(f"无效的统计指标: {metric}")
+        if scope is not None and scope not in SCOPES:
+            raise ValueError(f"无效的统计维度: {scope}")
+
+        def wanted(sketch_key: SketchKey) -> bool:
+            return ((metric is None or sketch_key[0] == metric) and (scope is None or sketch_key[1] == scope)
+                    and (key is None or sketch_key[2] == key))
+
+        with self._lock:
+            if start is None and end is None:
+                merged = {k: LogHistogram().merge(h) for k, h in self._totals.items() if wanted(k)}
+            else:
+                merged = {}
+                for day, sketches in self._days.items():
+                    if (start is not None and day < start) or (end is not None and day >= end):
+                        continue
+                    for k, histogram in sketches.items():
+                        if wanted(k):
+                            merged.setdefault(k, LogHistogram()).merge(histogram)
+
+        order = list(METRICS)
+        rows = []
+        for sketch_key in sorted(merged, key=lambda k: (order.index(k[0]), SCOPES.index(k[1]), k[2])):
+            histogram = merged[sketch_key]
+            name, unit, scale = METRICS[sketch_key[0]]
+            row = {
+                'metric': sketch_key[0], 'name': name, 'scope': sketch_key[1], 'key': sketch_key[2], 'unit': unit,
+                'count': histogram.count,
+                'mean': round(histogram.mean() / scale, 2),
+                'min': round(histogram.min() / scale, 2),
+                'max': round(histogram.max() / scale, 2),
+            }
+            for percentile in percentiles:
+                row[f"p{percentile:g}"] = round(histogram.value_at_percentile(percentile) / scale, 2)
+            rows.append(row)
+        return rows
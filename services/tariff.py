@@ -0,0 +1,371 @@
+# services/tariff.py
+import json
+import os
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时批量计费退化为逐条计算
+    np = None
+
+from utils.config import TARIFF_CONFIG_PATH
+
+MINUTES_PER_DAY = 24 * 60
+SECONDS_PER_DAY = 24 * 3600
+MICROSECONDS_PER_DAY = SECONDS_PER_DAY * 1_000_000
+
+
+def _seconds_of_day(moment: datetime) -> float:
+    """当天零点起的秒数（先按整数微秒计算，保证与批量计算逐位一致）"""
+    return (((moment.hour * 60 + moment.minute) * 60 + moment.second) * 1_000_000 + moment.microsecond) / 1e6
+
+
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+def wall_microseconds(moments) -> 'np.ndarray':
+    """把一组本地时间（datetime 或 numpy.datetime64）转换为墙上时间的整数微秒数组"""
+    if isinstance(moments, np.ndarray):
+        if moments.dtype.kind in 'iu':  # 已经是整数微秒
+            return moments.astype(np.int64)
+        return moments.astype('datetime64[us]').astype(np.int64)
+    # numpy 逐个转换 datetime 对象较慢，直接按整数计算
+    return np.fromiter(
+        ((((m.toordinal() - _EPOCH_ORDINAL) * 86400 + m.hour * 3600 + m.minute * 60 + m.second) * 1_000_000
+          + m.microsecond) for m in moments),
+        dtype=np.int64, count=len(moments)
+    )
+
+
+class TariffTable:
+    """按分钟预计算的一天分时电价表
+
+    rates[m] 为一天中第 m 分钟的电价（元/度），prefix[m] 为前 m 分钟电价之和（元/度·分钟）。
+    任意时刻从当天零点起的累计电价积分为 prefix[m] + rates[m] × 分钟内的偏移，
+    因此一个 [start, end) 区间的电价积分 = 整天数 × 全天积分 + 两端各一次查表，
+    与区间长度无关，O(1)。
+    """
+
+    def __init__(self, minute_rates: Sequence[float], service_rate: float):
+        if len(minute_rates) != MINUTES_PER_DAY:
+            raise ValueError(f"分钟电价表必须有 {MINUTES_PER_DAY} 项")
+        self.rates: List[float] = [float(rate) for rate in minute_rates]
+        self.service_rate = float(service_rate)
+        self.prefix: List[float] = [0.0] * (MINUTES_PER_DAY + 1)
+        for m, rate in enumerate(self.rates):
+            self.prefix[m + 1] = self.prefix[m] + rate
+        self.day_total = self.prefix[-1]  # 全天积分（元/度·分钟）
+
+    @classmethod
+    def from_windows(cls, windows: Iterable[Tuple[int, int, float]], default_rate: float,
+                     service_rate: float) -> 'TariffTable':
+        """由时段列表构建
+
+        Args:
+            windows: (开始分钟, 结束分钟, 电价)，左闭右开，分钟数从当天零点起算
+            default_rate: 未被任何时段覆盖的分钟的电价
+            service_rate: 服务费单价（元/度）
+        """
+        rates = [default_rate] * MINUTES_PER_DAY
+        for start, end, rate in windows:
+            for m in range(start, end):
+                rates[m] = rate
+        return cls(rates, service_rate)
+
+    def rate_at(self, moment: datetime) -> float:
+        """某一时刻的电价"""
+        return self.rates[moment.hour * 60 + moment.minute]
+
+    def _day_integral(self, seconds: float) -> float:
+        """从当天零点到当天第 seconds 秒的电价积分（元/度·分钟）"""
+        m = int(seconds // 60)
+        if m >= MINUTES_PER_DAY:
+            return self.day_total
+        return self.prefix[m] + self.rates[m] * (seconds - m * 60) / 60
+
+    def integral(self, start: datetime, end: datetime) -> float:
+        """[start, end) 区间的电价积分（元/度·小时）"""
+        if end <= start:
+            return 0.0
+        start_s = _seconds_of_day(start)
+        end_s = _seconds_of_day(end)
+        days = end.toordinal() - start.toordinal()
+        minutes = days * self.day_total + self._day_integral(end_s) - self._day_integral(start_s)
+        return minutes / 60
+
+    def average_rate(self, start: datetime, end: datetime) -> float:
+        """[start, end) 区间的平均电价（元/度）"""
+        hours = (end - start).total_seconds() / 3600
+        if hours <= 0:
+            return self.rate_at(start)
+        return self.integral(start, end) / hours
+
+    def charge_fee(self, charged_kwh: float, start: datetime, end: datetime) -> float:
+        """充电量在 [start, end) 内均匀分布时的电费（元）"""
+        hours = (end - start).total_seconds() / 3600
+        if hours <= 0:
+            return 0.0
+        return charged_kwh * self.integral(start, end) / hours
+
+
+# 内置电价配置（与 config/tariff.json 的默认内容一致），配置文件不存在时使用
+DEFAULT_TARIFF_CONFIG = {
+    'rates': {'peak': 1.0, 'normal': 0.7, 'valley': 0.4},
+    'default_period': 'valley',
+    'windows': [
+        ['07:00', '10:00', 'normal'],
+        ['10:00', '15:00', 'peak'],
+        ['15:00', '18:00', 'normal'],
+        ['18:00', '21:00', 'peak'],
+        ['21:00', '23:00', 'normal']
+    ],
+    'service_rate': 0.8,
+    'weekend': {},
+    'holiday': {},
+    'holidays': [],
+    'seasons': []
+}
+
+_PROFILE_KEYS = ('rates', 'default_period', 'windows', 'service_rate')
+WEEKDAY, WEEKEND, HOLIDAY = 0, 1, 2
+
+
+def _parse_minute(value: str) -> int:
+    """'HH:MM' 转换为当天零点起的分钟数，允许 '24:00'"""
+    hour, minute = value.split(':')
+    minutes = int(hour) * 60 + int(minute)
+    if not 0 <= minutes <= MINUTES_PER_DAY:
+        raise ValueError(f"无效的时刻: {value}")
+    return minutes
+
+
+def _merge_profile(profile: dict, override: dict) -> dict:
+    """用覆盖项更新电价方案：rates 按时段类型合并，其余字段整体替换"""
+    merged = dict(profile)
+    for key in ('default_period', 'windows', 'service_rate'):
+        if key in override:
+            merged[key] = override[key]
+    if 'rates' in override:
+        merged['rates'] = {**profile['rates'], **override['rates']}
+    return merged
+
+
+def _compile_profile(profile: dict) -> TariffTable:
+    rates = profile['rates']
+    if any(float(rate) < 0 for rate in rates.values()) or float(profile['service_rate']) < 0:
+        raise ValueError("电价不能为负数")
+    if profile['default_period'] not in rates:
+        raise ValueError(f"未定义的时段类型: {profile['default_period']}")
+    windows = []
+    for start, end, period in profile['windows']:
+        if period not in rates:
+            raise ValueError(f"未定义的时段类型: {period}")
+        start_m, end_m = _parse_minute(start), _parse_minute(end)
+        if end_m <= start_m:
+            raise ValueError(f"无效的时段: {start}~{end}")
+        windows.append((start_m, end_m, float(rates[period])))
+    return TariffTable.from_windows(windows, float(rates[profile['default_period']]), profile['service_rate'])
+
+
+class TariffCalendar:
+    """编译后的电价日历：按日期选择当天的分时电价表
+
+    每一天的电价方案由三层叠加得到：基础方案 → 所在季节的覆盖项 → 周末/节假日的覆盖项
+    （节假日优先于周末）。所有（季节, 日期类型）组合在加载时编译为 TariffTable，内容相同的
+    方案共用一张表。跨天区间的积分 = 区间内各天按表分组的整天积分之和 + 两端各一次查表。
+    服务费单价取开始充电当天的方案。
+    """
+
+    _MAX_CACHED_DAYS = 4096
+
+    def __init__(self, tables: List[TariffTable], day_tables: Dict[Tuple[int, int], int],
+                 month_seasons: Sequence[int], holidays: Iterable[date]):
+        self.tables = tables
+        self._day_tables = day_tables              # (季节序号, 日期类型) -> 表序号
+        self._month_seasons = list(month_seasons)  # 月份(1~12) -> 季节序号，0 表示基础方案
+        self._holidays = {day.toordinal() for day in holidays}
+        self._day_cache: Dict[int, int] = {}
+        self._single = len(tables) == 1
+        if np is not None:
+            self._prefix_array = np.array([table.prefix for table in tables])
+            self._rates_array = np.array([table.rates for table in tables])
+            self._service_array = np.array([table.service_rate for table in tables])
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'TariffCalendar':
+        """编译电价配置，配置无效时抛出 ValueError"""
+        try:
+            base = {key: config[key] for key in _PROFILE_KEYS}
+            seasons = config.get('seasons', [])
+            month_seasons = [0] * 13
+            for number, season in enumerate(seasons, 1):
+                for month in season['months']:
+                    if not 1 <= month <= 12 or month_seasons[month]:
+                        raise ValueError(f"季节 {season.get('name', number)} 的月份 {month} 无效或重复")
+                    month_seasons[month] = number
+            holidays = [date.fromisoformat(day) for day in config.get('holidays', [])]
+
+            tables: List[TariffTable] = []
+            compiled: Dict[str, int] = {}
+            day_tables: Dict[Tuple[int, int], int] = {}
+            for number, season in enumerate([{}] + seasons):
+                weekday = _merge_profile(base, season)
+                profiles = {
+                    WEEKDAY: weekday,
+                    WEEKEND: _merge_profile(weekday, season.get('weekend', config.get('weekend', {}))),
+                    HOLIDAY: _merge_profile(weekday, season.get('holiday', config.get('holiday', {})))
+                }
+                for day_type, profile in profiles.items():
+                    key = json.dumps(profile, sort_keys=True)
+                    if key not in compiled:
+                        compiled[key] = len(tables)
+                        tables.append(_compile_profile(profile))
+                    day_tables[(number, day_type)] = compiled[key]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"电价配置无效: {e}") from e
+        return cls(tables, day_tables, month_seasons, holidays)
+
+    def table_index(self, ordinal: int) -> int:
+        """某一天（date.toordinal()）使用的电价表序号"""
+        index = self._day_cache.get(ordinal)
+        if index is None:
+            day = date.fromordinal(ordinal)
+            if ordinal in self._holidays:
+                day_type = HOLIDAY
+            elif day.weekday() >= 5:
+                day_type = WEEKEND
+            else:
+                day_type = WEEKDAY
+            index = self._day_tables[(self._month_seasons[day.month], day_type)]
+            if len(self._day_cache) >= self._MAX_CACHED_DAYS:
+                self._day_cache.clear()
+            self._day_cache[ordinal] = index
+        return index
+
+    def table_for(self, moment: datetime) -> TariffTable:
+        return self.tables[self.table_index(moment.toordinal())]
+
+    def rate_at(self, moment: datetime) -> float:
+        """某一时刻的电价"""
+        return self.table_for(moment).rate_at(moment)
+
+    def integral(self, start: datetime, end: datetime) -> float:
+        """[start, end) 区间的电价积分（元/度·小时）"""
+        if end <= start:
+            return 0.0
+        start_day = start.toordinal()
+        return self._integral(start, end, start_day, self.tables[self.table_index(start_day)])
+
+    def _integral(self, start: datetime, end: datetime, start_day: int, start_table: TariffTable) -> float:
+        end_day = end.toordinal()
+        minutes = 0.0
+        if self._single:
+            end_table = start_table
+            minutes += (end_day - start_day) * start_table.day_total
+        elif end_day == start_day:
+            end_table = start_table
+        else:
+            end_table = self.tables[self.table_index(end_day)]
+            counts = [0] * len(self.tables)
+            for ordinal in range(start_day, end_day):
+                counts[self.table_index(ordinal)] += 1
+            for table, count in zip(self.tables, counts):
+                minutes += count * table.day_total
+        minutes = minutes + end_table._day_integral(_seconds_of_day(end)) \
+            - start_table._day_integral(_seconds_of_day(start))
+        return minutes / 60
+
+    def fees(self, charged_kwh: float, start: datetime, end: datetime) -> Tuple[float, float]:
+        """充电量在 [start, end) 内均匀分布时的 (电费, 服务费)（元）
+
+        服务费按开始充电当天的服务费单价计算。
+        """
+        start_day = start.toordinal()
+        start_table = self.tables[0] if self._single else self.tables[self.table_index(start_day)]
+        service_fee = charged_kwh * start_table.service_rate
+        hours = (end - start).total_seconds() / 3600
+        if hours <= 0:
+            return 0.0, service_fee
+        return charged_kwh * self._integral(start, end, start_day, start_table) / hours, service_fee
+
+    def charge_fee(self, charged_kwh: float, start: datetime, end: datetime) -> float:
+        """充电量在 [start, end) 内均匀分布时的电费（元）"""
+        return self.fees(charged_kwh, start, end)[0]
+
+    def bulk_fees(self, charged_kwh, starts, ends):
+        """批量计算电费和服务费，与 fees 逐条计算的结果逐位一致
+
+        Args:
+            charged_kwh: 充电量数组（度）
+            starts: 开始时间数组（datetime 或 numpy.datetime64，本地时间）
+            ends: 结束时间数组
+
+        Returns:
+            (电费数组, 服务费数组)；没有 numpy 时为列表
+        """
+        if np is None:
+            fees = [self.fees(kwh, start, end) for kwh, start, end in zip(charged_kwh, starts, ends)]
+            return [fee[0] for fee in fees], [fee[1] for fee in fees]
+        kwh = np.asarray(charged_kwh, dtype=np.float64)
+        if not len(kwh):
+            return np.zeros(0), np.zeros(0)
+        start_us = wall_microseconds(starts)
+        end_us = wall_microseconds(ends)
+        minutes, start_table = self._bulk_minutes(start_us, end_us)
+        hours = (end_us - start_us) / 1e6 / 3600
+        positive = hours > 0
+        charge_fees = np.zeros(len(kwh))
+        charge_fees[positive] = kwh[positive] * (minutes[positive] / 60) / hours[positive]
+        return charge_fees, kwh * self._service_array[start_table]
+
+    def bulk_integral(self, starts, ends):
+        """批量计算 [start, end) 区间的电价积分（元/度·小时），与 integral 逐条计算的结果逐位一致
+
+        starts / ends 可以是 datetime 序列、numpy.datetime64 数组或本地时间的整数微秒数组。
+        """
+        if np is None:
+            return [self.integral(start, end) for start, end in zip(starts, ends)]
+        start_us = wall_microseconds(starts)
+        end_us = wall_microseconds(ends)
+        if not len(start_us):
+            return np.zeros(0)
+        minutes, _ = self._bulk_minutes(start_us, end_us)
+        return np.where(end_us > start_us, minutes / 60, 0.0)
+
+    def _bulk_minutes(self, start_us, end_us):
+        """各区间的电价积分（元/度·分钟）及开始当天的电价表序号"""
+        start_day = start_us // MICROSECONDS_PER_DAY
+        end_day = end_us // MICROSECONDS_PER_DAY
+
+        # 只为区间覆盖到的日期查一次电价表
+        first_day = int(min(start_day.min(), end_day.min()))
+        last_day = int(max(start_day.max(), end_day.max()))
+        day_index = np.array([self.table_index(day + _EPOCH_ORDINAL) for day in range(first_day, last_day + 1)])
+        start_table = day_index[start_day - first_day]
+        end_table = day_index[end_day - first_day]
+
+        minutes = np.zeros(len(start_us))
+        if self._single:
+            minutes += (end_day - start_day) * self.tables[0].day_total
+        else:
+            for k, table in enumerate(self.tables):
+                days_before = np.concatenate(([0], np.cumsum(day_index == k)))
+                count = days_before[np.maximum(end_day, start_day) - first_day] - days_before[start_day - first_day]
+                minutes += count * table.day_total
+        minutes = minutes + self._bulk_day_integral(end_table, (end_us - end_day * MICROSECONDS_PER_DAY) / 1e6) \
+            - self._bulk_day_integral(start_table, (start_us - start_day * MICROSECONDS_PER_DAY) / 1e6)
+        return minutes, start_table
+
+    def _bulk_day_integral(self, table, seconds):
+        m = (seconds // 60).astype(np.int64)
+        return self._prefix_array[table, m] + self._rates_array[table, m] * (seconds - m * 60) / 60
+
+
+def load_tariff_calendar(path: str = TARIFF_CONFIG_PATH) -> TariffCalendar:
+    """加载并编译电价配置，文件不存在时使用内置配置"""
+    if not os.path.exists(path):
+        print(f"[Config] 未找到 {path}，使用默认电价配置")
+        return TariffCalendar.from_config(DEFAULT_TARIFF_CONFIG)
+    with open(path, 'r', encoding='utf-8') as f:
+        return TariffCalendar.from_config(json.load(f))
@@ -0,0 +1,181 @@
+# services/telemetry_service.py
+import threading
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils.clock import Clock, SYSTEM_CLOCK
+from utils.enums import WorkState
+
+# 分辨率 -> (槽宽秒数, 保留的槽数)：1 秒保留 1 小时，1 分钟保留 1 天，1 小时保留 30 天
+TIERS = {
+    '1s': (1, 3600),
+    '1m': (60, 1440),
+    '1h': (3600, 720),
+}
+STATES = list(WorkState)
+
+
+class TelemetryRing:
+    """一个分辨率的固定容量环形缓冲区
+
+    每个槽保存槽起始时间（秒）、平均功率、峰值功率、充电中时间占比、槽结束时的状态，
+    分别存放在按槽位对齐的预分配 array 中，写满后覆盖最旧的槽，内存不随运行时长增长。
+    正在累计的当前槽单独保存，槽结束时写入缓冲区，并作为一个加权样本交给下一级（更粗）分辨率。
+    """
+
+    __slots__ = ('step', 'capacity', 'times', 'power', 'peak', 'busy', 'states', 'head', 'size',
+                 '_slot', '_weight', '_power_sum', '_peak', '_busy_sum', '_state')
+
+    def __init__(self, step: int, capacity: int):
+        self.step = step
+        self.capacity = capacity
+        self.times = array('q', bytes(8 * capacity))
+        self.power = array('f', bytes(4 * capacity))
+        self.peak = array('f', bytes(4 * capacity))
+        self.busy = array('f', bytes(4 * capacity))
+        self.states = array('b', bytes(capacity))
+        self.head = 0  # 下一个写入位置
+        self.size = 0
+        self._slot: Optional[int] = None
+        self._weight = 0
+        self._power_sum = 0.0
+        self._peak = 0.0
+        self._busy_sum = 0.0
+        self._state = 0
+
+    def add(self, second: int, power: float, peak: float, busy: float, state: int, weight: int = 1) -> Optional[tuple]:
+        """累计一个样本（weight 为其代表的 1 秒样本数）
+
+        Returns:
+            Optional[tuple]: 样本进入新槽时，刚结束的槽 (起始秒, 平均功率, 峰值功率, 充电占比, 状态, 样本数)
+        """
+        slot = second - second % self.step
+        finished = None
+        if slot != self._slot:
+            if self._slot is not None and slot < self._slot:
+                return None  # 时钟回拨，丢弃早于当前槽的样本
+            finished = self._flush()
+            self._slot = slot
+        self._weight += weight
+        self._power_sum += power * weight
+        self._peak = max(self._peak, peak)
+        self._busy_sum += busy * weight
+        self._state = state
+        return finished
+
+    def _flush(self) -> Optional[tuple]:
+        if not self._weight:
+            return None
+        row = (self._slot, self._power_sum / self._weight, self._peak,
+               self._busy_sum / self._weight, self._state, self._weight)
+        i = self.head
+        self.times[i], self.power[i], self.peak[i], self.busy[i], self.states[i] = row[:5]
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self._weight = 0
+        self._power_sum = self._busy_sum = self._peak = 0.0
+        return row
+
+    def oldest(self) -> Optional[int]:
+        """缓冲区中最旧一槽的起始时间（秒）"""
+        if self.size:
+            return self.times[(self.head - self.size) % self.capacity]
+        return self._slot if self._weight else None
+
+    def rows(self, start: Optional[int] = None, end: Optional[int] = None) -> List[tuple]:
+        """起始时间在 [start, end) 内的槽（含正在累计的当前槽），按时间从旧到新"""
+        result = []
+        first = (self.head - self.size) % self.capacity
+        for k in range(self.size):
+            i = (first + k) % self.capacity
+            second = self.times[i]
+            if (start is None or second >= start) and (end is None or second < end):
+                result.append((second, self.power[i], self.peak[i], self.busy[i], self.states[i]))
+        if self._weight and (start is None or self._slot >= start) and (end is None or self._slot < end):
+            result.append((self._slot, self._power_sum / self._weight, self._peak,
+                           self._busy_sum / self._weight, self._state))
+        return result
+
+
+class TelemetryService:
+    """充电桩功率和状态的历史曲线
+
+    调度线程每秒调用 sample()，从充电桩快照读取每个桩的状态和分配功率，写入该桩的 1 秒环形缓冲区；
+    每满 1 分钟降采样为一个 1 分钟槽（平均功率、峰值功率、充电占比），每满 1 小时再降采样为 1 小时槽。
+    各分辨率的容量固定（见 TIERS），每个充电桩约占 120 KB，已移除的充电桩的缓冲区随之释放，
+    服务器运行多久内存都不会增长。
+    """
+
+    def __init__(self, pile_repo, charging_service, clock: Optional[Clock] = None):
+        self._pile_repo = pile_repo
+        self._charging_service = charging_service
+        self._clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._series: Dict[str, List[TelemetryRing]] = {}
+
+    def sample(self, now: Optional[datetime] = None):
+        """记录所有充电桩当前的功率和状态"""
+        now = now or self._clock.now()
+        second = int(now.timestamp())
+        snapshot = self._pile_repo.snapshot()
+        with self._lock:
+            for pile_id in [pid for pid in self._series if pid not in snapshot]:
+                del self._series[pile_id]
+            for pile_id, pile in snapshot.items():
+                state = WorkState(pile['state'])
+                power = self._charging_service.get_allocated_power(pile_id) if state == WorkState.CHARGING else 0.0
+                self._record(pile_id, second, power, state)
+
+    def _record(self, pile_id: str, second: int, power: float, state: WorkState):
+        """写入一个 1 秒样本，结束的槽逐级降采样（调用方持有锁）"""
+        tiers = self._series.get(pile_id)
+        if tiers is None:
+            tiers = self._series[pile_id] = [TelemetryRing(step, capacity) for step, capacity in TIERS.values()]
+        row = (second, power, power, 1.0 if state == WorkState.CHARGING else 0.0, STATES.index(state), 1)
+        for tier in tiers:
+            row = tier.add(*row)
+            if row is None:
+                break
+
+    def query(self, pile_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              resolution: Optional[str] = None) -> dict:
+        """查询充电桩在 [start, end) 内的功率和状态曲线
+
+        Args:
+            pile_id: 充电桩ID
+            start: 起始时间（含），None 表示缓冲区中最早的数据
+            end: 结束时间（不含），None 表示当前
+            resolution: 分辨率 1s / 1m / 1h，None 时选择仍保留 start 之后全部数据的最细分辨率
+
+        Returns:
+            dict: resolution 和 points（每点含 time、power_kw、peak_kw、busy 充电占比、state）
+        """
+        if resolution is not None and resolution not in TIERS:
+            raise ValueError(f"无效的分辨率: {resolution}")
+        start_s = int(start.timestamp()) if start else None
+        end_s = int(end.timestamp()) if end else None
+        with self._lock:
+            tiers = self._series.get(pile_id)
+            if tiers is None:
+                raise ValueError(f"充电桩 {pile_id} 没有遥测数据")
+            names = list(TIERS)
+            if resolution is None:
+                resolution = names[-1]
+                for name, tier in zip(names, tiers):
+                    oldest = tier.oldest()
+                    # 缓冲区未写满说明尚未覆盖过数据，最早的样本就是开始记录的时间
+                    if tier.size < tier.capacity or (start_s is not None and oldest is not None and oldest <= start_s):
+                        resolution = name
+                        break
+            rows = tiers[names.index(resolution)].rows(start_s, end_s)
+        return {
+            'resolution': resolution,
+            'points': [{
+                'time': datetime.fromtimestamp(second).isoformat(),
+                'power_kw': round(power, 2),
+                'peak_kw': round(peak, 2),
+                'busy': round(busy, 3),
+                'state': STATES[state].value
+            } for second, power, peak, busy, state in rows]
+        }
@@ -5,7 +5,7 @@ from repositories.repositories import UserRepository
 import hashlib
 import os
 import re
-from typing import Tuple
+from typing import Optional, Tuple
 
 class UserService:
     def __init__(self, user_repo: UserRepository):
@@ -146,4 +146,8 @@ class UserService:
         user = self._user_repo.find_by_id(user_id)
         if not user:
             raise ValueError("用户不存在")
-        return user.car
\ No newline at end of file
+        return user.car
+
+    def find_car(self, car_id: str) -> Optional[Car]:
+        """按车辆ID查找车辆信息（用于获取电池容量和类型），找不到时返回None"""
+        return self._user_repo.find_car(car_id)
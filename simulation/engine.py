@@ -0,0 +1,296 @@
+# simulation/engine.py
+import contextlib
+import enum
+import heapq
+import itertools
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from models.charging_pile import FastChargingPile, TrickleChargingPile
+from repositories.repositories import (
+    PileRepository, SessionRepository, BillRepository, RequestRepository, QueueRepository
+)
+from services.billing_service import BillingService
+from services.charging_service import ChargingService
+from services.load_manager import LoadManager
+from services.scheduling_service import SchedulingService
+from services.stats_service import StatsService
+from utils.clock import VirtualClock
+from utils.enums import ChargeMode, WorkState
+from utils.money import to_yuan
+
+
+class EventType(enum.Enum):
+    """仿真事件类型"""
+    ARRIVAL = "到达"
+    COMPLETION = "充电完成"
+    FAULT = "故障"
+    RECOVERY = "故障恢复"
+
+
+@dataclass(order=True)
+class SimEvent:
+    """仿真事件，按 (时间, 序号) 排序，序号保证同一时刻的事件按加入顺序处理"""
+    time: datetime
+    seq: int
+    event_type: EventType = field(compare=False)
+    payload: dict = field(compare=False, default_factory=dict)
+
+
+@dataclass
+class SimulationReport:
+    """仿真结果统计"""
+    simulated_hours: float = 0.0
+    wall_seconds: float = 0.0
+    events: int = 0
+    arrivals: int = 0
+    completed: int = 0
+    faults: int = 0
+    bills: int = 0
+    energy_kwh: float = 0.0
+    revenue_cents: int = 0
+    total_wait_hours: float = 0.0
+    max_wait_hours: float = 0.0
+    started: int = 0
+    max_queue_length: Dict[str, int] = field(default_factory=dict)
+    # 充电模式 -> 排队等待时间的 (p50, p90, p99)（分钟）
+    wait_percentiles: Dict[str, Tuple[float, float, float]] = field(default_factory=dict)
+    power_budget_kw: Optional[float] = None
+
+    @property
+    def revenue(self) -> float:
+        """总收入（元）"""
+        return to_yuan(self.revenue_cents)
+
+    @property
+    def avg_wait_hours(self) -> float:
+        return self.total_wait_hours / self.started if self.started else 0.0
+
+    @property
+    def energy_per_hour(self) -> float:
+        """单位时间交付电量（度/小时），站级功率预算下的吞吐量指标"""
+        return self.energy_kwh / self.simulated_hours if self.simulated_hours else 0.0
+
+    @property
+    def speedup(self) -> float:
+        """仿真时间与真实耗时之比"""
+        return self.simulated_hours * 3600 / self.wall_seconds if self.wall_seconds else 0.0
+
+    def summary(self) -> str:
+        lines = [
+            f"仿真时长: {self.simulated_hours:.1f} 小时 (耗时 {self.wall_seconds:.2f} 秒, 加速比 {self.speedup:,.0f}x)",
+            f"处理事件: {self.events} 个 ({self.events / self.wall_seconds if self.wall_seconds else 0:,.0f} 个/秒)",
+            f"到达车辆: {self.arrivals}, 开始充电: {self.started}, 完成充电: {self.completed}, 故障次数: {self.faults}",
+            f"详单数量: {self.bills}, 总充电量: {self.energy_kwh:.1f} 度, 总收入: {self.revenue:.2f} 元",
+            f"吞吐量: {self.energy_per_hour:.1f} 度/小时 (站级功率预算: "
+            f"{'不限' if self.power_budget_kw is None else f'{self.power_budget_kw:g} kW'})",
+            f"平均等待: {self.avg_wait_hours:.2f} 小时, 最长等待: {self.max_wait_hours:.2f} 小时",
+            f"最大排队长度: {self.max_queue_length}",
+        ]
+        for mode, (p50, p90, p99) in self.wait_percentiles.items():
+            lines.append(f"{mode}等待分位数: P50 {p50:.1f} 分钟, P90 {p90:.1f} 分钟, P99 {p99:.1f} 分钟")
+        return "\n".join(lines)
+
+
+class SimulationEngine:
+    """离散事件仿真引擎
+
+    使用虚拟时钟驱动真实的 ChargingService / SchedulingService / BillingService，
+    事件之间直接跳跃时间，因此一周的仿真只需数秒。仓库均为内存模式，不会写入 data/ 目录。
+    """
+
+    def __init__(self, fast_piles: int = 2, trickle_piles: int = 3,
+                 start_time: Optional[datetime] = None, verbose: bool = False,
+                 power_budget_kw: Optional[float] = None, power_strategy: str = 'fair'):
+        self.clock = VirtualClock(start_time)
+        self.start_time = self.clock.now()
+        self.verbose = verbose
+        self._devnull = None if verbose else open(os.devnull, 'w')
+
+        # 内存仓库
+        self.pile_repo = PileRepository(persist=False)
+        self.session_repo = SessionRepository(persist=False)
+        self.bill_repo = BillRepository(persist=False)
+        self.request_repo = RequestRepository(persist=False)
+        self.queue_repo = QueueRepository()
+
+        # 真实服务，注入虚拟时钟
+        self.billing_service = BillingService()
+        self.charging_service = ChargingService(
+            self.pile_repo, self.session_repo, self.bill_repo,
+            self.request_repo, self.queue_repo, self.billing_service,
+            clock=self.clock,
+            load_manager=LoadManager(power_budget_kw, power_strategy)
+        )
+        self.scheduling_service = SchedulingService(
+            self.pile_repo, self.queue_repo, self.charging_service, self.request_repo
+        )
+
+        with self._output():
+            self.stats_service = StatsService(self.bill_repo, self.charging_service, persist=False)
+            for i in range(1, fast_piles + 1):
+                pile_id = f"F{i:02d}"
+                self.pile_repo.save(pile_id, FastChargingPile(pile_id=pile_id))
+            for i in range(1, trickle_piles + 1):
+                pile_id = f"T{i:02d}"
+                self.pile_repo.save(pile_id, TrickleChargingPile(pile_id=pile_id))
+
+        self._events: List[SimEvent] = []
+        self._seq = itertools.count()
+        self._car_seq = itertools.count(1)
+        # 正在充电的车辆: pile_id -> (car_id, 已安排的完成时间)
+        self._active: Dict[str, Tuple[str, datetime]] = {}
+        self.report = SimulationReport(power_budget_kw=power_budget_kw)
+
+    def _output(self):
+        """非 verbose 模式下屏蔽服务层的打印输出"""
+        if self.verbose:
+            return contextlib.nullcontext()
+        return contextlib.redirect_stdout(self._devnull)
+
+    def schedule(self, when: datetime, event_type: EventType, **payload):
+        """加入一个事件"""
+        heapq.heappush(self._events, SimEvent(when, next(self._seq), event_type, payload))
+
+    def add_arrival(self, when: datetime, mode: ChargeMode, amount_kwh: float,
+                    car_id: Optional[str] = None, battery_capacity_kwh: Optional[float] = None,
+                    battery_class: Optional[str] = None):
+        """加入一辆车的到达事件（给出电池容量时按充电曲线充电）"""
+        car_id = car_id or f"SIM{next(self._car_seq):06d}"
+        self.schedule(when, EventType.ARRIVAL, car_id=car_id, mode=mode, amount=amount_kwh,
+                      capacity=battery_capacity_kwh, battery_class=battery_class)
+
+    def add_fault(self, when: datetime, pile_id: str, repair_after: timedelta):
+        """加入一次充电桩故障及其恢复事件"""
+        self.schedule(when, EventType.FAULT, pile_id=pile_id)
+        self.schedule(when + repair_after, EventType.RECOVERY, pile_id=pile_id)
+
+    def generate_arrivals(self, num_cars: int, duration: timedelta, fast_ratio: float = 0.5,
+                          fast_amount: Tuple[float, float] = (10.0, 40.0),
+                          trickle_amount: Tuple[float, float] = (5.0, 25.0),
+                          seed: Optional[int] = None,
+                          battery_capacity_kwh: Optional[float] = None,
+                          battery_class: Optional[str] = None):
+        """按泊松过程生成到达事件
+
+        Args:
+            num_cars: 期望到达车辆数
+            duration: 到达时间窗口
+            fast_ratio: 快充请求占比
+            fast_amount: 快充请求充电量范围（度）
+            trickle_amount: 慢充请求充电量范围（度）
+            seed: 随机数种子，便于回归对比
+            battery_capacity_kwh: 车辆电池容量（度），为None时按恒定功率充电
+            battery_class: 电池类型（充电曲线）
+        """
+        rng = random.Random(seed)
+        mean_gap = duration.total_seconds() / num_cars
+        t = 0.0
+        for _ in range(num_cars):
+            t += rng.expovariate(1.0 / mean_gap)
+            if rng.random() < fast_ratio:
+                mode, low_high = ChargeMode.FAST, fast_amount
+            else:
+                mode, low_high = ChargeMode.TRICKLE, trickle_amount
+            amount = round(rng.uniform(*low_high), 1)
+            self.add_arrival(self.start_time + timedelta(seconds=t), mode, amount,
+                             battery_capacity_kwh=battery_capacity_kwh, battery_class=battery_class)
+
+    def run(self, until: Optional[datetime] = None) -> SimulationReport:
+        """运行仿真直到事件耗尽或到达指定时间
+
+        Returns:
+            SimulationReport: 仿真统计结果
+        """
+        wall_start = time.perf_counter()
+        with self._output():
+            while self._events and (until is None or self._events[0].time <= until):
+                event = heapq.heappop(self._events)
+                self.clock.advance_to(event.time)
+                self._dispatch(event)
+                self.report.events += 1
+
+                # 同一时刻的事件全部处理完后再运行一次调度
+                if not self._events or self._events[0].time != event.time:
+                    self.scheduling_service.run_schedule_cycle()
+                    self._sync_sessions()
+                    self._record_queue_lengths()
+
+        self.report.wall_seconds += time.perf_counter() - wall_start
+        self.report.simulated_hours = (self.clock.now() - self.start_time).total_seconds() / 3600
+        self.report.wait_percentiles = {
+            row['key']: (row['p50'], row['p90'], row['p99'])
+            for row in self.stats_service.get_stats('wait', 'mode')
+        }
+        return self.report
+
+    def _dispatch(self, event: SimEvent):
+        if event.event_type == EventType.ARRIVAL:
+            self._on_arrival(event.payload)
+        elif event.event_type == EventType.COMPLETION:
+            self._on_completion(event.payload)
+        elif event.event_type == EventType.FAULT:
+            self._on_fault(event.payload)
+        elif event.event_type == EventType.RECOVERY:
+            self.charging_service.recover_pile(event.payload['pile_id'])
+
+    def _on_arrival(self, payload: dict):
+        self.report.arrivals += 1
+        mode = "FAST" if payload['mode'] == ChargeMode.FAST else "TRICKLE"
+        self.charging_service.create_charging_request(
+            payload['car_id'], mode, payload['amount'],
+            battery_capacity_kwh=payload.get('capacity'), battery_class=payload.get('battery_class'))
+
+    def _on_completion(self, payload: dict):
+        pile_id, car_id = payload['pile_id'], payload['car_id']
+        # 故障等原因已提前结束、或功率重新分配后完成时间已变化的会话，其完成事件作废
+        active = self._active.get(pile_id)
+        if not active or active != (car_id, payload['done_at']):
+            return
+        del self._active[pile_id]
+        bill = self.charging_service.end_charging(car_id)
+        if bill:
+            self.report.completed += 1
+            self._record_bill(bill)
+
+    def _on_fault(self, payload: dict):
+        pile_id = payload['pile_id']
+        self.report.faults += 1
+        # 正在充电的车辆按已充电量生成详单，剩余电量进入故障优先通道
+        self._active.pop(pile_id, None)
+        for bill in self.scheduling_service.handle_pile_faults([pile_id]):
+            self._record_bill(bill)
+
+    def _sync_sessions(self):
+        """统计新开始充电的车辆，并按充电服务当前安排的完成时间（含功率重新分配）安排完成事件"""
+        for pile in self.pile_repo.get_all():
+            if pile.state != WorkState.CHARGING:
+                continue
+            active = self._active.get(pile.pile_id)
+            if not active or active[0] != pile.current_car_id:
+                request = self.request_repo.get(pile.current_car_id)
+                self.report.started += 1
+                wait = (pile.start_time - request.request_time).total_seconds() / 3600
+                self.report.total_wait_hours += wait
+                self.report.max_wait_hours = max(self.report.max_wait_hours, wait)
+            done_at = self.charging_service.get_completion_deadline(pile.pile_id)
+            if active and active == (pile.current_car_id, done_at):
+                continue
+            self._active[pile.pile_id] = (pile.current_car_id, done_at)
+            if done_at is not None:
+                self.schedule(done_at, EventType.COMPLETION, pile_id=pile.pile_id,
+                              car_id=pile.current_car_id, done_at=done_at)
+
+    def _record_bill(self, bill):
+        self.report.bills += 1
+        self.report.energy_kwh += bill.charged_kwh
+        self.report.revenue_cents += bill.total_fee_cents
+
+    def _record_queue_lengths(self):
+        for mode, queue in self.queue_repo.queues.items():
+            key = mode.value
+            self.report.max_queue_length[key] = max(self.report.max_queue_length.get(key, 0), len(queue))
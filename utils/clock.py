@@ -0,0 +1,43 @@
+# utils/clock.py
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+class Clock(ABC):
+    """时钟接口，所有业务代码通过它获取当前时间，便于注入虚拟时钟"""
+
+    @abstractmethod
+    def now(self) -> datetime:
+        """当前时间"""
+
+
+class SystemClock(Clock):
+    """墙上时钟，直接使用系统时间"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class VirtualClock(Clock):
+    """虚拟时钟，由仿真引擎推进，不随真实时间流逝"""
+
+    def __init__(self, start_time: Optional[datetime] = None):
+        self._now = start_time or datetime.now().replace(microsecond=0)
+
+    def now(self) -> datetime:
+        return self._now
+
+    def advance_to(self, when: datetime):
+        """将时钟推进到指定时间（不允许倒退）"""
+        if when < self._now:
+            raise ValueError(f"虚拟时钟不能倒退: {when} < {self._now}")
+        self._now = when
+
+    def advance(self, delta: timedelta):
+        """将时钟向前推进一段时间"""
+        self.advance_to(self._now + delta)
+
+
+# 默认使用系统时钟
+SYSTEM_CLOCK = SystemClock()
@@ -1,11 +1,47 @@
 # utils/config.py
+import json
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
 from utils.enums import ChargeMode
 
-# Pricing per kWh
-PRICE_PER_KWH = {
-    ChargeMode.FAST: 1.2,
-    ChargeMode.TRICKLE: 0.8
-}
+# 充电站拓扑配置文件
+STATION_CONFIG_PATH = 'config/station.json'
 
-# Service fee per charging session
-SERVICE_FEE = 2.0
\ No newline at end of file
+# 分时电价配置文件（修改后服务器自动重新加载）
+TARIFF_CONFIG_PATH = 'config/tariff.json'
+
+
+@dataclass
+class StationConfig:
+    """充电站拓扑参数（对应需求中验收时可自由设置的参数）"""
+    fast_pile_num: int = 2              # FastCharingPileNum
+    trickle_pile_num: int = 3           # TrickleChargingPileNum
+    fast_power_kw: float = 30.0
+    trickle_power_kw: float = 10.0
+    waiting_area_size: int = 10         # WaitingAreaSize
+    charging_queue_len: int = 2         # ChargingQueueLen
+    power_budget_kw: Optional[float] = None  # 站级并网容量，None 表示不限制
+    power_strategy: str = 'fair'             # 功率分配策略: fair / priority / deadline
+    report_workers: int = 0                  # 即席报表的工作进程数，0 或 1 表示在服务器进程内串行计算
+
+    def pile_num(self, mode: ChargeMode) -> int:
+        return self.fast_pile_num if mode == ChargeMode.FAST else self.trickle_pile_num
+
+    def power_kw(self, mode: ChargeMode) -> float:
+        return self.fast_power_kw if mode == ChargeMode.FAST else self.trickle_power_kw
+
+
+def load_station_config(path: str = STATION_CONFIG_PATH) -> StationConfig:
+    """加载充电站配置，文件不存在时使用默认值，未知字段忽略"""
+    if not os.path.exists(path):
+        print(f"[Config] 未找到 {path}，使用默认充电站配置")
+        return StationConfig()
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    known = {f.name for f in fields(StationConfig)}
+    config = StationConfig(**{key: value for key, value in data.items() if key in known})
+    if min(config.fast_pile_num, config.trickle_pile_num, config.waiting_area_size,
+           config.charging_queue_len, config.report_workers) < 0 or min(config.fast_power_kw, config.trickle_power_kw) <= 0:
+        raise ValueError(f"充电站配置无效: {config}")
+    return config
@@ -0,0 +1,120 @@
+# utils/histogram.py
+import math
+from typing import Dict, Iterable, Optional
+
+
+class LogHistogram:
+    """HDR 风格的对数线性直方图
+
+    非负整数值按 2 的幂分段，每段再等分为 2^(SUB_BUCKET_BITS-1) 个子桶：
+    小于 2^SUB_BUCKET_BITS 的值精确计数，更大的值所在子桶的宽度不超过值的 1/64，
+    分位数的相对误差不超过约 0.8%。
+
+    只保存非空子桶的计数，不保存原始样本；子桶总数由值域上限决定（HIGHEST_VALUE 以内约 1700 个），
+    内存与记录的样本数无关。计数是精确的整数，两个直方图按子桶相加即可合并，
+    也可以用负数计数撤销之前记录的值。
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+    SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+    # 可记录的最大值，超出的值按最大值计数
+    HIGHEST_VALUE = (1 << 32) - 1
+
+    __slots__ = ('_counts', '_total', '_sum')
+
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self._total = 0
+        self._sum = 0
+
+    @classmethod
+    def index_of(cls, value: int) -> int:
+        """值所在子桶的编号"""
+        if value < cls.SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        return shift * cls.SUB_BUCKET_HALF + (value >> shift)
+
+    @classmethod
+    def bucket_range(cls, index: int):
+        """子桶覆盖的值范围 (最小值, 最大值)"""
+        if index < cls.SUB_BUCKET_COUNT:
+            return index, index
+        shift = index // cls.SUB_BUCKET_HALF - 1
+        mantissa = index - shift * cls.SUB_BUCKET_HALF
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int, count: int = 1):
+        """记录一个值
+
+        Args:
+            value: 非负整数值，负数按 0、超过 HIGHEST_VALUE 的按 HIGHEST_VALUE 记录
+            count: 计数，负数表示撤销之前记录的同一个值
+        """
+        value = min(max(int(value), 0), self.HIGHEST_VALUE)
+        index = self.index_of(value)
+        remaining = self._counts.get(index, 0) + count
+        if remaining < 0:
+            raise ValueError(f"撤销的值 {value} 未被记录")
+        if remaining:
+            self._counts[index] = remaining
+        else:
+            self._counts.pop(index, None)
+        self._total += count
+        self._sum += count * value
+
+    def merge(self, other: 'LogHistogram') -> 'LogHistogram':
+        """把另一个直方图的计数加到本直方图，返回本直方图"""
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self._total += other._total
+        self._sum += other._sum
+        return self
+
+    @classmethod
+    def merged(cls, histograms: Iterable['LogHistogram']) -> 'LogHistogram':
+        """合并多个直方图为一个新直方图"""
+        result = cls()
+        for histogram in histograms:
+            result.merge(histogram)
+        return result
+
+    @property
+    def count(self) -> int:
+        return self._total
+
+    def mean(self) -> Optional[float]:
+        return self._sum / self._total if self._total else None
+
+    def min(self) -> Optional[int]:
+        return self.bucket_range(min(self._counts))[0] if self._counts else None
+
+    def max(self) -> Optional[int]:
+        return self.bucket_range(max(self._counts))[1] if self._counts else None
+
+    def value_at_percentile(self, percentile: float) -> Optional[float]:
+        """第 percentile 百分位数（0~100），取所在子桶的中点；没有样本时返回 None"""
+        if not self._total:
+            return None
+        # 与 HdrHistogram 相同：第一个累计计数不小于 ceil(p% × 总数) 的子桶
+        rank = max(math.ceil(self._total * percentile / 100), 1)
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                low, high = self.bucket_range(index)
+                return (low + high) / 2
+        low, high = self.bucket_range(max(self._counts))
+        return (low + high) / 2
+
+    def to_dict(self) -> dict:
+        return {'counts': [[index, count] for index, count in sorted(self._counts.items())], 'sum': self._sum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LogHistogram':
+        histogram = cls()
+        histogram._counts = {int(index): int(count) for index, count in data.get('counts', [])}
+        histogram._total = sum(histogram._counts.values())
+        histogram._sum = int(data.get('sum', 0))
+        return histogram
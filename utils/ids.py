@@ -0,0 +1,101 @@
+# utils/ids.py
+"""按时间排序的紧凑ID（ULID）
+
+128 位 = 48 位毫秒时间戳 + 80 位随机数。文本形式为 26 个字符的 Crockford base32，
+二进制形式为 16 字节大端整数。同一毫秒内生成的ID在随机部分上递增，因此同一进程内生成的ID
+严格单调递增，字典序即时间序，可以直接按键做时间范围查询。
+"""
+import math
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Optional
+
+_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# 最高位字符不超过 7，否则超出 128 位
+_ULID_PATTERN = re.compile('[0-7][0-9A-HJKMNP-TV-Z]{25}')
+ULID_LENGTH = 26
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+# 编码时每次查表得到 10 位对应的两个字符（26 个字符 = 13 组）；
+# 解码时把 Crockford 字符映射为 int() 使用的 32 进制数字
+_PAIRS = [_ALPHABET[i >> 5] + _ALPHABET[i & 31] for i in range(1024)]
+_PAIR_SHIFTS = tuple(range(120, -10, -10))
+_TO_BASE32 = str.maketrans(_ALPHABET, '0123456789ABCDEFGHIJKLMNOPQRSTUV')
+
+
+def _encode(value: int) -> str:
+    return ''.join([_PAIRS[(value >> shift) & 1023] for shift in _PAIR_SHIFTS])
+
+
+def _decode(text: str) -> int:
+    if not _ULID_PATTERN.fullmatch(text):
+        raise ValueError(f"无效的ULID: {text}")
+    return int(text.translate(_TO_BASE32), 32)
+
+
+def _millis(moment: datetime) -> int:
+    return max(math.floor(moment.timestamp() * 1000), 0)
+
+
+def is_ulid(text: str) -> bool:
+    """是否为ULID文本（旧数据中的ID为UUID）"""
+    return _ULID_PATTERN.fullmatch(text) is not None
+
+
+def ulid_to_bytes(text: str) -> bytes:
+    """ULID文本转换为16字节二进制"""
+    return _decode(text).to_bytes(16, 'big')
+
+
+def ulid_from_bytes(data: bytes) -> str:
+    """16字节二进制转换为ULID文本"""
+    return _encode(int.from_bytes(data, 'big'))
+
+
+def ulid_time(text: str) -> datetime:
+    """ULID中的时间戳（本地时间，毫秒精度）"""
+    return datetime.fromtimestamp((_decode(text) >> _RANDOM_BITS) / 1000)
+
+
+def ulid_lower_bound(moment: datetime) -> str:
+    """时间不早于 moment 所在毫秒的ULID的下界，用于按键做时间范围查询"""
+    return _encode(_millis(moment) << _RANDOM_BITS)
+
+
+class UlidGenerator:
+    """单调递增的ULID生成器（线程安全）
+
+    ID中的时间戳即传入的 at（默认当前时间）。与上一个ID同一毫秒时随机部分加一，
+    因此时间不减时生成的ID严格递增；时间回退（如重放历史数据）时按传入的时间重新取随机数，
+    保证ID中的时间始终准确。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self, at: Optional[datetime] = None) -> str:
+        ms = _millis(at or datetime.now())
+        with self._lock:
+            if ms == self._last_ms:
+                random_part = self._last_random + 1
+                if random_part > _RANDOM_MAX:
+                    ms += 1
+                    random_part = int.from_bytes(os.urandom(10), 'big') >> 1
+            else:
+                # 新毫秒的随机部分最高位置零，为同一毫秒内的递增留出空间
+                random_part = int.from_bytes(os.urandom(10), 'big') >> 1
+            self._last_ms = ms
+            self._last_random = random_part
+        return _encode((ms << _RANDOM_BITS) | random_part)
+
+
+_generator = UlidGenerator()
+
+
+def new_ulid(at: Optional[datetime] = None) -> str:
+    """生成一个ULID，at 为ID中记录的时间（默认当前时间）"""
+    return _generator.new(at)
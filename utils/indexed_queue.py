@@ -0,0 +1,159 @@
+# utils/indexed_queue.py
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+
+class IndexedQueue:
+    """带索引的先进先出队列
+
+    元素按插入顺序占用连续槽位，树状数组（Fenwick tree）记录每个槽位是否有效，
+    另有 键 -> 槽位 的字典。因此：
+      - 队尾/队首插入、按键删除、查询位置均为 O(log n)
+      - 按键查找、队列长度为 O(1)
+    删除只留下空槽位，空槽位过多或容量不足时整体压缩重建（均摊 O(1)）。
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._index: Dict[Hashable, int] = {}
+        self._size = 0
+        self._rebuild([], max(capacity, 8), front_reserve=max(capacity, 8) // 4)
+
+    def _rebuild(self, live: List[tuple], capacity: int, front_reserve: int):
+        """按给定顺序重新摆放元素，并以 O(n) 构建树状数组"""
+        self._capacity = capacity
+        self._keys: List[Optional[Hashable]] = [None] * capacity
+        self._items: List[Any] = [None] * capacity
+        self._tree = [0] * (capacity + 1)
+        self._head = front_reserve
+        self._index.clear()
+        for offset, (key, item) in enumerate(live):
+            slot = front_reserve + offset
+            self._keys[slot] = key
+            self._items[slot] = item
+            self._index[key] = slot
+            self._tree[slot + 1] = 1
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                self._tree[parent] += self._tree[i]
+        self._tail = front_reserve + len(live)
+        self._size = len(live)
+
+    def _compact(self, extra_front: int = 0, extra_back: int = 0):
+        live = list(self.items_with_keys())
+        capacity = max(64, 2 * (len(live) + extra_front + extra_back))
+        front_reserve = max(extra_front, capacity // 4)
+        if front_reserve + len(live) + extra_back > capacity:
+            capacity = front_reserve + len(live) + extra_back
+        self._rebuild(live, capacity, front_reserve)
+
+    def _add(self, slot: int, delta: int):
+        i = slot + 1
+        while i <= self._capacity:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slot: int) -> int:
+        """槽位 [0, slot] 中的有效元素个数"""
+        i = slot + 1
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[Any]:
+        for _, item in self.items_with_keys():
+            yield item
+
+    def items_with_keys(self) -> Iterator[tuple]:
+        """按队列顺序遍历 (键, 元素)"""
+        for slot in range(self._head, self._tail):
+            key = self._keys[slot]
+            if key is not None:
+                yield key, self._items[slot]
+
+    def append(self, key: Hashable, item: Any):
+        """加入队尾"""
+        if key in self._index:
+            raise KeyError(f"重复的队列键: {key}")
+        if self._tail == self._capacity:
+            self._compact(extra_back=1)
+        slot = self._tail
+        self._tail += 1
+        self._place(slot, key, item)
+
+    def appendleft(self, key: Hashable, item: Any):
+        """加入队首"""
+        if key in self._index:
+            raise KeyError(f"重复的队列键: {key}")
+        if self._head == 0:
+            self._compact(extra_front=1)
+        self._head -= 1
+        self._place(self._head, key, item)
+
+    def _place(self, slot: int, key: Hashable, item: Any):
+        self._keys[slot] = key
+        self._items[slot] = item
+        self._index[key] = slot
+        self._add(slot, 1)
+        self._size += 1
+
+    def popleft(self) -> Optional[Any]:
+        """取出队首元素，队列为空时返回 None"""
+        if not self._size:
+            return None
+        while self._keys[self._head] is None:
+            self._head += 1
+        return self.remove(self._keys[self._head])
+
+    def peek(self) -> Optional[Any]:
+        """查看队首元素"""
+        if not self._size:
+            return None
+        while self._keys[self._head] is None:
+            self._head += 1
+        return self._items[self._head]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        slot = self._index.get(key)
+        return self._items[slot] if slot is not None else None
+
+    def replace(self, key: Hashable, item: Any) -> bool:
+        """原地替换元素，位置不变"""
+        slot = self._index.get(key)
+        if slot is None:
+            return False
+        self._items[slot] = item
+        return True
+
+    def remove(self, key: Hashable) -> Optional[Any]:
+        """按键删除元素，返回被删除的元素"""
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return None
+        item = self._items[slot]
+        self._keys[slot] = None
+        self._items[slot] = None
+        self._add(slot, -1)
+        self._size -= 1
+        if self._size == 0:
+            self._head = self._tail = self._capacity // 4
+        elif self._tail - self._head > 2 * self._size + 64:
+            self._compact()
+        return item
+
+    def position(self, key: Hashable) -> Optional[int]:
+        """元素在队列中的位置（从1开始），不存在时返回 None"""
+        slot = self._index.get(key)
+        if slot is None:
+            return None
+        return self._prefix(slot)
+
+    def clear(self):
+        self._rebuild([], self._capacity, self._capacity // 4)
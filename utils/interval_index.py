@@ -0,0 +1,92 @@
+# utils/interval_index.py
+from bisect import bisect_left, bisect_right
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class IntervalIndex:
+    """互不重叠的半开区间 [start, end) 的有序索引
+
+    同一资源（如一个充电桩）上的预约不允许重叠，因此按开始时间排序后结束时间也是有序的：
+      - 冲突检查只需二分找到最后一个开始早于查询结束时间的区间，O(log n)
+      - 查找下一个空闲时段从二分位置向后检查相邻区间的间隙，O(log n + k)，k 为跳过的区间数
+      - 插入/删除为 O(log n) 查找 + 列表移动
+    时间统一用时间戳（秒）表示。
+    """
+
+    def __init__(self):
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._keys: List[Hashable] = []
+        self._spans: Dict[Hashable, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._spans
+
+    def add(self, key: Hashable, start: float, end: float):
+        """加入区间，与已有区间重叠时抛出 ValueError"""
+        if end <= start:
+            raise ValueError("区间结束时间必须晚于开始时间")
+        if key in self._spans:
+            raise KeyError(f"重复的区间键: {key}")
+        if self.find_conflict(start, end) is not None:
+            raise ValueError("区间与已有区间重叠")
+        i = bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._keys.insert(i, key)
+        self._spans[key] = (start, end)
+
+    def remove(self, key: Hashable) -> bool:
+        span = self._spans.pop(key, None)
+        if span is None:
+            return False
+        i = bisect_left(self._starts, span[0])
+        while self._keys[i] != key:
+            i += 1
+        del self._starts[i], self._ends[i], self._keys[i]
+        return True
+
+    def span(self, key: Hashable) -> Optional[Tuple[float, float]]:
+        return self._spans.get(key)
+
+    def find_conflict(self, start: float, end: float, exclude: Optional[Hashable] = None) -> Optional[Hashable]:
+        """返回与 [start, end) 重叠的一个区间键，没有冲突时返回 None"""
+        i = bisect_left(self._starts, end) - 1
+        # 区间按开始时间排序且互不重叠，只有紧邻的前一个（跳过被排除的那个）可能与查询区间重叠
+        while i >= 0 and self._ends[i] > start:
+            if self._keys[i] != exclude:
+                return self._keys[i]
+            i -= 1
+        return None
+
+    def next_free(self, after: float, duration: float, exclude: Optional[Hashable] = None) -> float:
+        """不早于 after、长度为 duration 的最早空闲时段的开始时间"""
+        t = after
+        i = bisect_right(self._starts, after) - 1
+        if i < 0:
+            i = 0
+        while i < len(self._starts) and self._starts[i] < t + duration:
+            if self._ends[i] > t and self._keys[i] != exclude:
+                t = self._ends[i]
+            i += 1
+        return t
+
+    def overlapping(self, start: float, end: float) -> Iterator[Tuple[Hashable, float, float]]:
+        """按时间顺序遍历与 [start, end) 重叠的区间 (键, 开始, 结束)"""
+        i = max(bisect_right(self._starts, start) - 1, 0)
+        while i < len(self._starts) and self._starts[i] < end:
+            if self._ends[i] > start:
+                yield self._keys[i], self._starts[i], self._ends[i]
+            i += 1
+
+    def pop_before(self, ts: float) -> List[Hashable]:
+        """删除并返回所有在 ts 之前已结束的区间键"""
+        i = bisect_right(self._ends, ts)
+        expired = self._keys[:i]
+        del self._starts[:i], self._ends[:i], self._keys[:i]
+        for key in expired:
+            del self._spans[key]
+        return expired
@@ -0,0 +1,31 @@
+# utils/money.py
+"""金额的定点表示
+
+账单、充电桩收入和报表中的金额都以整数“分”保存和累加，加总精确且可以直接对整数数组
+做向量化求和；只在计算单张账单时把浮点费用舍入为分，在显示和序列化时换算为元。
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时批量换算退化为逐项计算
+    np = None
+
+CENTS_PER_YUAN = 100
+
+
+def to_cents(yuan: float) -> int:
+    """元四舍五入为整数分（与 to_cents_array 逐项一致）"""
+    return math.floor(yuan * CENTS_PER_YUAN + 0.5)
+
+
+def to_cents_array(yuan):
+    """批量把元四舍五入为整数分，返回 int64 数组；没有 numpy 时返回列表"""
+    if np is None:
+        return [to_cents(value) for value in yuan]
+    return np.floor(np.asarray(yuan, dtype=np.float64) * CENTS_PER_YUAN + 0.5).astype(np.int64)
+
+
+def to_yuan(cents: int) -> float:
+    """整数分换算为元，仅用于显示和序列化"""
+    return cents / CENTS_PER_YUAN
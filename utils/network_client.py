@@ -1,9 +1,11 @@
 import socket
 import json
+import struct
 import time
 import threading
 from typing import Dict, Any, Optional, List
 from functools import wraps
+from datetime import datetime
 
 def retry_on_failure(max_retries=3, delay=1):
     """重试装饰器"""
@@ -140,14 +142,18 @@ class NetworkClient:
             print(f"登录失败: {str(e)}")
             return None
     
-    def submit_charging_request(self, car_id: str, request_mode: str, amount: float) -> Optional[str]:
-        """提交充电请求"""
+    def submit_charging_request(self, car_id: str, request_mode: str, amount: float,
+                                start_soc: Optional[float] = None) -> Optional[str]:
+        """提交充电请求（可附带当前荷电状态 0~1，用于估算充电时长）"""
         try:
-            response = self.send_request('submit_charging_request', {
+            data = {
                 'car_id': car_id,
                 'request_mode': request_mode,
                 'amount': amount
-            })
+            }
+            if start_soc is not None:
+                data['start_soc'] = start_soc
+            response = self.send_request('submit_charging_request', data)
             if response and response.get('status') == 'success':
                 return response.get('data', {}).get('queue_number')
             return None
@@ -194,6 +200,23 @@ class NetworkClient:
         })
         return response and response.get('status') == 'success'
     
+    def add_pile(self, pile_type: str, power_kw: Optional[float] = None,
+                 pile_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """新增充电桩，未指定功率和编号时按服务器配置生成"""
+        data = {'pile_type': pile_type}
+        if power_kw is not None:
+            data['power_kw'] = power_kw
+        if pile_id:
+            data['pile_id'] = pile_id
+        return self.send_request('add_pile', data)
+    
+    def remove_pile(self, pile_id: str) -> bool:
+        """移除充电桩"""
+        response = self.send_request('remove_pile', {
+            'pile_id': pile_id
+        })
+        return response and response.get('status') == 'success'
+    
     def get_pile_queue(self, pile_id: str) -> List[Dict[str, Any]]:
         """获取充电桩排队信息"""
         response = self.send_request('get_pile_queue', {
@@ -203,11 +226,250 @@ class NetworkClient:
             return response.get('data', [])
         return []
     
-    def get_reports(self, time_range: str) -> List[Dict[str, Any]]:
-        """获取报表数据"""
-        response = self.send_request('get_reports', {
-            'time_range': time_range
+    def get_eta(self, car_id: str) -> Optional[Dict[str, Any]]:
+        """获取本车预计等待时间"""
+        try:
+            response = self.send_request('get_eta', {
+                'car_id': car_id
+            })
+            if response and response.get('status') == 'success':
+                return response.get('data')
+            return None
+        except Exception as e:
+            print(f"获取预计等待时间失败: {str(e)}")
+            return None
+    
+    def get_queue_info(self, car_id: str) -> Optional[Dict[str, Any]]:
+        """获取本车排队位置和前车数量"""
+        try:
+            response = self.send_request('get_queue_info', {
+                'car_id': car_id
+            })
+            if response and response.get('status') == 'success':
+                return response.get('data')
+            return None
+        except Exception as e:
+            print(f"获取排队位置失败: {str(e)}")
+            return None
+    
+    def modify_charging_request(self, car_id: str, request_mode: Optional[str] = None,
+                                amount: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """修改排队中的充电请求（充电模式和/或充电量）"""
+        data = {'car_id': car_id}
+        if request_mode is not None:
+            data['request_mode'] = request_mode
+        if amount is not None:
+            data['amount'] = amount
+        return self.send_request('modify_charging_request', data)
+    
+    def report_pile_fault(self, pile_ids: List[str]) -> Optional[Dict[str, Any]]:
+        """上报充电桩故障（可同时上报多个）"""
+        return self.send_request('report_pile_fault', {
+            'pile_ids': pile_ids
         })
+    
+    def recover_pile(self, pile_id: str) -> Optional[Dict[str, Any]]:
+        """充电桩故障恢复"""
+        return self.send_request('recover_pile', {
+            'pile_id': pile_id
+        })
+    
+    def get_reports(self, time_range: str, start: Optional[str] = None, end: Optional[str] = None,
+                    pile_id: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取各充电桩的日/周/月报表（start / end 为 ISO 日期）"""
+        data = {'time_range': time_range}
+        for key, value in (('start', start), ('end', end), ('pile_id', pile_id), ('limit', limit)):
+            if value is not None:
+                data[key] = value
+        response = self.send_request('get_reports', data)
+        if response and response.get('status') == 'success':
+            return response.get('data', [])
+        return []
+
+    def get_bill_stats(self, group_by, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       pile_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按一个或多个维度（pile / mode / hour / weekday / day / month）分组汇总账单"""
+        data = {'group_by': group_by if isinstance(group_by, str) else list(group_by)}
+        if start is not None:
+            data['start'] = start.isoformat()
+        if end is not None:
+            data['end'] = end.isoformat()
+        if pile_id is not None:
+            data['pile_id'] = pile_id
+        response = self.send_request('get_bill_stats', data)
         if response and response.get('status') == 'success':
             return response.get('data', [])
-        return []
\ No newline at end of file
+        return []
+
+    def get_pile_stats(self, metric: Optional[str] = None, scope: Optional[str] = None, key: Optional[str] = None,
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       percentiles=None) -> List[Dict[str, Any]]:
+        """查询各充电桩、各充电模式的排队等待时间 / 充电时长 / 充电量分位数（默认 p50 / p90 / p99，start / end 为 ISO 日期）"""
+        data = {}
+        for name, value in (('metric', metric), ('scope', scope), ('key', key), ('start', start), ('end', end)):
+            if value is not None:
+                data[name] = value
+        if percentiles is not None:
+            data['percentiles'] = list(percentiles)
+        response = self.send_request('get_pile_stats', data)
+        if response and response.get('status') == 'success':
+            return response.get('data', [])
+        return []
+
+    def get_pile_telemetry(self, pile_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                           resolution: Optional[str] = None) -> Dict[str, Any]:
+        """查询充电桩的功率和状态历史曲线（start / end 为 ISO 时间，resolution 为 1s / 1m / 1h）"""
+        data = {'pile_id': pile_id}
+        for key, value in (('start', start), ('end', end), ('resolution', resolution)):
+            if value is not None:
+                data[key] = value
+        response = self.send_request('get_pile_telemetry', data)
+        if response and response.get('status') == 'success':
+            return response.get('data', {})
+        return {}
+
+    def _recv_into(self, buffer: bytearray, size: int):
+        """接收数据直到缓冲区至少有 size 字节"""
+        while len(buffer) < size:
+            chunk = self.socket.recv(65536)
+            if not chunk:
+                raise ConnectionError("导出中断：服务器断开连接")
+            buffer += chunk
+
+    def export_to_file(self, path: str, kind: str = 'bills', fmt: str = 'csv', **filters) -> int:
+        """导出账单或报表并流式写入本地文件
+
+        Args:
+            path: 输出文件路径
+            kind: 导出内容 bills / report
+            fmt: 导出格式 csv / jsonl
+            **filters: 账单为 start / end（datetime）、pile_id；报表为 time_range、start / end（ISO 日期）、pile_id
+
+        Returns:
+            int: 写入的字节数
+        """
+        data = {'kind': kind, 'format': fmt}
+        for key, value in filters.items():
+            if value is not None:
+                data[key] = value.isoformat() if isinstance(value, datetime) else value
+        with self._lock:
+            if not self.socket and not self.connect():
+                raise ConnectionError("无法连接到服务器")
+            try:
+                self.socket.sendall(json.dumps({'action': 'export', 'data': data}).encode('utf-8'))
+                # 响应头是一行 JSON，之后是 4 字节长度 + 数据的帧，长度为 0 表示结束
+                buffer = bytearray()
+                while b'\n' not in buffer:
+                    self._recv_into(buffer, len(buffer) + 1)
+                header_end = buffer.index(b'\n')
+                header = json.loads(buffer[:header_end].decode('utf-8'))
+                del buffer[:header_end + 1]
+                if header.get('status') != 'success':
+                    raise ValueError(header.get('message', '未知错误'))
+
+                written = 0
+                with open(path, 'wb') as f:
+                    while True:
+                        self._recv_into(buffer, 4)
+                        (length,) = struct.unpack('>I', buffer[:4])
+                        del buffer[:4]
+                        if length == 0:
+                            return written
+                        self._recv_into(buffer, length)
+                        f.write(buffer[:length])
+                        del buffer[:length]
+                        written += length
+            except (socket.timeout, ConnectionError) as e:
+                self.disconnect()
+                raise ConnectionError(f"网络错误: {str(e)}")
+
+    def make_reservation(self, car_id: str, start_time: datetime, request_mode: Optional[str] = None,
+                         pile_id: Optional[str] = None, duration_hours: Optional[float] = None,
+                         amount: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """预约充电时段（给出时长或充电量其一），成功时返回预约信息"""
+        try:
+            response = self.send_request('make_reservation', {
+                'car_id': car_id,
+                'start_time': start_time.isoformat(),
+                'request_mode': request_mode,
+                'pile_id': pile_id,
+                'duration_hours': duration_hours,
+                'amount': amount
+            })
+            if response and response.get('status') == 'success':
+                return response.get('data')
+            return None
+        except Exception as e:
+            print(f"预约失败: {str(e)}")
+            return None
+
+    def cancel_reservation(self, car_id: str) -> bool:
+        """取消预约"""
+        try:
+            response = self.send_request('cancel_reservation', {'car_id': car_id})
+            return bool(response and response.get('status') == 'success')
+        except Exception as e:
+            print(f"取消预约失败: {str(e)}")
+            return False
+
+    def get_reservation(self, car_id: str) -> Optional[Dict[str, Any]]:
+        """查询车辆的预约"""
+        try:
+            response = self.send_request('get_reservation', {'car_id': car_id})
+            if response and response.get('status') == 'success':
+                return response.get('data')
+            return None
+        except Exception as e:
+            print(f"查询预约失败: {str(e)}")
+            return None
+
+    def get_next_free_slot(self, request_mode: str, duration_hours: float,
+                           after: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """查询最早可预约的时段"""
+        try:
+            response = self.send_request('get_next_free_slot', {
+                'request_mode': request_mode,
+                'duration_hours': duration_hours,
+                'start_time': after.isoformat() if after else None
+            })
+            if response and response.get('status') == 'success':
+                return response.get('data')
+            return None
+        except Exception as e:
+            print(f"查询可预约时段失败: {str(e)}")
+            return None
+
+    def simulate_request(self, amount: float, request_mode: Optional[str] = None,
+                         car_id: Optional[str] = None, start_soc: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """试算：假设现在提交请求，返回各模式预计的充电桩和开始/结束时间（不会真正排队）"""
+        try:
+            response = self.send_request('simulate_request', {
+                'amount': amount,
+                'request_mode': request_mode,
+                'car_id': car_id,
+                'start_soc': start_soc
+            })
+            if response and response.get('status') == 'success':
+                return response.get('data')
+            return None
+        except Exception as e:
+            print(f"试算失败: {str(e)}")
+            return None
+
+    def get_live_cost(self, car_id: str) -> Optional[Dict[str, Any]]:
+        """获取本车进行中充电的实时充电量和费用，不在充电时返回None"""
+        try:
+            response = self.send_request('get_live_cost', {
+                'car_id': car_id
+            })
+            if response and response.get('status') == 'success':
+                return response.get('data')
+            return None
+        except Exception as e:
+            print(f"获取实时费用失败: {str(e)}")
+            return None
+
+    def reload_tariff(self) -> bool:
+        """通知服务器重新加载电价配置"""
+        response = self.send_request('reload_tariff', {})
+        return response and response.get('status') == 'success'
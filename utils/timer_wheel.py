@@ -0,0 +1,122 @@
+# utils/timer_wheel.py
+import itertools
+import math
+from datetime import datetime
+from typing import Callable, List, Optional, Set
+
+
+class TimerHandle:
+    """定时器句柄，可用于取消定时器"""
+    __slots__ = ('expiry', 'seq', 'callback', 'args', 'cancelled', '_bucket')
+
+    def __init__(self, expiry: int, seq: int, callback: Callable, args: tuple):
+        self.expiry = expiry
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._bucket: Optional[Set['TimerHandle']] = None
+
+
+class TimerWheel:
+    """分层时间轮
+
+    每层 64 个槽位，默认 4 层、精度 1 秒，可覆盖约 194 天。
+    添加和取消定时器均为 O(1)，推进时只处理到期槽位，无需扫描全部定时器。
+    高层槽位在低层转满一圈时下沉（cascade）到低层。
+    """
+
+    BITS = 6
+    SLOTS = 1 << BITS
+    MASK = SLOTS - 1
+
+    def __init__(self, start_time: datetime, resolution: float = 1.0, levels: int = 4):
+        self._resolution = resolution
+        self._levels = levels
+        self._wheels: List[List[Set[TimerHandle]]] = [
+            [set() for _ in range(self.SLOTS)] for _ in range(levels)
+        ]
+        self._current = math.floor(start_time.timestamp() / resolution)
+        self._due: Set[TimerHandle] = set()  # 放置时已到期的定时器
+        self._seq = itertools.count()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, deadline: datetime, callback: Callable, *args) -> TimerHandle:
+        """在 deadline 时刻（向上取整到精度）触发 callback(*args)"""
+        expiry = math.ceil(deadline.timestamp() / self._resolution)
+        handle = TimerHandle(expiry, next(self._seq), callback, args)
+        self._place(handle)
+        self._count += 1
+        return handle
+
+    def cancel(self, handle: Optional[TimerHandle]) -> bool:
+        """取消定时器，已触发或已取消时返回 False"""
+        if handle is None or handle.cancelled or handle._bucket is None:
+            return False
+        handle._bucket.discard(handle)
+        handle._bucket = None
+        handle.cancelled = True
+        self._count -= 1
+        return True
+
+    def _place(self, handle: TimerHandle):
+        delta = handle.expiry - self._current
+        if delta <= 0:
+            bucket = self._due
+        else:
+            level = 0
+            while level < self._levels - 1 and delta >= 1 << (self.BITS * (level + 1)):
+                level += 1
+            bucket = self._wheels[level][(handle.expiry >> (self.BITS * level)) & self.MASK]
+        bucket.add(handle)
+        handle._bucket = bucket
+
+    def advance(self, now: datetime) -> int:
+        """推进时间轮到 now，依次触发所有到期定时器
+
+        Returns:
+            int: 触发的定时器数量
+        """
+        target = math.floor(now.timestamp() / self._resolution)
+        fired = self._fire(self._due)
+        while self._current < target:
+            if self._count == 0:
+                # 没有待触发的定时器，直接跳到目标时刻
+                self._current = target
+                break
+            self._current += 1
+            self._cascade()
+            # 下沉时恰好到期的定时器进入 _due，与本槽位一起触发
+            fired += self._fire(self._due)
+            fired += self._fire(self._wheels[0][self._current & self.MASK])
+        return fired
+
+    def _cascade(self):
+        """低层转满一圈时，将高层对应槽位的定时器重新分配到低层"""
+        level = 0
+        while level < self._levels - 1 and self._current & ((1 << (self.BITS * (level + 1))) - 1) == 0:
+            level += 1
+        for lvl in range(level, 0, -1):
+            bucket = self._wheels[lvl][(self._current >> (self.BITS * lvl)) & self.MASK]
+            handles = list(bucket)
+            bucket.clear()
+            for handle in handles:
+                self._place(handle)
+
+    def _fire(self, bucket: Set[TimerHandle]) -> int:
+        if not bucket:
+            return 0
+        handles = sorted((h for h in bucket if h.expiry <= self._current), key=lambda h: (h.expiry, h.seq))
+        fired = 0
+        for handle in handles:
+            if handle._bucket is not bucket:
+                continue  # 已被同批次前面的回调取消
+            bucket.discard(handle)
+            handle._bucket = None
+            self._count -= 1
+            handle.callback(*handle.args)
+            fired += 1
+        return fired
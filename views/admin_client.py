@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime, timedelta
 from models.charging_pile import ChargingPile
 from utils.enums import WorkState, ChargeMode
@@ -139,9 +139,12 @@ class AdminClient(tk.Tk):
         
         ttk.Label(time_frame, text="时间范围:").pack(side=tk.LEFT, padx=5)
         self.time_range = tk.StringVar(value="day")
-        ttk.Radiobutton(time_frame, text="日", variable=self.time_range, value="day").pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(time_frame, text="周", variable=self.time_range, value="week").pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(time_frame, text="月", variable=self.time_range, value="month").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(time_frame, text="日", variable=self.time_range, value="day",
+                        command=self.refresh_report).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(time_frame, text="周", variable=self.time_range, value="week",
+                        command=self.refresh_report).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(time_frame, text="月", variable=self.time_range, value="month",
+                        command=self.refresh_report).pack(side=tk.LEFT, padx=5)
         
         # 创建表格
         columns = ("时间", "充电桩编号", "累计充电次数", "累计充电时长", 
@@ -161,11 +164,17 @@ class AdminClient(tk.Tk):
         self.report_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # 刷新按钮
-        ttk.Button(report_frame, text="刷新报表", command=self.refresh_report).pack(pady=10)
+        # 刷新和导出按钮
+        button_frame = ttk.Frame(report_frame)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="刷新报表", command=self.refresh_report).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="导出报表", command=self.export_report).pack(side=tk.LEFT, padx=5)
         
         # 返回按钮
         ttk.Button(self.main_frame, text="返回主菜单", command=self.show_main_menu).pack(pady=10)
+        
+        # 加载报表数据
+        self.refresh_report()
     
     def show_queue_info(self):
         """显示排队车辆信息"""
@@ -300,8 +309,40 @@ class AdminClient(tk.Tk):
     
     def refresh_report(self):
         """刷新报表数据"""
-        # TODO: 实现实际的报表数据刷新逻辑
-        messagebox.showinfo("成功", "报表已刷新")
+        try:
+            for item in self.report_tree.get_children():
+                self.report_tree.delete(item)
+            
+            rows = self.network_client.get_reports(self.time_range.get())
+            for row in rows:
+                self.report_tree.insert('', 'end', values=(
+                    row['period'],
+                    row['pile_id'],
+                    row['charge_count'],
+                    f"{row['charge_duration']:.2f}",
+                    f"{row['charged_kwh']:.2f}",
+                    f"{row['charge_fee']:.2f}",
+                    f"{row['service_fee']:.2f}",
+                    f"{row['total_fee']:.2f}"
+                ))
+        except Exception as e:
+            messagebox.showerror("错误", f"刷新报表失败: {str(e)}")
+    
+    def export_report(self):
+        """把当前时间范围的报表导出为 CSV 或 JSONL 文件"""
+        path = filedialog.asksaveasfilename(
+            title="导出报表",
+            defaultextension=".csv",
+            filetypes=[("CSV 文件", "*.csv"), ("JSON Lines 文件", "*.jsonl")]
+        )
+        if not path:
+            return
+        fmt = 'jsonl' if path.endswith('.jsonl') else 'csv'
+        try:
+            self.network_client.export_to_file(path, 'report', fmt, time_range=self.time_range.get())
+            messagebox.showinfo("成功", f"报表已导出到 {path}")
+        except Exception as e:
+            messagebox.showerror("错误", f"导出报表失败: {str(e)}")
     
     def logout(self):
         """退出登录"""
@@ -101,6 +101,12 @@ class UserClient(tk.Tk):
         ttk.Label(menu_frame, text=f"用户ID: {self.user_id}").pack(pady=5)
         ttk.Label(menu_frame, text=f"车辆ID: {self.car_id}").pack(pady=5)
         
+        # 充电中实时显示已充电量和费用
+        self.live_cost_var = tk.StringVar(value="")
+        live_cost_label = ttk.Label(menu_frame, textvariable=self.live_cost_var)
+        live_cost_label.pack(pady=5)
+        self.poll_live_cost(live_cost_label)
+        
         # 按钮框架
         button_frame = ttk.Frame(menu_frame)
         button_frame.pack(pady=10)
@@ -133,9 +139,16 @@ class UserClient(tk.Tk):
         self.charge_amount_entry = ttk.Entry(request_frame)
         self.charge_amount_entry.grid(row=1, column=1, columnspan=2, padx=5, pady=5)
         
+        # 试算预览：随输入实时显示预计分配的充电桩和完成时间
+        self.preview_var = tk.StringVar(value="")
+        ttk.Label(request_frame, textvariable=self.preview_var).grid(row=2, column=0, columnspan=3, padx=5, pady=5)
+        self._preview_seq = 0
+        self.charge_amount_entry.bind('<KeyRelease>', lambda event: self.update_request_preview())
+        self.charge_mode_var.trace_add('write', lambda *args: self.update_request_preview())
+        
         # 按钮框架
         button_frame = ttk.Frame(request_frame)
-        button_frame.grid(row=2, column=0, columnspan=3, pady=10)
+        button_frame.grid(row=3, column=0, columnspan=3, pady=10)
         
         ttk.Button(button_frame, text="提交", command=self.submit_charging_request).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="返回主菜单", command=self.show_main_menu).pack(side=tk.LEFT, padx=5)
@@ -205,6 +218,51 @@ class UserClient(tk.Tk):
         import threading
         threading.Thread(target=async_register, daemon=True).start()
     
+    def update_request_preview(self):
+        """按当前表单内容试算（不会真正排队），在后台线程中查询，只显示最后一次输入的结果"""
+        try:
+            amount = float(self.charge_amount_entry.get())
+        except ValueError:
+            self.preview_var.set("")
+            return
+        if amount <= 0:
+            self.preview_var.set("")
+            return
+        
+        self._preview_seq += 1
+        seq = self._preview_seq
+        request_mode = self.charge_mode_var.get()
+        
+        def async_preview():
+            results = self.network_client.simulate_request(amount, request_mode, self.car_id)
+            if not results or not results[0].get('pile_id'):
+                text = "暂无可用充电桩"
+            else:
+                result = results[0]
+                text = (f"预计分配 {result['pile_id']}，前方 {result['cars_ahead']} 辆车，"
+                        f"约 {result['waiting_hours'] * 60:.0f} 分钟后开始，"
+                        f"{result['estimated_end'][11:16]} 充完")
+            self.after(0, lambda: seq == self._preview_seq and self.preview_var.set(text))
+        
+        import threading
+        threading.Thread(target=async_preview, daemon=True).start()
+    
+    def poll_live_cost(self, label):
+        """每秒在后台线程中查询一次实时费用，离开主菜单（label 被销毁）后停止"""
+        if not self.car_id or not label.winfo_exists():
+            return
+        
+        def async_poll():
+            live = self.network_client.get_live_cost(self.car_id)
+            text = (f"充电中（{live['pile_id']}）：已充 {live['charged_kwh']:.2f} 度，"
+                    f"电费 {live['charge_fee']:.2f} 元 + 服务费 {live['service_fee']:.2f} 元 = "
+                    f"{live['total_fee']:.2f} 元") if live else ""
+            self.after(0, lambda: label.winfo_exists() and self.live_cost_var.set(text))
+        
+        import threading
+        threading.Thread(target=async_poll, daemon=True).start()
+        self.after(1000, lambda: self.poll_live_cost(label))
+    
     def submit_charging_request(self):
         """提交充电请求"""
         request_mode = self.charge_mode_var.get()
@@ -357,7 +415,11 @@ class UserClient(tk.Tk):
             if request and request.get('status') == 'success':
                 data = request.get('data', {})
                 if data and data.get('queue_number'):
-                    messagebox.showinfo("排队号码", f"您的排队号码是：{data['queue_number']}")
+                    message = f"您的排队号码是：{data['queue_number']}"
+                    eta = self.network_client.get_eta(self.car_id)
+                    if eta and eta.get('waiting_hours') is not None:
+                        message += f"\n预计等待：{eta['waiting_hours']:.2f} 小时"
+                    messagebox.showinfo("排队号码", message)
                 else:
                     messagebox.showinfo("提示", "您当前没有排队中的充电请求")
             else:
@@ -368,29 +430,16 @@ class UserClient(tk.Tk):
     def show_waiting_count(self):
         """显示本充电模式下前车等待数量"""
         try:
-            # 获取当前请求
-            request = self.network_client.send_request('get_current_request', {
-                'car_id': self.car_id
-            })
-            
-            if request and request.get('status') == 'success':
-                data = request.get('data', {})
-                if data and data.get('request_mode'):
-                    # 获取所有充电桩
-                    piles = self.network_client.get_all_piles()
-                    waiting_count = 0
-                    
-                    # 统计同模式下等待的车辆数量
-                    for pile in piles:
-                        if pile['pile_type'] == data['request_mode']:
-                            queue_data = self.network_client.get_pile_queue(pile['pile_id'])
-                            waiting_count += len(queue_data)
-                    
-                    messagebox.showinfo("等待数量", f"当前充电模式下共有 {waiting_count} 辆车在等待")
-                else:
-                    messagebox.showinfo("提示", "您当前没有排队中的充电请求")
+            info = self.network_client.get_queue_info(self.car_id)
+            if info:
+                messagebox.showinfo(
+                    "等待数量",
+                    f"排队号码: {info['queue_number']}\n"
+                    f"{info['request_mode']}等候区共 {info['queue_length']} 辆车，"
+                    f"您前面还有 {info['cars_ahead']} 辆车在等待"
+                )
             else:
-                messagebox.showerror("错误", "获取等待数量失败")
+                messagebox.showinfo("提示", "您当前没有排队中的充电请求")
         except Exception as e:
             messagebox.showerror("错误", f"获取等待数量失败: {str(e)}")
 